@@ -0,0 +1,238 @@
+"""
+Benchmarks for the physics, collision and rendering hot paths.
+
+Run from the repository root:
+    python -m Benchmarks.Benchmark [--entities N] [--save-baseline] [--tolerance 0.15]
+
+Runs headless with SDL's dummy video driver. Results are compared against Benchmarks/baseline.json;
+anything slower than the baseline by more than the tolerance is reported as a regression.
+"""
+
+
+import argparse
+import json
+import os
+import random
+import sys
+from time import perf_counter
+
+# Must be set before pygame's display is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+import pyscroll
+
+import constants
+from Entities.Components.Components import CollisionComponent, GravityComponent, PlayerComponent
+from Entities.Physics import BatchPhysics
+from Entities.Player import Player
+from Input.Buttons import Buttons
+from Input.InputSource import ScriptedInput
+from Input.InputLog import InputReplayer
+from Map.CollisionMesh import CollisionMesh
+from Map.GameMap import GameMap
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+MAPS = (constants.TEST_MAP, constants.SIMPLE_MAP)
+
+# Input every benchmarked player gets: run right, jump, run back left
+SCRIPT = [
+    (60, [Buttons.MOVE_RIGHT, Buttons.RUN]),
+    (20, [Buttons.MOVE_RIGHT, Buttons.JUMP]),
+    (60, [Buttons.MOVE_LEFT, Buttons.RUN]),
+    (20, [Buttons.MOVE_LEFT, Buttons.JUMP]),
+]
+
+DELTA = 1 / 60.
+
+
+def set_up(map_path, entities, seed=0):
+    """
+    Loads a map (with tile images) as a new world and spawns players spread over its width
+    Returns: (GameMap, list of Player)
+    """
+    world = GameMap(map_path)
+    map_data = world.map_data
+    rng = random.Random(seed)
+    players = []
+    for _ in range(entities):
+        x = rng.uniform(0, map_data.width * map_data.tilewidth)
+        y = rng.uniform(0, map_data.height * map_data.tileheight / 2)
+        players.append(Player(world, position=(x, y)))
+    return world, players
+
+
+def time_steps(step, frames, warmup=10):
+    """
+    Returns: seconds per call of step(frame), after warming up
+    """
+    for frame in range(warmup):
+        step(frame)
+    start = perf_counter()
+    for frame in range(frames):
+        step(frame)
+    return (perf_counter() - start) / frames
+
+
+def bench_map(map_path, entities, frames, input_path=None):
+    """
+    Runs every benchmark on one map
+    :param input_path: input log (see Input.InputLog) to drive the players with instead of SCRIPT
+    Returns: dict of benchmark name -> steps per second
+    """
+    results = {}
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    if input_path:
+        input_source = InputReplayer.from_file(input_path, loop=True)
+    else:
+        input_source = ScriptedInput(SCRIPT, loop=True)
+
+    def press(players):
+        buttons = input_source.poll()
+        for player in players:
+            player.components[PlayerComponent.id_class].set_buttons(buttons)
+
+    # Whole Entity.update (movement, collision and every component)
+    world, players = set_up(map_path, entities)
+    group = pygame.sprite.Group(players)
+    def entity_update(frame):
+        press(players)
+        group.update(DELTA)
+    results[name + '/Entity.update'] = entities / time_steps(entity_update, frames)
+
+    # Same work with components updated a type at a time
+    world, players = set_up(map_path, entities)
+    def systems_update(frame):
+        press(players)
+        for player in players:
+            player.move(DELTA)
+        world.systems.update(DELTA)
+    results[name + '/Systems.update'] = entities / time_steps(systems_update, frames)
+
+    # Same work through the vectorized stage
+    world, players = set_up(map_path, entities)
+    physics = BatchPhysics(world)
+    for player in players:
+        physics.add(player)
+    def batch_step(frame):
+        press(players)
+        physics.step(DELTA)
+    results[name + '/BatchPhysics.step'] = entities / time_steps(batch_step, frames)
+
+    # Collision on its own
+    world, players = set_up(map_path, entities)
+    collisions = [player.components[CollisionComponent.id_class] for player in players]
+    for player in players:
+        player.velocity = (150, 400)
+    def collide(frame):
+        # Alternate directions so entities keep moving against the map
+        sign = 1 if frame % 40 < 20 else -1
+        for player, collision in zip(players, collisions):
+            player.velocity.x = 150 * sign
+            player.velocity.y = 400 * sign
+            collision.move_without_collision(DELTA)
+    results[name + '/move_without_collision'] = entities / time_steps(collide, frames)
+
+    # Same moves against the merged collision mesh
+    world.collision_mesh = CollisionMesh(world.collision_grid)
+    results[name + '/CollisionMesh.sweep_rect'] = entities / time_steps(collide, frames)
+    world.collision_mesh = None
+
+    # Gravity on its own
+    gravities = [player.components[GravityComponent.id_class] for player in players]
+    def gravity(frame):
+        for component in gravities:
+            component.update(DELTA)
+    results[name + '/GravityComponent.update'] = entities / time_steps(gravity, frames)
+
+    # Same work through the ground-state system's batched probe
+    gravities = tuple(gravities)
+    def ground_system(frame):
+        GravityComponent.update_all(gravities, DELTA)
+    results[name + '/GravityComponent.update_all'] = entities / time_steps(ground_system, frames)
+
+    # Drawing the map and sprites to an offscreen surface
+    width, height = 400, 240
+    surface = pygame.Surface((width, height)).convert()
+    map_layer = pyscroll.orthographic.BufferedRenderer(world.scroll_data(), (width, height), clamp_camera=True)
+    render_group = pyscroll.PyscrollGroup(map_layer=map_layer)
+    render_group.add(players)
+    map_width = world.map_data.width * world.map_data.tilewidth
+    def draw(frame):
+        # Pan so the renderer has to draw new tiles
+        render_group.center(((frame * 8) % map_width, height))
+        render_group.draw(surface)
+    results[name + '/BufferedRenderer.draw'] = 1 / time_steps(draw, frames)
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns: list of (name, result, baseline) for results slower than the baseline by more than tolerance
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected and value < expected * (1 - tolerance):
+            regressions.append((name, value, expected))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark physics, collision and rendering')
+    parser.add_argument('--entities', type=int, default=200, help='players spawned per map')
+    parser.add_argument('--frames', type=int, default=200, help='frames timed per benchmark')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file to compare against / save to')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='fraction slower than the baseline that counts as a regression')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--input', help='input log recorded with autoplatformer.py --record to drive players with')
+    args = parser.parse_args(argv)
+    if args.input:
+        args.input = os.path.abspath(args.input)
+
+    # Paths in constants are relative to the repository root
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args.baseline = os.path.abspath(args.baseline)
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+    results = {}
+    for map_path in MAPS:
+        results.update(bench_map(map_path, args.entities, args.frames, args.input))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    for name, value in sorted(results.items()):
+        line = '%-45s %14.1f steps/s' % (name, value)
+        if baseline.get(name):
+            line += '  (%+.1f%%)' % ((value / baseline[name] - 1) * 100)
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print('Saved baseline to ' + args.baseline)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, value, expected in regressions:
+        print('REGRESSION %s: %.1f steps/s, baseline %.1f' % (name, value, expected))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Structured, level-filtered logging for the game's packages.
+
+Logging calls in hot paths are guarded by the level flags of a Log, and by __debug__:
+
+    if __debug__ and log.debug_on:
+        log.debug('jumped', entity=entity, height=height)
+
+When logging is off that costs one attribute check, and when Python runs with -O the whole block is
+removed at compile time.
+"""
+
+
+import logging
+
+
+# Logger every Log hangs off of
+ROOT = 'autoplatformer'
+
+
+class _Fields(object):
+    """ Formats event fields as key=value pairs, only if the record is actually emitted"""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(key + '=' + str(value) for key, value in self.fields.items())
+
+
+class Log(object):
+    """ Logs named events with key=value fields to a stdlib logger under ROOT"""
+
+    # Every Log created, so their level flags can be refreshed together
+    _logs = []
+
+    def __init__(self, name):
+        """
+        :param name: name of the logger under ROOT (e.g. 'entities')
+        """
+        self.name = ROOT + '.' + name
+        self.logger = logging.getLogger(self.name)
+        self.refresh()
+        Log._logs.append(self)
+
+    def refresh(self):
+        """ Re-reads which levels are enabled (call after changing logging configuration)"""
+        self.debug_on = self.logger.isEnabledFor(logging.DEBUG)
+        self.info_on = self.logger.isEnabledFor(logging.INFO)
+
+    def event(self, level, event, **fields):
+        """
+        Logs an event. The fields are kept on the record as record.event and record.fields
+        :param level: logging level
+        :param event: short name of what happened
+        :param fields: data describing the event
+        """
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, '%s %s', event, _Fields(fields), extra={'event': event, 'fields': fields})
+
+    def debug(self, event, **fields):
+        self.event(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.event(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.event(logging.WARNING, event, **fields)
+
+
+def set_level(level, name=ROOT):
+    """
+    Sets the level of a logger and refreshes every Log's flags
+    :param level: logging level (e.g. logging.DEBUG or 'DEBUG')
+    :param name: logger to set, everything by default
+    """
+    logging.getLogger(name).setLevel(level)
+    for log in Log._logs:
+        log.refresh()
+
+
+# Off unless turned on
+logging.getLogger(ROOT).setLevel(logging.WARNING)
@@ -0,0 +1,158 @@
+"""
+Per-frame timing of the game loop.
+"""
+
+
+import csv
+import json
+from collections import deque
+from time import perf_counter
+
+import pygame
+
+
+class Profiler(object):
+    """
+    Records how long each section of a frame takes, keeping the last few hundred frames.
+    Sections are timed with start/stop (or add), between begin_frame and end_frame.
+    """
+
+    # Profiler that Entities report component timings to. None when profiling is off
+    active = None
+
+    # Section holding the total time of each frame
+    FRAME = 'frame'
+
+    def __init__(self, history=300, bucket_ms=1., buckets=34):
+        """
+        :param history: number of frames kept for averages, histograms and dumps
+        :param bucket_ms: width of a histogram bucket in milliseconds
+        :param buckets: number of histogram buckets (the last one holds everything slower)
+        """
+        self.frames = deque(maxlen=history)
+        self.sections = [] # Every section seen, in the order first seen
+        self.bucket_ms = bucket_ms
+        self.buckets = buckets
+        self.frame_count = 0
+        self._current = None
+        self._starts = {}
+        self._frame_start = 0.
+        self._font = None
+
+    def begin_frame(self):
+        """ Starts recording a new frame"""
+        self._current = {}
+        self._frame_start = perf_counter()
+
+    def end_frame(self):
+        """ Finishes the current frame and adds it to the history"""
+        if self._current is None:
+            return
+        self.add(self.FRAME, perf_counter() - self._frame_start)
+        self.frames.append(self._current)
+        self.frame_count += 1
+        self._current = None
+
+    def start(self, section):
+        """ Starts timing a section of the current frame"""
+        self._starts[section] = perf_counter()
+
+    def stop(self, section):
+        """ Stops timing a section, adding the time since start to it"""
+        self.add(section, perf_counter() - self._starts.pop(section))
+
+    def add(self, section, seconds):
+        """
+        Adds time to a section of the current frame. Sections timed several times in a frame are summed
+        :param section: name of the section
+        :param seconds: time spent
+        """
+        current = self._current
+        if current is None:
+            return
+        if section in current:
+            current[section] += seconds
+        else:
+            if section not in self.sections:
+                self.sections.append(section)
+            current[section] = seconds
+
+    def averages(self):
+        """
+        Returns: dict of section -> (mean ms, max ms) over the kept frames
+        """
+        totals = {}
+        for frame in self.frames:
+            for section, seconds in frame.items():
+                total, peak = totals.get(section, (0., 0.))
+                totals[section] = (total + seconds, max(peak, seconds))
+        count = len(self.frames) or 1
+        return {section: (total * 1000 / count, peak * 1000) for section, (total, peak) in totals.items()}
+
+    def histogram(self, section=FRAME):
+        """
+        Returns: list of frame counts per bucket of bucket_ms for a section, over the kept frames
+        """
+        counts = [0] * self.buckets
+        last = self.buckets - 1
+        for frame in self.frames:
+            seconds = frame.get(section)
+            if seconds is not None:
+                counts[min(int(seconds * 1000 / self.bucket_ms), last)] += 1
+        return counts
+
+    def dump(self, path):
+        """ Writes the kept frames to path, as JSON if it ends with .json and CSV otherwise"""
+        if path.endswith('.json'):
+            self.dump_json(path)
+        else:
+            self.dump_csv(path)
+
+    def dump_csv(self, path):
+        """ Writes one row per kept frame with the time of each section in ms"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.sections)
+            for frame in self.frames:
+                writer.writerow(['%.4f' % (frame[section] * 1000) if section in frame else ''
+                                 for section in self.sections])
+
+    def dump_json(self, path):
+        """ Writes the kept frames, averages and histograms (all in ms)"""
+        data = {
+            'frames': [{section: seconds * 1000 for section, seconds in frame.items()} for frame in self.frames],
+            'averages': {section: {'mean': mean, 'max': peak} for section, (mean, peak) in self.averages().items()},
+            'histograms': {section: {'bucket_ms': self.bucket_ms, 'counts': self.histogram(section)}
+                           for section in self.sections},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+
+    def draw_overlay(self, surface, position=(4, 4)):
+        """
+        Draws the average time of each section and a histogram of frame times
+        :param surface: surface to draw on
+        :param position: top left of the overlay
+        """
+        if self._font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self._font = pygame.font.Font(None, 18)
+        x, y = position
+        averages = self.averages()
+        for section in self.sections:
+            mean, peak = averages.get(section, (0., 0.))
+            text = self._font.render('%s: %.2f ms (max %.2f)' % (section, mean, peak), True, (255, 255, 255), (0, 0, 0))
+            surface.blit(text, (x, y))
+            y += text.get_height()
+
+        # Frame time histogram, one bar per bucket
+        counts = self.histogram()
+        tallest = max(counts) or 1
+        bar_width, bar_height = 4, 40
+        y += 4
+        pygame.draw.rect(surface, (0, 0, 0), (x, y, bar_width * len(counts), bar_height))
+        for i, count in enumerate(counts):
+            height = int(bar_height * count / tallest)
+            if height:
+                pygame.draw.rect(surface, (0, 255, 0), (x + i * bar_width, y + bar_height - height, bar_width - 1, height))
@@ -0,0 +1,153 @@
+from enum import Enum
+
+import pygame
+
+from Entities.Components.Components import GravityComponent, GravityCompState
+
+"""
+Simulation culling. Entities far from the camera, and entities resting on the ground, are put to sleep:
+their components leave the Systems lists (and BatchPhysics), so they cost nothing per frame until woken.
+"""
+
+class SleepState(Enum):
+    """ Why an entity isn't being simulated"""
+    AWAKE = 0
+    OUTSIDE = 1 # Outside the active region around the camera
+    RESTING = 2 # Still on the ground. Woken when an awake entity touches it
+
+class ActiveRegion(object):
+    """ Tracks which entities are awake, sleeping and waking them as the camera and entities move"""
+
+    # Frames an entity has to stay still on the ground before it rests
+    REST_FRAMES = 30
+
+    def __init__(self, world, margin=256, physics=None):
+        """
+        :param world: GameMap the entities live in (its broadphase finds entities to wake)
+        :param margin: pixels around the camera's view that entities stay awake in
+        :param physics: BatchPhysics awake entities are stepped by, or None
+        """
+        self.world = world
+        self.margin = margin
+        self.physics = physics
+        # Entities by SleepState. Dicts (used as ordered sets) keep the update order deterministic
+        self.entities = {state: {} for state in SleepState}
+        # Awake entity -> frames it has been still for
+        self._still = {}
+        # OUTSIDE entities the broadphase can't find (no CollisionComponent), checked against the region each frame
+        self._unhashed = {}
+
+    @property
+    def awake(self):
+        """ Returns: list of the awake entities"""
+        return list(self.entities[SleepState.AWAKE])
+
+    def add(self, entity):
+        """ Starts tracking an (awake) entity"""
+        self.entities[SleepState.AWAKE][entity] = None
+        self._still[entity] = 0
+        entity._region = self
+
+    def remove(self, entity):
+        """ Stops tracking an entity, waking it if it sleeps"""
+        self.wake(entity)
+        del self.entities[SleepState.AWAKE][entity]
+        del self._still[entity]
+        entity._region = None
+
+    def discard(self, entity):
+        """ Stops tracking a killed entity, without waking it (called by Entity.kill)"""
+        del self.entities[entity.sleep_state][entity]
+        self._still.pop(entity, None)
+        self._unhashed.pop(entity, None)
+        entity._region = None
+
+    def sleep(self, entity, state):
+        """
+        Stops simulating an entity
+        :param state: SleepState saying why
+        """
+        if entity.sleep_state == state:
+            return
+        if entity.sleep_state == SleepState.AWAKE:
+            entity.sleep()
+            if self.physics and entity in self.physics:
+                self.physics.remove(entity)
+            del self._still[entity]
+        del self.entities[entity.sleep_state][entity]
+        entity.sleep_state = state
+        self.entities[state][entity] = None
+        if state == SleepState.OUTSIDE and not self._hashed(entity):
+            self._unhashed[entity] = None
+        else:
+            self._unhashed.pop(entity, None)
+
+    def wake(self, entity):
+        """ Simulates a sleeping entity again"""
+        if entity.sleep_state == SleepState.AWAKE:
+            return
+        del self.entities[entity.sleep_state][entity]
+        self._unhashed.pop(entity, None)
+        entity.sleep_state = SleepState.AWAKE
+        self.entities[SleepState.AWAKE][entity] = None
+        self._still[entity] = 0
+        entity.wake()
+        if self.physics:
+            self.physics.add(entity)
+
+    def region(self, view):
+        """ Returns: pygame.Rect entities stay awake in, for the camera's view rect"""
+        return pygame.Rect(view).inflate(2 * self.margin, 2 * self.margin)
+
+    def update(self, view, keep_awake=()):
+        """
+        Sleeps and wakes entities for this frame. Call before simulating the awake entities
+        :param view: pixel rect the camera sees
+        :param keep_awake: entities never put to sleep (e.g. the player, who input moves)
+        """
+        region = self.region(view)
+        awake = self.entities[SleepState.AWAKE]
+        outside = self.entities[SleepState.OUTSIDE]
+        resting = self.entities[SleepState.RESTING]
+
+        # Wake entities the region moved over. The broadphase finds those with collision; the rest are checked
+        spatial_hash = self.world.spatial_hash
+        if outside:
+            entering = [entity for entity in spatial_hash.query_rect(region) if entity in outside]
+            entering += [entity for entity in self._unhashed if region.colliderect(entity.rect)]
+            for entity in entering:
+                self.wake(entity)
+        for entity in keep_awake:
+            if entity in outside or entity in resting:
+                self.wake(entity)
+
+        keep = set(keep_awake)
+        for entity in list(awake):
+            if entity in keep:
+                continue
+            if not region.colliderect(entity.rect):
+                self.sleep(entity, SleepState.OUTSIDE)
+            elif self._is_still(entity):
+                self._still[entity] += 1
+                if self._still[entity] >= self.REST_FRAMES:
+                    self.sleep(entity, SleepState.RESTING)
+            else:
+                self._still[entity] = 0
+                # Moving entities wake resting ones they touch
+                if resting:
+                    for other in spatial_hash.query_rect(entity.rect.inflate(2, 2)):
+                        if other in resting:
+                            self.wake(other)
+
+    def _hashed(self, entity):
+        """ Returns: True if the entity is in the map's broadphase"""
+        return entity in self.world.spatial_hash
+
+    def _is_still(self, entity):
+        """ Returns: True if nothing is moving the entity (no velocity or acceleration, and on the ground if it falls)"""
+        velocity = entity.velocity
+        acceleration = entity.acceleration
+        if velocity.x or velocity.y or acceleration.x or acceleration.y:
+            return False
+        gravity = entity.components.get(GravityComponent.id_class)
+        return gravity is None or gravity.state == GravityCompState.GROUND
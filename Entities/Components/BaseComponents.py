@@ -5,9 +5,17 @@ from pygame.math import Vector2
 from abc import ABC, abstractmethod
 from enum import Enum
 
+from Debug.Log import Log
+
+_log = Log('entities')
+
 class Component(ABC):
     """ Abstraction of the basic component. All components have an owner and an update method"""
 
+    # Subclasses list their attributes in __slots__ too, so components carry no per-instance dict
+    __slots__ = ('owner', '_store_index')
+    # struct format of the values get_state returns (see Entities.Snapshot). Empty if there is no state
+    STATE_FORMAT = ''
     
     def __init__(self, owner):
         """
@@ -15,19 +23,54 @@ class Component(ABC):
         :param owner: should be of type Entity
         """
         self.owner = owner
+        # Place in Systems' list for this component's type (None while not stored)
+        self._store_index = None
         # Set id type of subclass so it can be used key for Entity's map
-        print('!')
+        if __debug__ and _log.debug_on:
+            _log.debug('component_created', component=type(self).__name__, owner=owner)
         self.__set_id_class()
 
+    def __init_subclass__(cls, **kwargs):
+        """ Sets id_class as soon as a subclass is defined, so it can be used before any instance exists"""
+        super().__init_subclass__(**kwargs)
+        cls.id_class = cls
+
     @abstractmethod
     def update(self, delta):
         """ Update entity using information stored in component"""
         pass
 
+    def update_all(components, delta):
+        """
+        System for a component type, called by Systems.update with every live component of the type.
+        Types that can do their work for all components at once override it
+        :param components: sequence of components of one type
+        """
+        if not components:
+            return
+        update = type(components[0]).update
+        for component in components:
+            update(component, delta)
+
     def was_added(self):
         """ Called right after when an Entity adds this component to its dictionary"""
         pass
 
+    def was_removed(self):
+        """ Called right after an Entity removes this component, or the Entity is killed"""
+        pass
+
+    def get_state(self):
+        """ Returns: tuple of the component's simulation state, matching STATE_FORMAT"""
+        return ()
+
+    def set_state(self, state):
+        """
+        Restores state returned by get_state. Called after the owner's own state is restored
+        :param state: tuple matching STATE_FORMAT
+        """
+        pass
+
     @classmethod
     def __set_id_class(cls):
         """ Sets the id_class of the subclass Component object with the class object of the Component
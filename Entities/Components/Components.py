@@ -3,10 +3,23 @@ from pygame.math import Vector2
 from enum import Enum
 
 from Map.GameMap import *
-from Input.Buttons import Buttons
+from Map.TileCollision import ground_at
+from Input.Buttons import Buttons, BUTTON_BITS
 import Util
 
 from Entities.Components.BaseComponents import Component
+from Debug.Log import Log
+
+_log = Log('entities')
+
+# Button mask bits the player reads each update
+_MOVE_LEFT = BUTTON_BITS[Buttons.MOVE_LEFT]
+_MOVE_RIGHT = BUTTON_BITS[Buttons.MOVE_RIGHT]
+_MOVE = _MOVE_LEFT | _MOVE_RIGHT
+_RUN = BUTTON_BITS[Buttons.RUN]
+_CROUCH = BUTTON_BITS[Buttons.CROUCH]
+_JUMP = BUTTON_BITS[Buttons.JUMP]
+_SPIN = BUTTON_BITS[Buttons.SPIN]
 
 
 """
@@ -16,114 +29,75 @@ Components for Entities. Components define the traits of all entities in the gam
 class CollisionComponent(Component):
     """ Allows Entities to collide with other entities with Collision Components"""
 
+    __slots__ = ('last_sweep',)
+
     def __init__(self, owner):
         super().__init__(owner)
+        # SweepResult of the last movement
+        self.last_sweep = None
+
+    # Override
+    def was_added(self):
+        """ Registers the owner with its world's broadphase"""
+        self.owner.world.spatial_hash.insert(self.owner)
+
+    # Override
+    def was_removed(self):
+        self.owner.world.spatial_hash.remove(self.owner)
 
     def update(self, delta):
         pass
 
+    # Override
+    def set_state(self, state):
+        """ Moves the owner to its restored rect in the broadphase"""
+        self.owner.world.spatial_hash.move(self.owner)
+
+    def get_colliding_entities(self):
+        """
+        Returns: list of other entities with Collision Components whose rect overlaps the owner's
+        """
+        owner = self.owner
+        return [entity for entity in owner.world.spatial_hash.query_rect(owner.rect) if entity is not owner]
+
     def move_without_collision(self, deltatime):
         """
         Makes movement steps move without intersecting nearby objects
+        :param deltatime: change in time, in seconds
+        Returns: SweepResult of the movement
         """
-        map_data = GameMap.map_data 
-        TILE_SIZE = map_data.tilewidth
-        owner_rect = self.owner.rect
-        delta_movement = self.owner.velocity * deltatime
-        final_movement_veloc = Vector2(delta_movement.x, delta_movement.y) 
-        tolerance = 0.
-
-        direction = 0
-        start_tile  = -999 
-        target_tile = -999
-
-        # X
-        if self.owner.velocity.x > tolerance: # Right
-            start_tile = int(owner_rect.right / TILE_SIZE)
-            target_tile = int((owner_rect.right + delta_movement.x) / TILE_SIZE)
-            direction = 1 # Right
-        elif self.owner.velocity.x < -tolerance: # Left
-            start_tile = int(owner_rect.left / TILE_SIZE)
-            target_tile = int((owner_rect.left + delta_movement.x) / TILE_SIZE)
-            direction = -1 # Left
-        start_height = int(owner_rect.top / TILE_SIZE)
-        end_height = int(owner_rect.bottom / TILE_SIZE)
-
-        if direction != 0:
-            x_range = range(start_tile, target_tile + 1, direction) if direction == 1 else range(target_tile , start_tile- 1 , direction)
-            for j in range(start_height, end_height): # Height
-                for i in x_range: # Width
-                    # Get tile, skip if not existent/has no property
-                    try: 
-                        properties = GameMap.get_tile_properties(i, j)
-                        if not properties: continue
-                    except:
-                        continue
-
-                    if properties and properties.get(MapInfo.SOLID.value):
-                        self.owner.velocity.x = 0
-                        bbox = pygame.Rect((i * TILE_SIZE, j * TILE_SIZE), (TILE_SIZE, TILE_SIZE))
-                        if direction == 1: # Right
-                            smallest_dist = min(bbox.left - owner_rect.right, delta_movement.x)
-                            final_movement_veloc.x = min(smallest_dist, final_movement_veloc.x)
-                        else: # Left
-                            smallest_dist = max(bbox.right - owner_rect.left, delta_movement.x)
-                            final_movement_veloc.x = max(smallest_dist, final_movement_veloc.x)
-                        break
-        else:
-            final_movement_veloc.x = delta_movement.x
-
-        self.owner.rect.move_ip(final_movement_veloc.x, 0)
-
-
-        # Y
-        owner_rect = self.owner.rect
-        direction = 0
-        start_tile = -999
-        target_tile = -999
-
-
-        if self.owner.velocity.y > tolerance: # Down 
-            start_tile = int(owner_rect.bottom / TILE_SIZE)
-            target_tile = int((owner_rect.bottom + delta_movement.y) / TILE_SIZE)
-            direction = 1 # Down 
-        elif self.owner.velocity.y < -tolerance: # Up 
-            start_tile = int(owner_rect.top / TILE_SIZE)
-            target_tile = int((owner_rect.top + delta_movement.y) / TILE_SIZE)
-            direction = -1 # Up 
-        start_width = int((owner_rect.left + 5) / TILE_SIZE)
-        end_width = int((owner_rect.right - 5) / TILE_SIZE)
-
-        if direction != 0:
-            y_range = range(start_tile - 1, target_tile + 1, direction) if direction == 1 else range(target_tile + 1, start_height - 1, direction)
-            for i in range(start_width, end_width + 1):
-                for j in y_range:
-                    # Get tile, skip if not existent/has no property
-                    try: 
-                        properties = GameMap.get_tile_properties(i, j)
-                        if not properties: continue
-                    except:
-                        continue
-
-                    if properties and properties.get(MapInfo.SOLID.value) or properties.get(MapInfo.SEMISOLID.value):
-                        bbox = pygame.Rect((i * TILE_SIZE, j * TILE_SIZE), (TILE_SIZE, TILE_SIZE))
-                        self.owner.velocity.y = 0
-                        if direction == 1: # Down 
-                            smallest_dist = min(bbox.top - owner_rect.bottom, delta_movement.y)
-                            final_movement_veloc.y = min(smallest_dist, final_movement_veloc.y)
-                        else: # Up 
-                            smallest_dist = max(bbox.bottom - owner_rect.top, delta_movement.y)
-                            final_movement_veloc.y = max(smallest_dist, final_movement_veloc.y)
-                        break
-        else:
-            final_movement_veloc.y = delta_movement.y
-
-        self.owner.rect.move_ip(0, final_movement_veloc.y)
+        owner = self.owner
+        rect = owner.rect
+        velocity = owner.velocity
+        result = owner.world.sweep_rect(rect.x, rect.y, rect.width, rect.height,
+                                        velocity.x * deltatime, velocity.y * deltatime)
+        self.apply_sweep(result)
+        return result
+
+    def apply_sweep(self, result):
+        """
+        Moves the owner by the result of a sweep, stopping it along any axis that hit something
+        :param result: SweepResult for the owner's rect
+        """
+        normal_x, normal_y = result.normal
+        if normal_x:
+            self.owner.velocity.x = 0
+        if normal_y:
+            self.owner.velocity.y = 0
+        self.owner.rect.move_ip(result.dx, result.dy)
+        self.last_sweep = result
+        self.owner.world.spatial_hash.move(self.owner)
                  
+# Pixels below an entity's feet that are checked for ground
+GROUND_PROBE = 5
+
 class GravityComponent(Component):
     """ Allows Entities to experience the effects of gravity."""
 
-    GRAVITY = 9.8 * 50 
+    __slots__ = ('state', 'should_apply_gravity', 'GRAVITY')
+
+    # On the ground, should_apply_gravity
+    STATE_FORMAT = '??'
 
     def __init__(self, owner):
         super().__init__(owner)
@@ -131,6 +105,8 @@ class GravityComponent(Component):
         self.state = GravityCompState.AIR
         # Used to make sure gravity is only applied once when leaving the ground 
         self.should_apply_gravity = True 
+        # Gravity Constants (per instance, so they can be tuned per entity)
+        self.GRAVITY = 9.8 * 50 
 
     def left_ground(self):
         """
@@ -146,35 +122,57 @@ class GravityComponent(Component):
         self.state = GravityCompState.GROUND
         self.should_apply_gravity = False
 
+    # Override
+    def get_state(self):
+        return (self.state == GravityCompState.GROUND, self.should_apply_gravity)
+
+    # Override
+    def set_state(self, state):
+        on_ground, self.should_apply_gravity = state
+        self.state = GravityCompState.GROUND if on_ground else GravityCompState.AIR
+
     def update(self, delta):
 
-        # Get floor tile
-        TILE_SIZE = GameMap.map_data.tilewidth
-        player_tile_x = int(self.owner.rect.midbottom[0] / TILE_SIZE)
-        player_tile_y = int((self.owner.rect.midbottom[1] + 5) / TILE_SIZE)
-        try:
-            properties = GameMap.get_tile_properties(player_tile_x, player_tile_y)
-        except:
-            print('Out of Bounds check for Gravity Comp...')
-            properties = None
+        # Check under the owner's feet (out of bounds tiles have no flags)
+        rect = self.owner.rect
+        self.update_ground(ground_at(self.owner.world.collision_grid, rect.centerx, rect.bottom, GROUND_PROBE))
 
+    # Override
+    def update_all(components, delta):
+        """
+        Ground-state system: probes the ground under every component's owner in one batched lookup,
+        then updates their states from the result. The components all come from one world's systems
+        """
+        if not components:
+            return
+        rects = [component.owner.rect for component in components]
+        on_ground = components[0].owner.world.probe_ground([rect.centerx for rect in rects], [rect.bottom for rect in rects],
+                                         GROUND_PROBE)
+        for component, grounded in zip(components, on_ground.tolist()):
+            component.update_ground(grounded)
+
+    def update_ground(self, on_ground):
+        """
+        Moves between the air and ground states, and starts or stops gravity's pull
+        :param on_ground: whether there is ground just under the owner
+        """
+        # (Members are compared by identity: GravityCompState's __eq__ is slow for a per-entity path)
         # Air -> Ground
-        if self.state == GravityCompState.AIR:
-            if properties and (properties.get(MapInfo.SOLID.value) or properties.get(MapInfo.SEMISOLID.value)):
+        if self.state is GravityCompState.AIR:
+            if on_ground:
                 self.entered_ground()
                  
         # Ground -> Air
-        elif self.state == GravityCompState.GROUND:
-            if not properties:
-                self.left_ground()
-                
+        elif not on_ground:
+            self.left_ground()
 
         # If in the air, and needs to apply gravity
-        if self.state == GravityCompState.AIR and self.should_apply_gravity:
-            self.owner.acceleration.y = self.GRAVITY
-            self.should_apply_gravity = False 
+        if self.state is GravityCompState.AIR:
+            if self.should_apply_gravity:
+                self.owner.acceleration.y = self.GRAVITY
+                self.should_apply_gravity = False 
         # If on the ground
-        elif self.state == GravityCompState.GROUND and self.owner.acceleration.y > 0:
+        elif self.owner.acceleration.y > 0:
             self.owner.acceleration.y = 0 
             self.should_apply_gravity = False
 
@@ -189,6 +187,14 @@ class GravityCompState(Enum):
 class PlayerComponent(Component):
     """ Component for player entity, handling all abilities a player can do"""
 
+    __slots__ = ('state', 'power_up', '_jump_time', '_cur_jump', '_no_jump', '_hold_jump', 'gravity', 'buttons',
+                 'pressed', 'released',
+                 'MAX_RUN_SPEED', 'MAX_WALK_SPEED', 'WALK_ACCELERATION', 'RUN_ACCELERATION', 'JUMP_POWER',
+                 'TRACTION', 'AIR_TRACTION', 'NUMBER_JUMPS', 'JUMP_DURATION')
+
+    # state, power_up, _jump_time, _cur_jump, _no_jump, _hold_jump, buttons, pressed, released
+    STATE_FORMAT = 'BBdi??III'
+
     def __init__(self, owner):
         super().__init__(owner)
         # Player State
@@ -199,6 +205,7 @@ class PlayerComponent(Component):
         self._cur_jump = 0 # Describes how many jumps the player has left
         self._no_jump = False # Whether the player can jump
         self._hold_jump = False # Whether a jump button is being held
+        self.gravity = None # Owner's GravityComponent (set once added)
         # Player Constants
         self.MAX_RUN_SPEED = 200 
         self.MAX_WALK_SPEED = 90 
@@ -211,8 +218,11 @@ class PlayerComponent(Component):
         self.JUMP_DURATION = 0.3
         # Set Player Entity Constants
         self.owner.target_x_speed = self.MAX_RUN_SPEED
-        # Create Buttons list (!) should be set before update is called
-        self.buttons = [] 
+        # Button masks (see Buttons.BUTTON_BITS) of the buttons held, and of those pressed and released since
+        # the step before. Set with set_buttons before update is called
+        self.buttons = 0
+        self.pressed = 0
+        self.released = 0
 
     # Override
     def was_added(self):
@@ -221,33 +231,53 @@ class PlayerComponent(Component):
         """ 
         assert self.owner.components.get(GravityComponent.id_class), "Player missing Gravity Component"
         assert self.owner.components.get(CollisionComponent.id_class), "Player missing Collision Component"
+        # Looked up once instead of every update
+        self.gravity = self.owner.components[GravityComponent.id_class]
+
+    # Override
+    def get_state(self):
+        return (self.state.value, self.power_up.value, self._jump_time, self._cur_jump, self._no_jump, self._hold_jump,
+                self.buttons, self.pressed, self.released)
+
+    # Override
+    def set_state(self, state):
+        (state_value, power_up_value, self._jump_time, self._cur_jump, self._no_jump, self._hold_jump,
+         self.buttons, self.pressed, self.released) = state
+        self.state = PlayerState(state_value)
+        self.power_up = PowerUp(power_up_value)
+
+    def set_buttons(self, mask):
+        """
+        Sets the buttons held for the next update, working out which were just pressed or released
+        :param mask: button mask from an input source
+        """
+        self.pressed = mask & ~self.buttons
+        self.released = self.buttons & ~mask
+        self.buttons = mask
 
     def update(self, delta):
         # Update with player keypresses
+        buttons = self.buttons
+        run = bool(buttons & _RUN)
         # Movement
-        if self.buttons[Buttons.MOVE_LEFT.value]:
-            if self.buttons[Buttons.RUN.value]:
-                self.move(True, run=True)
-            else:
-                self.move(True, run=False)
-        if self.buttons[Buttons.MOVE_RIGHT.value]:
-            if self.buttons[Buttons.RUN.value]:
-                self.move(False, run=True)
-            else:
-                self.move(False, run=False)
+        if buttons & _MOVE_LEFT:
+            self.move(True, run=run)
+        if buttons & _MOVE_RIGHT:
+            self.move(False, run=run)
         # Apply Traction if player is not moving to kill acceleration
-        if not (self.buttons[Buttons.MOVE_LEFT.value] or self.buttons[Buttons.MOVE_RIGHT.value]):
+        if not buttons & _MOVE:
             self.apply_traction()
         # Crouch
-        if self.buttons[Buttons.CROUCH.value]:
-            print('crouch')
+        if buttons & _CROUCH:
+            if __debug__ and _log.debug_on:
+                _log.debug('crouch', owner=self.owner)
             self.crouch()
         # Jumps
         if not self._no_jump:
-            if self.buttons[Buttons.JUMP.value]:
+            if buttons & _JUMP:
                 self.jump(delta, spin=False)
-            elif self.buttons[Buttons.SPIN.value]:
-                self.jump(spin=True)
+            elif buttons & _SPIN:
+                self.jump(delta, spin=True)
             elif self.state == PlayerState.JUMP or self.state == PlayerState.SPIN:
                 if self._hold_jump:
                     self.increment_jump()
@@ -256,7 +286,7 @@ class PlayerComponent(Component):
                     self._no_jump = True
 
         # Update States
-        if self.owner.components[GravityComponent.id_class].state == GravityCompState.GROUND:
+        if self.gravity.state == GravityCompState.GROUND:
             self.state = PlayerState.STAND
             self.reset_jumps()
         tolerance = 0.5
@@ -276,7 +306,7 @@ class PlayerComponent(Component):
         self._hold_jump = True
         if self._jump_time <= self.JUMP_DURATION:
             self.owner.velocity.y = self.JUMP_POWER
-            self.owner.components[GravityComponent.id_class].left_ground()
+            self.gravity.left_ground()
             self.state = PlayerState.JUMP
 
     def move(self, left, run=False):
@@ -296,7 +326,7 @@ class PlayerComponent(Component):
         """
         Makes the player slow to a stop when not moving
         """
-        if self.owner.components[GravityComponent].state == GravityCompState.GROUND:
+        if self.gravity.state == GravityCompState.GROUND:
             traction = self.TRACTION
         else:
             traction = self.AIR_TRACTION
@@ -3,7 +3,10 @@ from pygame.locals import *
 from pygame.math import Vector2
 from abc import ABC, abstractmethod
 from enum import Enum
+from time import perf_counter
 from Entities.Components.Components import CollisionComponent
+from Entities.ActiveRegion import SleepState
+from Debug.Profiler import Profiler
 
 class Entity(ABC, pygame.sprite.Sprite):
     """
@@ -13,9 +16,20 @@ class Entity(ABC, pygame.sprite.Sprite):
     # Constants 
     MAX_Y_SPEED = 1000 # Terminal Velocity
     MAX_X_SPEED = 1000
+    # x, y, velocity, acceleration, target_x_speed, target_y_speed (see Entities.Snapshot)
+    STATE_FORMAT = '8d'
 
-    def __init__(self):
+    def __init__(self, world):
+        """
+        :param world: GameMap the entity lives in. Its components are stored in the world's systems
+        """
         pygame.sprite.Sprite.__init__(self)
+        self.world = world
+        # BatchPhysics the entity's movement is stored in (None if it updates itself)
+        self._physics = None
+        self._physics_index = None
+        # ActiveRegion tracking the entity (None if it isn't culled)
+        self._region = None
         # Movement
         self.velocity = Vector2()
         self.acceleration = Vector2()
@@ -24,18 +38,147 @@ class Entity(ABC, pygame.sprite.Sprite):
         self.target_y_speed = 1000
         # Components
         self.components = {}
+        # Whether the entity is simulated (see ActiveRegion)
+        self.sleep_state = SleepState.AWAKE
+
+    @property
+    def velocity(self):
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, value):
+        if self._physics:
+            self._velocity.x, self._velocity.y = value
+        else:
+            self._velocity = Vector2(value)
+
+    @property
+    def acceleration(self):
+        return self._acceleration
+
+    @acceleration.setter
+    def acceleration(self, value):
+        if self._physics:
+            self._acceleration.x, self._acceleration.y = value
+        else:
+            self._acceleration = Vector2(value)
+
+    @property
+    def target_x_speed(self):
+        if self._physics:
+            return float(self._physics.max_speeds[self._physics_index, 0])
+        return self._target_x_speed
+
+    @target_x_speed.setter
+    def target_x_speed(self, value):
+        if self._physics:
+            self._physics.max_speeds[self._physics_index, 0] = value
+        else:
+            self._target_x_speed = value
+
+    @property
+    def target_y_speed(self):
+        if self._physics:
+            return float(self._physics.max_speeds[self._physics_index, 1])
+        return self._target_y_speed
+
+    @target_y_speed.setter
+    def target_y_speed(self, value):
+        if self._physics:
+            self._physics.max_speeds[self._physics_index, 1] = value
+        else:
+            self._target_y_speed = value
+
+    def get_state(self):
+        """ Returns: tuple of the entity's own movement state, matching STATE_FORMAT"""
+        physics = self._physics
+        if physics:
+            # The stage's position keeps the fraction of a pixel that the rect drops
+            x, y = physics.positions[self._physics_index].tolist()
+        else:
+            x, y = self.rect.topleft
+        velocity = self.velocity
+        acceleration = self.acceleration
+        return (x, y, velocity.x, velocity.y, acceleration.x, acceleration.y,
+                self.target_x_speed, self.target_y_speed)
+
+    def set_state(self, state):
+        """
+        Restores state returned by get_state
+        :param state: tuple matching STATE_FORMAT
+        """
+        x, y, velocity_x, velocity_y, acceleration_x, acceleration_y, target_x_speed, target_y_speed = state
+        self.rect.topleft = (x, y)
+        if self._physics:
+            self._physics.positions[self._physics_index] = (x, y)
+        self.velocity = (velocity_x, velocity_y)
+        self.acceleration = (acceleration_x, acceleration_y)
+        self.target_x_speed = target_x_speed
+        self.target_y_speed = target_y_speed
 
     def add_component(self, component):
         self.components[component.id_class] = component
+        self.world.systems.add(component)
         component.was_added()
 
+    def remove_component(self, component_class):
+        """
+        Removes a component from the entity
+        :param component_class: id_class of the component to remove
+        Returns: the removed component
+        """
+        component = self.components.pop(component_class)
+        self.world.systems.remove(component)
+        component.was_removed()
+        return component
+
+    def sleep(self):
+        """ Takes the entity's components out of its world's systems update (see ActiveRegion)"""
+        systems = self.world.systems
+        for component in self.components.values():
+            systems.remove(component)
+
+    def wake(self):
+        """ Puts the entity's components back into its world's systems update"""
+        systems = self.world.systems
+        for component in self.components.values():
+            if component._store_index is None:
+                systems.add(component)
+
+    def kill(self):
+        """ Removes the entity from all groups, its ActiveRegion and BatchPhysics, and lets its components clean up"""
+        pygame.sprite.Sprite.kill(self)
+        if self._region:
+            self._region.discard(self)
+        if self._physics is not None:
+            self._physics.remove(self)
+        systems = self.world.systems
+        for component in self.components.values():
+            systems.remove(component)
+            component.was_removed()
+
     @abstractmethod
     def update(self, deltatime):
+        self.move(deltatime)
+        self.update_components(deltatime)
+
+    def move(self, deltatime):
+        """
+        Moves the entity by its velocity (against the map if it has a CollisionComponent), then
+        accelerates and clamps its velocity. Components are updated separately (see Systems)
+        :param deltatime: change in time, in seconds
+        """
         clamp_func = lambda val, max_val, min_val: max(min(val, max_val), min_val)
 
         # Velocity
         if self.components.get(CollisionComponent.id_class):
-            self.components.get(CollisionComponent.id_class).move_without_collision(deltatime)
+            profiler = Profiler.active
+            if profiler:
+                start = perf_counter()
+                self.components.get(CollisionComponent.id_class).move_without_collision(deltatime)
+                profiler.add(CollisionComponent.__name__, perf_counter() - start)
+            else:
+                self.components.get(CollisionComponent.id_class).move_without_collision(deltatime)
         else:
             self.rect.move_ip(self.velocity.x * deltatime, self.velocity.y * deltatime)
         # Acceleration
@@ -52,7 +195,15 @@ class Entity(ABC, pygame.sprite.Sprite):
         else:
             self.velocity.y = clamp_func(self.velocity.y, 0, -self.target_y_speed)
 
-        # Update all components
+    def update_components(self, deltatime):
+        """ Updates all components, timing each component class if a Profiler is active"""
+        profiler = Profiler.active
+        if profiler is None:
+            for component in self.components.values():
+                component.update(deltatime)
+            return
         for component in self.components.values():
+            start = perf_counter()
             component.update(deltatime)
+            profiler.add(type(component).__name__, perf_counter() - start)
 
@@ -0,0 +1,233 @@
+from time import perf_counter
+
+import numpy as np
+from pygame.math import Vector2
+
+from Debug.Profiler import Profiler
+from Entities.Components.Components import CollisionComponent
+
+"""
+Batched physics stage. Stores the movement of many entities in NumPy arrays so they can be integrated
+and clamped in one vectorized pass per frame instead of one Entity.update call per sprite
+"""
+
+class VectorView(object):
+    """ Vector2-like view of one row of a BatchPhysics array. Writes go straight into the array"""
+
+    __slots__ = ('array', 'index')
+
+    def __init__(self, array, index):
+        """
+        :param array: (n, 2) NumPy array the vector lives in
+        :param index: row of the array
+        """
+        self.array = array
+        self.index = index
+
+    @property
+    def x(self):
+        return float(self.array[self.index, 0])
+
+    @x.setter
+    def x(self, value):
+        self.array[self.index, 0] = value
+
+    @property
+    def y(self):
+        return float(self.array[self.index, 1])
+
+    @y.setter
+    def y(self, value):
+        self.array[self.index, 1] = value
+
+    def length(self):
+        """ Returns: Euclidean length of the vector"""
+        x, y = self.array[self.index].tolist()
+        return (x * x + y * y) ** 0.5
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, i):
+        return float(self.array[self.index, i])
+
+    def __iter__(self):
+        return iter(self.array[self.index].tolist())
+
+    def __mul__(self, scalar):
+        return Vector2(*self.array[self.index].tolist()) * scalar
+
+    __rmul__ = __mul__
+
+    def __iadd__(self, other):
+        row = self.array[self.index]
+        row[0] += other[0]
+        row[1] += other[1]
+        return self
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return '<VectorView' + str(tuple(self)) + '>'
+
+class BatchPhysics(object):
+    """
+    Opt-in physics stage that integrates every added entity of one world at once. Each step also runs
+    the world's component systems, so every live entity is expected to be in the stage.
+
+    While an entity is added, its velocity, acceleration, target_x_speed and target_y_speed live in
+    this stage's arrays and the entity's attributes are views into them. Entities with a
+    CollisionComponent still move themselves against the map (their rect is the source of their
+    position); for every other entity the position array is authoritative and its rect mirrors it
+    after each step.
+    """
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, world, capacity=INITIAL_CAPACITY):
+        """
+        :param world: GameMap the entities live in
+        :param capacity: number of entities to allocate room for up front
+        """
+        self.world = world
+        self.count = 0
+        self.entities = []
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.accelerations = np.zeros((capacity, 2))
+        self.max_speeds = np.zeros((capacity, 2))
+        # 1 for entities the stage moves, 0 for entities with a CollisionComponent
+        self.free = np.zeros(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, entity):
+        return entity._physics is self
+
+    def add(self, entity):
+        """
+        Moves an entity's movement state into the stage's arrays
+        :param entity: Entity with a rect. Is removed from any other BatchPhysics first
+        """
+        if entity._physics is self:
+            return
+        if entity._physics is not None:
+            entity._physics.remove(entity)
+        if self.count == len(self.positions):
+            self._grow(2 * len(self.positions))
+
+        slot = self.count
+        self.count += 1
+        self.entities.append(entity)
+        self.positions[slot] = entity.rect.topleft
+        self.velocities[slot] = tuple(entity.velocity)
+        self.accelerations[slot] = tuple(entity.acceleration)
+        self.max_speeds[slot] = (entity.target_x_speed, entity.target_y_speed)
+        self.free[slot] = 0 if entity.components.get(CollisionComponent.id_class) else 1
+
+        entity._physics = self
+        entity._physics_index = slot
+        entity._velocity = VectorView(self.velocities, slot)
+        entity._acceleration = VectorView(self.accelerations, slot)
+
+    def remove(self, entity):
+        """
+        Hands an entity's movement state back to the entity
+        :param entity: Entity previously added to this stage
+        """
+        if entity._physics is not self:
+            raise ValueError(str(entity) + ' is not in this BatchPhysics')
+        slot = entity._physics_index
+        velocity = Vector2(tuple(entity._velocity))
+        acceleration = Vector2(tuple(entity._acceleration))
+        target_x_speed, target_y_speed = self.max_speeds[slot].tolist()
+        if self.free[slot]:
+            entity.rect.topleft = self.positions[slot].tolist()
+
+        # Fill the gap with the last entity to keep the arrays dense
+        last = self.count - 1
+        if slot != last:
+            moved = self.entities[last]
+            self.entities[slot] = moved
+            for array in (self.positions, self.velocities, self.accelerations, self.max_speeds):
+                array[slot] = array[last]
+            self.free[slot] = self.free[last]
+            moved._physics_index = slot
+            moved._velocity.index = slot
+            moved._acceleration.index = slot
+        self.entities.pop()
+        self.count = last
+
+        entity._physics = None
+        entity._physics_index = None
+        entity._velocity = velocity
+        entity._acceleration = acceleration
+        entity.target_x_speed = target_x_speed
+        entity.target_y_speed = target_y_speed
+
+    def step(self, deltatime):
+        """
+        Does the work of Entity.update for every entity in the stage
+        :param deltatime: change in time, in seconds
+        """
+        n = self.count
+        if not n:
+            return
+        positions = self.positions[:n]
+        velocities = self.velocities[:n]
+        free = self.free[:n]
+
+        # Velocity (entities with collision are swept through the map together, with the old velocity)
+        colliding = np.flatnonzero(free == 0)
+        if len(colliding):
+            profiler = Profiler.active
+            if profiler:
+                start = perf_counter()
+            entities = self.entities
+            colliding_entities = [entities[i] for i in colliding.tolist()]
+            results = self.world.sweep_rects([entity.rect for entity in colliding_entities],
+                                             (velocities[colliding] * deltatime).tolist())
+            for entity, result in zip(colliding_entities, results):
+                entity.components[CollisionComponent.id_class].apply_sweep(result)
+            if profiler:
+                profiler.add(CollisionComponent.__name__, perf_counter() - start)
+        positions += velocities * (deltatime * free)[:, np.newaxis]
+
+        # Acceleration
+        velocities += deltatime * self.accelerations[:n]
+        # Clamp
+        max_speeds = self.max_speeds[:n]
+        np.clip(velocities, -max_speeds, max_speeds, out=velocities)
+
+        # Update all components, a type at a time
+        self.world.systems.update(deltatime)
+
+        self.sync_positions()
+
+    def sync_positions(self):
+        """ Copies positions between the arrays and rects (rect -> array for colliding entities, array -> rect otherwise)"""
+        n = self.count
+        positions = self.positions
+        for i, (entity, xy, is_free) in enumerate(zip(self.entities, positions[:n].tolist(), self.free[:n].tolist())):
+            if is_free:
+                entity.rect.topleft = xy
+            else:
+                positions[i] = entity.rect.topleft
+
+    def _grow(self, capacity):
+        """ Reallocates the arrays with room for capacity entities"""
+        def grown(array):
+            new_array = np.zeros((capacity,) + array.shape[1:])
+            new_array[:len(array)] = array
+            return new_array
+        self.positions = grown(self.positions)
+        self.velocities = grown(self.velocities)
+        self.accelerations = grown(self.accelerations)
+        self.max_speeds = grown(self.max_speeds)
+        self.free = grown(self.free)
+        # Views point at the old arrays
+        for entity in self.entities:
+            entity._velocity.array = self.velocities
+            entity._acceleration.array = self.accelerations
@@ -3,6 +3,7 @@ import Input.Buttons
 import constants
 import pygame
 from Entities.Entity import Entity
+from Resources.Assets import Assets
 from pygame.locals import *
 from Entities.Components.Components import CollisionComponent
 from Entities.Components.Components import GravityComponent
@@ -10,14 +11,16 @@ from Entities.Components.Components import PlayerComponent
 
 class Player(Entity):
 
-    def __init__(self, position=None):
+    def __init__(self, world, position=None):
         """
         Initializes player
+        :param world: GameMap the player lives in
         :param position: starting position of player. 0, 0 by default
         """
-        super().__init__()
+        super().__init__(world)
 
-        self.image = pygame.image.load(constants.DEBUG_IMG).convert_alpha()
+        # Loaded once and shared by every player
+        self.image = Assets.image(constants.DEBUG_IMG)
         if position:
             self.rect = self.image.get_rect(center=position)
         else:
@@ -0,0 +1,128 @@
+import struct
+
+"""
+Snapshots of the simulation state of a set of entities. Each entity's own state (Entity.get_state)
+and that of each of its components (Component.get_state) are packed one after another into a flat
+byte buffer, so saving or restoring a frame is one struct pack or unpack per entity.
+
+Snapshots cover a fixed set of entities: entities spawned or killed between saving and restoring
+aren't tracked.
+"""
+
+# struct.Struct of an entity's state, by (entity class, component classes in order)
+_structs = {}
+
+def _value_count(state_format):
+    """ Returns: number of values a struct format packs"""
+    packer = struct.Struct('<' + state_format)
+    return len(packer.unpack(bytes(packer.size)))
+
+def entity_struct(entity):
+    """ Returns: struct.Struct packing the state of an entity and its components"""
+    key = (type(entity),) + tuple(type(component) for component in entity.components.values())
+    packer = _structs.get(key)
+    if packer is None:
+        packer = struct.Struct('<' + entity.STATE_FORMAT +
+                               ''.join(component.STATE_FORMAT for component in entity.components.values()))
+        _structs[key] = packer
+    return packer
+
+class Snapshot(object):
+    """ Layout of the state of a fixed list of entities in a flat buffer"""
+
+    def __init__(self, entities):
+        """
+        :param entities: entities to save the state of, in a fixed order
+        """
+        self.entities = list(entities)
+        # (entity, struct, offset, own, [(component, start, end)]) where :own are the entity's values and
+        # start:end the component's
+        self.layout = []
+        offset = 0
+        for entity in self.entities:
+            packer = entity_struct(entity)
+            components = []
+            own = start = _value_count(entity.STATE_FORMAT)
+            for component in entity.components.values():
+                end = start + _value_count(component.STATE_FORMAT)
+                components.append((component, start, end))
+                start = end
+            self.layout.append((entity, packer, offset, own, components))
+            offset += packer.size
+        # Bytes per snapshot
+        self.size = offset
+
+    def save(self, buffer=None, offset=0):
+        """
+        Packs the state of every entity
+        :param buffer: writable buffer to pack into. If None, a new bytearray is made
+        :param offset: where the snapshot starts in buffer
+        Returns: buffer
+        """
+        if buffer is None:
+            buffer = bytearray(self.size)
+        for entity, packer, entity_offset, _, components in self.layout:
+            state = entity.get_state()
+            for component, _, _ in components:
+                state += component.get_state()
+            packer.pack_into(buffer, offset + entity_offset, *state)
+        return buffer
+
+    def restore(self, buffer, offset=0):
+        """
+        Sets every entity back to a saved state
+        :param buffer: buffer a snapshot was saved into
+        :param offset: where the snapshot starts in buffer
+        """
+        for entity, packer, entity_offset, own, components in self.layout:
+            state = packer.unpack_from(buffer, offset + entity_offset)
+            entity.set_state(state[:own])
+            for component, start, end in components:
+                component.set_state(state[start:end])
+
+class SnapshotRing(object):
+    """ Keeps snapshots of the last capacity frames in one preallocated buffer, for rewinding and rollback"""
+
+    def __init__(self, entities, capacity=120):
+        """
+        :param entities: entities to save the state of, in a fixed order
+        :param capacity: number of frames kept. Saving more overwrites the oldest
+        """
+        self.snapshot = Snapshot(entities)
+        self.capacity = capacity
+        self.buffer = bytearray(self.snapshot.size * capacity)
+        # Frame number saved in each slot (None if empty)
+        self.frames = [None] * capacity
+
+    def __contains__(self, frame):
+        return self.frames[frame % self.capacity] == frame
+
+    def save(self, frame):
+        """
+        Saves the current state as a frame
+        :param frame: frame number (increasing). Overwrites the frame capacity frames before it
+        """
+        slot = frame % self.capacity
+        self.snapshot.save(self.buffer, slot * self.snapshot.size)
+        self.frames[slot] = frame
+
+    def restore(self, frame):
+        """
+        Sets every entity back to its state at a saved frame
+        :param frame: frame number passed to save
+        """
+        slot = frame % self.capacity
+        if self.frames[slot] != frame:
+            raise KeyError('Frame ' + str(frame) + ' is not in the ring')
+        self.snapshot.restore(self.buffer, slot * self.snapshot.size)
+
+    def latest(self):
+        """ Returns: newest saved frame number, or None if nothing is saved"""
+        saved = [frame for frame in self.frames if frame is not None]
+        return max(saved) if saved else None
+
+    def discard_after(self, frame):
+        """ Forgets saved frames newer than frame, e.g. after rolling back to it"""
+        for slot, saved in enumerate(self.frames):
+            if saved is not None and saved > frame:
+                self.frames[slot] = None
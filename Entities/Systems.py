@@ -0,0 +1,60 @@
+from time import perf_counter
+
+from Debug.Profiler import Profiler
+
+"""
+Dense storage of every live component by type, and the systems that update them. Instead of each
+entity walking its own component dict every frame, each component type is updated in one pass over
+a flat list (by its Component.update_all), in the order the types were first seen.
+"""
+
+class Systems(object):
+    """ Registry of the live components of one world (entities add theirs in Entity.add_component)"""
+
+    def __init__(self):
+        # Component class -> dense list of its live components. Each component's _store_index is its place in the list
+        self.components = {}
+
+    def add(self, component):
+        """ Stores a component so its type's system updates it"""
+        store = self.components.setdefault(type(component), [])
+        component._store_index = len(store)
+        store.append(component)
+
+    def remove(self, component):
+        """ Drops a stored component (does nothing if it isn't stored)"""
+        index = component._store_index
+        if index is None:
+            return
+        store = self.components[type(component)]
+        # Fill the gap with the last component to keep the list dense
+        last = store.pop()
+        if last is not component:
+            store[index] = last
+            last._store_index = index
+        component._store_index = None
+
+    def clear(self):
+        """ Forgets every stored component"""
+        for store in self.components.values():
+            for component in store:
+                component._store_index = None
+        self.components = {}
+
+    def of_type(self, component_class):
+        """ Returns: list of the live components of a class (don't modify it)"""
+        return self.components.get(component_class, [])
+
+    def update(self, deltatime):
+        """
+        Updates every stored component, one component type at a time. Times each type if a Profiler is active
+        :param deltatime: change in time, in seconds
+        """
+        profiler = Profiler.active
+        # Copies, so components can be added or removed by updates
+        for component_class, store in list(self.components.items()):
+            if profiler:
+                start = perf_counter()
+            component_class.update_all(tuple(store), deltatime)
+            if profiler:
+                profiler.add(component_class.__name__, perf_counter() - start)
@@ -16,3 +16,109 @@ class Buttons(Enum):
     SPIN = K_j 
     # Shoot laser if has powerup/Use with MOVE to run
     RUN = K_LSHIFT 
+
+# Bit of each button in a button mask, in declaration order
+BUTTON_BITS = {button: 1 << i for i, button in enumerate(Buttons)}
+
+def buttons_mask(buttons):
+    """ Returns: button mask with an iterable of Buttons set"""
+    mask = 0
+    for button in buttons:
+        mask |= BUTTON_BITS[button]
+    return mask
+
+def to_mask(pressed):
+    """
+    Packs the game's buttons into an int, one bit per button (see BUTTON_BITS)
+    :param pressed: pressed state indexable by key, like pygame.key.get_pressed()
+    Returns: button mask
+    """
+    mask = 0
+    for button, bit in BUTTON_BITS.items():
+        if pressed[button.value]:
+            mask |= bit
+    return mask
+
+def from_mask(mask):
+    """ Returns: list of Buttons set in a button mask"""
+    return [button for button, bit in BUTTON_BITS.items() if mask & bit]
+
+# Default keys of each local player (player one uses the keys in Buttons)
+PLAYER_KEYS = (
+    {button: button.value for button in Buttons},
+    {
+        Buttons.MOVE_RIGHT: K_RIGHT,
+        Buttons.MOVE_LEFT: K_LEFT,
+        Buttons.MOVE_UP: K_UP,
+        Buttons.JUMP: K_RCTRL,
+        Buttons.CROUCH: K_DOWN,
+        Buttons.SPIN: K_RALT,
+        Buttons.RUN: K_RSHIFT,
+    },
+    # Numpad, so no key is shared with another player
+    {
+        Buttons.MOVE_RIGHT: K_KP6,
+        Buttons.MOVE_LEFT: K_KP4,
+        Buttons.MOVE_UP: K_KP8,
+        Buttons.JUMP: K_KP0,
+        Buttons.CROUCH: K_KP5,
+        Buttons.SPIN: K_KP_PERIOD,
+        Buttons.RUN: K_KP_ENTER,
+    },
+)
+
+class Bindings(object):
+    """ Keys and joystick buttons bound to each of the Buttons, looked up straight to button mask bits"""
+
+    def __init__(self, keys=None, joy_buttons=None):
+        """
+        :param keys: dict of Buttons -> key or list of keys. Defaults to player one's keys (PLAYER_KEYS)
+        :param joy_buttons: dict of Buttons -> joystick button number or list of them
+        """
+        # key -> button mask bit, joystick button -> button mask bit
+        self.keys = {}
+        self.joy_buttons = {}
+        for button, keys in (PLAYER_KEYS[0] if keys is None else keys).items():
+            self.bind(button, keys)
+        for button, joy_buttons in (joy_buttons or {}).items():
+            self.bind_joy(button, joy_buttons)
+
+    def bind(self, button, keys):
+        """
+        Remaps a button, replacing the keys bound to it
+        :param button: Buttons member
+        :param keys: key or list of keys
+        """
+        bit = BUTTON_BITS[button]
+        self.keys = {key: key_bit for key, key_bit in self.keys.items() if key_bit != bit}
+        for key in keys if isinstance(keys, (list, tuple)) else [keys]:
+            self.keys[key] = bit
+
+    def bind_joy(self, button, joy_buttons):
+        """
+        Remaps a button, replacing the joystick buttons bound to it
+        :param button: Buttons member
+        :param joy_buttons: joystick button number or list of them
+        """
+        bit = BUTTON_BITS[button]
+        self.joy_buttons = {joy: joy_bit for joy, joy_bit in self.joy_buttons.items() if joy_bit != bit}
+        for joy in joy_buttons if isinstance(joy_buttons, (list, tuple)) else [joy_buttons]:
+            self.joy_buttons[joy] = bit
+
+    def keys_of(self, button):
+        """ Returns: list of keys bound to a button"""
+        bit = BUTTON_BITS[button]
+        return [key for key, key_bit in self.keys.items() if key_bit == bit]
+
+    def remapped(self, names):
+        """
+        Returns: copy of the bindings with some buttons bound to other keys
+        :param names: dict of button name (e.g. 'JUMP') -> key name as pygame.key.name gives it (e.g. 'k').
+        Needs pygame to be initialised
+        """
+        bindings = Bindings({}, {})
+        bindings.keys = dict(self.keys)
+        bindings.joy_buttons = dict(self.joy_buttons)
+        for button_name, key_name in names.items():
+            bindings.bind(Buttons[button_name.upper()], pygame.key.key_code(key_name))
+        return bindings
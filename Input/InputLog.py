@@ -0,0 +1,169 @@
+import struct
+
+from Input.InputSource import InputSource
+
+"""
+Recording and replay of player input. Input is stored as the button mask (see Buttons.BUTTON_BITS) of
+every fixed-step frame, run-length encoded in a small binary log:
+
+    header  '<4sHd I' - MAGIC, VERSION, seconds per frame, number of runs
+    runs    varint frames, varint button mask - repeated for each run
+
+Replaying a log with the same map and frame time reproduces a run exactly.
+"""
+
+MAGIC = b'APIL'
+VERSION = 1
+HEADER = struct.Struct('<4sHdI')
+
+
+def _write_varint(out, value):
+    """ Appends an unsigned int to a bytearray as LEB128"""
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    """ Returns: (value, position after it) of the LEB128 unsigned int at pos"""
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('Input log is truncated')
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+def encode(runs, delta):
+    """
+    :param runs: list of (frames, button mask)
+    :param delta: seconds per frame the input was recorded at
+    Returns: bytes of the input log
+    """
+    out = bytearray(HEADER.pack(MAGIC, VERSION, delta, len(runs)))
+    for frames, mask in runs:
+        _write_varint(out, frames)
+        _write_varint(out, mask)
+    return bytes(out)
+
+def decode(data):
+    """
+    :param data: bytes of an input log
+    Returns: (runs, delta), as passed to encode
+    """
+    if len(data) < HEADER.size:
+        raise ValueError('Not an input log')
+    magic, version, delta, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not an input log')
+    if version != VERSION:
+        raise ValueError('Unsupported input log version ' + str(version))
+    runs = []
+    pos = HEADER.size
+    for _ in range(count):
+        frames, pos = _read_varint(data, pos)
+        mask, pos = _read_varint(data, pos)
+        runs.append((frames, mask))
+    return runs, delta
+
+def load(path):
+    """ Returns: (runs, delta) of the input log at path"""
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+class InputRecorder(InputSource):
+    """ Input source that records the button mask of every frame polled from another source"""
+
+    def __init__(self, source, delta):
+        """
+        :param source: input source to pass input through from
+        :param delta: seconds per frame the game steps by while recording
+        """
+        self.source = source
+        self.delta = delta
+        # [frames, button mask] runs
+        self.runs = []
+
+    @property
+    def done(self):
+        return getattr(self.source, 'done', False)
+
+    @property
+    def frames(self):
+        """ Returns: number of frames recorded"""
+        return sum(frames for frames, _ in self.runs)
+
+    def handle_event(self, event):
+        return self.source.handle_event(event)
+
+    def poll(self):
+        """ Returns: the source's button mask, after recording it"""
+        mask = self.source.poll()
+        if self.runs and self.runs[-1][1] == mask:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, mask])
+        return mask
+
+    def to_bytes(self):
+        """ Returns: the recording as an input log"""
+        return encode(self.runs, self.delta)
+
+    def save(self, path):
+        """ Writes the recording to path as an input log"""
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+class InputReplayer(InputSource):
+    """ Input source that plays back an input log, advancing one frame per poll"""
+
+    def __init__(self, runs, delta, loop=False):
+        """
+        :param runs: list of (frames, button mask)
+        :param delta: seconds per frame the input was recorded at. Replay must step by it to reproduce the run
+        :param loop: whether to restart the log once it ends. Otherwise nothing is pressed after the end
+        """
+        self.runs = [(frames, mask) for frames, mask in runs]
+        self.delta = delta
+        # A log with no frames would loop forever without producing any
+        self.loop = loop and any(frames > 0 for frames, _ in self.runs)
+        self._run = 0
+        self._frame = 0
+        self._skip_finished()
+
+    def from_file(path, loop=False):
+        """ Returns: InputReplayer for the input log at path"""
+        runs, delta = load(path)
+        return InputReplayer(runs, delta, loop=loop)
+
+    @property
+    def done(self):
+        """ Returns: True once every frame of the log has been polled (never for a looping log)"""
+        return self._run >= len(self.runs)
+
+    @property
+    def frames(self):
+        """ Returns: number of frames in the log"""
+        return sum(frames for frames, _ in self.runs)
+
+    def poll(self):
+        """ Returns: button mask for the current frame of the log"""
+        if self.done:
+            return 0
+        mask = self.runs[self._run][1]
+        self._frame += 1
+        self._skip_finished()
+        return mask
+
+    def _skip_finished(self):
+        """ Moves past finished (or empty) runs, so done is True as soon as the last frame is polled"""
+        while self._run < len(self.runs) and self._frame >= self.runs[self._run][0]:
+            self._run += 1
+            self._frame = 0
+            if self.loop and self.done:
+                self._run = 0
@@ -0,0 +1,106 @@
+from abc import ABC, abstractmethod
+
+import pygame
+from pygame.locals import *
+
+from Input.Buttons import Bindings, buttons_mask
+
+"""
+Sources of button input for the players. Each source is polled once per physics step and returns a
+button mask (see Buttons.BUTTON_BITS). Sources driven by pygame events are passed every event first.
+"""
+
+class InputSource(ABC):
+    """ Base input source"""
+
+    # Whether the source has run out of input (sources that never run out leave it False)
+    done = False
+
+    def handle_event(self, event):
+        """
+        Updates the source from a pygame event
+        Returns: True if the event was used
+        """
+        return False
+
+    @abstractmethod
+    def poll(self):
+        """ Returns: button mask of the buttons held for this step"""
+        pass
+
+class KeyboardInput(InputSource):
+    """
+    Live keyboard (and joystick) input. The button mask is kept up to date from KEYDOWN/KEYUP events,
+    so polling doesn't read the whole keyboard
+    """
+
+    def __init__(self, bindings=None, joystick=None):
+        """
+        :param bindings: Bindings of keys to buttons. Defaults to player one's keys
+        :param joystick: instance id of the joystick whose buttons (per bindings.joy_buttons) also press
+        buttons, or None
+        """
+        self.bindings = bindings or Bindings()
+        self.joystick = joystick
+        self.mask = 0
+
+    def handle_event(self, event):
+        """ Sets or clears the bit of a bound key or joystick button. Returns: True if it was bound"""
+        if event.type == KEYDOWN or event.type == KEYUP:
+            bit = self.bindings.keys.get(event.key)
+        elif (event.type == JOYBUTTONDOWN or event.type == JOYBUTTONUP) and event.instance_id == self.joystick:
+            bit = self.bindings.joy_buttons.get(event.button)
+        elif event.type == WINDOWFOCUSLOST:
+            # Keys released while unfocused never send KEYUP
+            self.mask = 0
+            return False
+        else:
+            return False
+        if bit is None:
+            return False
+        if event.type == KEYDOWN or event.type == JOYBUTTONDOWN:
+            self.mask |= bit
+        else:
+            self.mask &= ~bit
+        return True
+
+    def poll(self):
+        """ Returns: button mask of the bound keys held down"""
+        return self.mask
+
+class ScriptedInput(InputSource):
+    """ Plays back a fixed script of button presses, advancing one frame per poll"""
+
+    def __init__(self, script, loop=False):
+        """
+        :param script: list of (frames, buttons) steps, holding buttons (iterable of Buttons) for frames polls
+        :param loop: whether to restart the script once it ends. Otherwise nothing is pressed after the end
+        """
+        self.script = [(frames, buttons_mask(buttons)) for frames, buttons in script]
+        # A script with no frames would loop forever without producing any
+        self.loop = loop and any(frames > 0 for frames, _ in self.script)
+        self._step = 0
+        self._frame = 0
+        self._skip_finished()
+
+    @property
+    def done(self):
+        """ Returns: True once every frame of the script has been polled (never for a looping script)"""
+        return self._step >= len(self.script)
+
+    def poll(self):
+        """ Returns: button mask for the current frame of the script"""
+        if self.done:
+            return 0
+        mask = self.script[self._step][1]
+        self._frame += 1
+        self._skip_finished()
+        return mask
+
+    def _skip_finished(self):
+        """ Moves past finished (or empty) steps, so done is True as soon as the last frame is polled"""
+        while self._step < len(self.script) and self._frame >= self.script[self._step][0]:
+            self._step += 1
+            self._frame = 0
+            if self.loop and self.done:
+                self._step = 0
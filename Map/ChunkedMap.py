@@ -0,0 +1,400 @@
+"""
+Streams a compiled map (see MapCache) in square chunks of tiles, so only the parts of a level near the
+camera and the active entities are held as tile data, collision flags and tile surfaces.
+
+The compiled file stays memory mapped as the backing store. Chunks around the focus rects passed to
+ChunkedMap.stream are copied out of it (and their tile images built) on a background thread, and
+dropped again once nothing is near them. Lookups that need a chunk right away (collision, tile
+properties) load it on the calling thread instead of waiting. Only ChunkedCollisionGrid.as_array, for
+structures built over the whole level (CollisionMesh, SharedTileLayer), reads the compiled file's flags
+directly.
+"""
+
+
+import queue
+import threading
+from array import array
+
+import numpy as np
+import pyscroll
+
+from Debug.Log import Log
+from Map.MapCache import GID_TYPE
+from Map.TileData import CollisionGrid, TileFlag
+
+
+_log = Log('map')
+
+# Tiles along each side of a chunk
+CHUNK_SIZE = 16
+
+
+class MapChunk(object):
+    """ Resident copy of a rectangle of the map"""
+
+    __slots__ = ('x', 'y', 'width', 'height', 'layers', 'flags', 'gids')
+
+    def __init__(self, x, y, width, height, layers, flags, gids):
+        """
+        :param x: x of the chunk's top left tile
+        :param y: y of the chunk's top left tile
+        :param width: width in tiles (chunks on the right and bottom edges can be smaller than CHUNK_SIZE)
+        :param height: height in tiles
+        :param layers: per map layer, list of rows of gids (array), or None if it isn't a tile layer
+        :param flags: row-major bytearray of the main layer's TileFlag bits
+        :param gids: set of gids drawn in the chunk's visible layers
+        """
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.layers = layers
+        self.flags = flags
+        self.gids = gids
+
+
+class ChunkedCollisionGrid(object):
+    """ CollisionGrid over the chunks of a ChunkedMap, loading a chunk as soon as it's queried"""
+
+    def __init__(self, chunked_map):
+        self.map = chunked_map
+        self.width = chunked_map.width
+        self.height = chunked_map.height
+        self.tile_size = chunked_map.tilewidth
+        self.profiles = chunked_map.compiled.collision_grid.profiles
+
+    def in_bounds(self, x, y):
+        """ Returns: True if tile (x, y) is inside the grid"""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get_flags(self, x, y):
+        """
+        Returns: TileFlag bits of tile (x, y), or TileFlag.NONE if out of bounds
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            chunk = self.map.get_chunk(x, y)
+            return chunk.flags[(y - chunk.y) * chunk.width + x - chunk.x]
+        return TileFlag.NONE
+
+    @property
+    def has_slopes(self):
+        """ Returns: True if any tile is sloped (worked out once over the compiled map)"""
+        return self.map.compiled.collision_grid.has_slopes
+
+    def as_array(self):
+        """
+        Returns: (height, width) NumPy view of the whole map's flags (see CollisionGrid.as_array). Not
+        streamed: it's for structures built over the whole level, and reads the compiled file's grid
+        """
+        # Edits are written through to the compiled map's grid, so it's as current as the chunks
+        return self.map.compiled.collision_grid.as_array()
+
+    def near_slope(self, x, y):
+        """ Returns: True if tile (x, y) is within SLOPE_REACH tiles of a slope (see CollisionGrid.near_slope)"""
+        if not self.has_slopes or not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        reach = CollisionGrid.SLOPE_REACH
+        for near_y in range(y - reach, y + reach + 1):
+            for near_x in range(x - reach, x + reach + 1):
+                if self.get_flags(near_x, near_y) & TileFlag.SLOPE:
+                    return True
+        return False
+
+    def get_flags_many(self, xs, ys):
+        """
+        Returns: NumPy array of the TileFlag bits of many tiles (see CollisionGrid.get_flags_many), read
+        from their chunks one chunk at a time
+        """
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        flags = np.zeros(len(xs), dtype=np.uint8)
+        inside = np.flatnonzero((xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height))
+        if not len(inside):
+            return flags
+        xs = xs[inside]
+        ys = ys[inside]
+        chunk_size = self.map.chunk_size
+        chunk_xs = xs // chunk_size
+        chunk_ys = ys // chunk_size
+        keys = chunk_ys * ((self.width + chunk_size - 1) // chunk_size) + chunk_xs
+        for key in np.unique(keys):
+            selected = keys == key
+            first = np.argmax(selected)
+            chunk = self.map.load_now((int(chunk_xs[first]), int(chunk_ys[first])))
+            tiles = np.frombuffer(chunk.flags, dtype=np.uint8).reshape(chunk.height, chunk.width)
+            flags[inside[selected]] = tiles[ys[selected] - chunk.y, xs[selected] - chunk.x]
+        return flags
+
+    def set_flags(self, x, y, flags):
+        """ Overwrites the TileFlag bits of tile (x, y). Kept when the chunk is unloaded"""
+        # The compiled map's grid is a copy on write mapping, so the edit outlives the chunk
+        self.map.compiled.collision_grid.set_flags(x, y, flags)
+        chunk = self.map.get_chunk(x, y)
+        chunk.flags[(y - chunk.y) * chunk.width + x - chunk.x] = flags
+
+
+class ChunkedMap(object):
+    """
+    Map streamed in chunks from a CompiledMap. Has the same interface as CompiledMap (sizes, layers,
+    tile_properties, get_tile_properties, get_tile_image) plus stream() to move the loaded area.
+    """
+
+    def __init__(self, compiled, load_images=True, chunk_size=CHUNK_SIZE, radius=1):
+        """
+        :param compiled: CompiledMap loaded without images
+        :param load_images: whether to build tile surfaces for loaded chunks (not needed headless)
+        :param chunk_size: tiles along each side of a chunk
+        :param radius: chunks kept loaded around each focus rect, past the ones it touches
+        """
+        self.compiled = compiled
+        self.filename = compiled.filename
+        self.width = compiled.width
+        self.height = compiled.height
+        self.tilewidth = compiled.tilewidth
+        self.tileheight = compiled.tileheight
+        self.properties = compiled.properties
+        self.main_layer = compiled.main_layer
+        self.tile_index = compiled.tile_index
+        self.tile_properties = compiled.tile_properties
+        # Full layers stay in the memory mapped file; chunks hold the resident copies
+        self.layers = compiled.layers
+        self.load_images = load_images
+        self.chunk_size = chunk_size
+        self.radius = radius
+        self.collision_grid = ChunkedCollisionGrid(self)
+
+        # (chunk x, chunk y) -> MapChunk
+        self.chunks = {}
+        # gid -> surface, and how many loaded chunks use it
+        self.images = {}
+        self._image_users = {}
+        # Chunks waiting for the background thread
+        self._pending = set()
+        # Chunks loaded since the last call to take_loaded
+        self._loaded = []
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._work, name='map-streamer', daemon=True)
+        self._thread.start()
+
+    @property
+    def visible_tile_layers(self):
+        """ Returns: indices of visible tile layers"""
+        return self.compiled.visible_tile_layers
+
+    def chunk_key(self, x, y):
+        """ Returns: (chunk x, chunk y) of the chunk holding tile (x, y)"""
+        return x // self.chunk_size, y // self.chunk_size
+
+    def get_chunk(self, x, y):
+        """ Returns: MapChunk holding tile (x, y), loading it now if it isn't resident"""
+        chunk = self.chunks.get((x // self.chunk_size, y // self.chunk_size))
+        if chunk is None:
+            chunk = self.load_now(self.chunk_key(x, y))
+        return chunk
+
+    def get_tile_gid(self, x, y, layer):
+        """ Returns: gid at (x, y) of a tile layer. Raises ValueError if out of bounds"""
+        if not (0 <= x < self.width and 0 <= y < self.height and layer >= 0):
+            raise ValueError('Coords: ' + str((x, y)) + ' in layer ' + str(layer) + ' is invalid.')
+        chunk = self.get_chunk(x, y)
+        return chunk.layers[layer][y - chunk.y][x - chunk.x]
+
+    def get_tile_properties(self, x, y, layer):
+        """ Returns: properties of the tile at (x, y) of a layer, or None if it has none"""
+        return self.tile_properties.get(self.get_tile_gid(x, y, layer))
+
+    def get_tile_image(self, x, y, layer):
+        """
+        Returns: image of the tile at (x, y) of a layer, or None if empty or its chunk isn't loaded yet
+        (drawing never waits on the background thread)
+        """
+        chunk = self.chunks.get((x // self.chunk_size, y // self.chunk_size))
+        if chunk is None or not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return self.images.get(chunk.layers[layer][y - chunk.y][x - chunk.x])
+
+    def stream(self, rects):
+        """
+        Queues chunks near the focus rects for loading, and unloads chunks that are far from all of them
+        :param rects: pixel rects to keep loaded around (the camera view, active entities)
+        """
+        wanted = self._chunks_around(rects, self.radius)
+        # One more chunk of slack before unloading, so chunks on the edge don't load and unload every frame
+        kept = self._chunks_around(rects, self.radius + 1)
+        with self._lock:
+            for key in wanted:
+                if key not in self.chunks and key not in self._pending:
+                    self._pending.add(key)
+                    self._requests.put(key)
+            # Requests that are no longer wanted are skipped by the thread
+            self._pending &= kept
+            for key in [key for key in self.chunks if key not in kept]:
+                self._unload(key)
+
+    def take_loaded(self):
+        """ Returns: list of (chunk x, chunk y) loaded since the last call"""
+        with self._lock:
+            loaded = self._loaded
+            self._loaded = []
+        return loaded
+
+    def chunk_rect(self, key):
+        """ Returns: (x, y, width, height) in tiles of a chunk"""
+        x = key[0] * self.chunk_size
+        y = key[1] * self.chunk_size
+        return x, y, min(self.chunk_size, self.width - x), min(self.chunk_size, self.height - y)
+
+    def load_now(self, key):
+        """
+        Loads a chunk on this thread (if it isn't already)
+        Returns: the MapChunk
+        """
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            return chunk
+        if __debug__ and _log.debug_on:
+            _log.debug('chunk_miss', chunk=key)
+        chunk, images = self._build(key)
+        with self._lock:
+            self._pending.discard(key)
+            return self._install(key, chunk, images)
+
+    def close(self):
+        """ Stops the background thread"""
+        self._requests.put(None)
+        self._thread.join()
+
+    def _chunks_around(self, rects, radius):
+        """ Returns: set of keys of chunks within radius chunks of any of the pixel rects"""
+        chunk_width = self.chunk_size * self.tilewidth
+        chunk_height = self.chunk_size * self.tileheight
+        last_x = (self.width - 1) // self.chunk_size
+        last_y = (self.height - 1) // self.chunk_size
+        keys = set()
+        for rect in rects:
+            left = max(0, int(rect[0] // chunk_width) - radius)
+            top = max(0, int(rect[1] // chunk_height) - radius)
+            right = min(last_x, int((rect[0] + rect[2]) // chunk_width) + radius)
+            bottom = min(last_y, int((rect[1] + rect[3]) // chunk_height) + radius)
+            for chunk_y in range(top, bottom + 1):
+                for chunk_x in range(left, right + 1):
+                    keys.add((chunk_x, chunk_y))
+        return keys
+
+    def _build(self, key):
+        """
+        Copies a chunk out of the compiled map, without touching shared state
+        Returns: (MapChunk, dict of gid -> surface for images no loaded chunk has)
+        """
+        x, y, width, height = self.chunk_rect(key)
+        layers = []
+        for layer in self.compiled.layers:
+            if layer.data is None:
+                layers.append(None)
+            else:
+                layers.append([array(GID_TYPE, layer.data[row][x:x + width]) for row in range(y, y + height)])
+
+        source = self.compiled.collision_grid.flags
+        flags = bytearray()
+        for row in range(y, y + height):
+            start = row * self.width + x
+            flags.extend(source[start:start + width])
+
+        gids = set()
+        for index in self.compiled.visible_tile_layers:
+            for row in layers[index]:
+                gids.update(row)
+        gids.discard(0)
+
+        images = {}
+        if self.load_images:
+            for gid in gids:
+                if gid not in self.images:
+                    image = self.compiled.load_image(gid)
+                    if image is not None:
+                        images[gid] = image
+        return MapChunk(x, y, width, height, layers, flags, gids), images
+
+    def _install(self, key, chunk, images):
+        """ Makes a built chunk resident. Call with the lock held. Returns: the resident chunk"""
+        if key in self.chunks:
+            return self.chunks[key]
+        for gid in chunk.gids:
+            users = self._image_users.get(gid, 0)
+            if not users and self.load_images:
+                # Built with the chunk, unless another chunk still had it then (and has since unloaded)
+                image = images.get(gid)
+                if image is None:
+                    image = self.compiled.load_image(gid)
+                if image is not None:
+                    self.images[gid] = image
+            self._image_users[gid] = users + 1
+        self.chunks[key] = chunk
+        self._loaded.append(key)
+        return chunk
+
+    def _unload(self, key):
+        """ Drops a chunk, and the tile images only it used. Call with the lock held"""
+        chunk = self.chunks.pop(key)
+        for gid in chunk.gids:
+            users = self._image_users[gid] - 1
+            if users:
+                self._image_users[gid] = users
+            else:
+                del self._image_users[gid]
+                self.images.pop(gid, None)
+
+    def _work(self):
+        """ Background thread: builds requested chunks until close() is called"""
+        while True:
+            key = self._requests.get()
+            if key is None:
+                return
+            with self._lock:
+                if key not in self._pending:
+                    continue
+            chunk, images = self._build(key)
+            with self._lock:
+                # Dropped while it was being built
+                if key not in self._pending:
+                    continue
+                self._pending.discard(key)
+                self._install(key, chunk, images)
+
+
+class ChunkedMapData(pyscroll.data.PyscrollDataAdapter):
+    """ pyscroll data adapter drawing the loaded chunks of a ChunkedMap (unloaded tiles draw as empty)"""
+
+    def __init__(self, chunked_map):
+        super(ChunkedMapData, self).__init__()
+        self.map = chunked_map
+
+    def reload_data(self):
+        pass
+
+    def get_animations(self):
+        # Maps with animated tiles aren't compiled
+        return iter(())
+
+    @property
+    def tile_size(self):
+        return self.map.tilewidth, self.map.tileheight
+
+    @property
+    def map_size(self):
+        return self.map.width, self.map.height
+
+    @property
+    def visible_tile_layers(self):
+        return self.map.visible_tile_layers
+
+    @property
+    def visible_object_layers(self):
+        return []
+
+    def _get_tile_image(self, x, y, l):
+        return self.map.get_tile_image(x, y, l)
+
+    def _get_tile_image_by_id(self, id):
+        return self.map.images.get(id)
@@ -0,0 +1,213 @@
+"""
+Static collision mesh: the solid and semisolid tiles of the main layer merged into as few rectangles as
+possible (greedy meshing), bucketed by area so a moving rectangle is only tested against the few
+large colliders around it instead of tile by tile.
+
+Built once when the map loads, so later CollisionGrid.set_flags edits need a rebuild().
+"""
+
+
+from math import floor
+
+import numpy as np
+
+from Map.TileCollision import SweepResult, sweep_rect, EPSILON
+from Map.TileData import TileFlag
+
+
+def greedy_mesh(flags, mask=TileFlag.GROUND):
+    """
+    Merges tiles into rectangles. Each row is split into runs of tiles with the same masked flags, and
+    each run is grown down over the rows below for as long as they match it exactly. Semisolid runs
+    stay one tile tall: every semisolid tile has a top of its own that entities land on
+    :param flags: (height, width) NumPy array of TileFlag bits
+    :param mask: TileFlag bits to mesh. Tiles with none of them are left empty
+    Returns: list of (x, y, width, height, flags) in tiles, ordered by row then column
+    """
+    kinds = flags & mask
+    height, width = kinds.shape
+    used = np.zeros(kinds.shape, dtype=bool)
+    rects = []
+    for y in range(height):
+        available = np.where(used[y], 0, kinds[y])
+        # Starts and ends of runs of equal values
+        edges = np.flatnonzero(np.diff(available)) + 1
+        starts = np.concatenate(([0], edges))
+        ends = np.concatenate((edges, [width]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            kind = int(available[start])
+            if not kind:
+                continue
+            bottom = y + 1
+            while (not kind & TileFlag.SEMISOLID and bottom < height and (kinds[bottom, start:end] == kind).all()
+                   and not used[bottom, start:end].any()):
+                bottom += 1
+            used[y:bottom, start:end] = True
+            rects.append((start, y, end - start, bottom - y, kind))
+    return rects
+
+
+class CollisionMesh(object):
+    """ Merged collider rectangles of a CollisionGrid, indexed by the cells of a coarse grid"""
+
+    # Tiles along each side of an index cell
+    CELL_TILES = 8
+
+    def __init__(self, grid, mask=TileFlag.GROUND):
+        """
+        :param grid: CollisionGrid (or ChunkedCollisionGrid) to mesh
+        :param mask: TileFlag bits of the tiles that become colliders
+        """
+        self.grid = grid
+        self.mask = mask
+        self.tile_size = grid.tile_size
+        self.cell_size = self.CELL_TILES * self.tile_size
+        self.rebuild()
+
+    def __len__(self):
+        return len(self.rects)
+
+    def rebuild(self):
+        """ Meshes the grid again, e.g. after its flags were edited"""
+        size = self.tile_size
+        # (left, top, right, bottom, flags) in pixels, ordered by top then left
+        self.rects = [(x * size, y * size, (x + width) * size, (y + height) * size, flags)
+                      for x, y, width, height, flags in greedy_mesh(self.grid.as_array(), self.mask)]
+        # (cell x, cell y) -> tuple of the rects overlapping that cell
+        cells = {}
+        cell_size = self.cell_size
+        for rect in self.rects:
+            left, top, right, bottom, _ = rect
+            for cell_y in range(top // cell_size, (bottom - 1) // cell_size + 1):
+                for cell_x in range(left // cell_size, (right - 1) // cell_size + 1):
+                    cells.setdefault((cell_x, cell_y), []).append(rect)
+        self.cells = {key: tuple(rects) for key, rects in cells.items()}
+
+    def query(self, left, top, right, bottom):
+        """ Returns: list of the (left, top, right, bottom, flags) rects overlapping or touching a pixel area"""
+        cell_size = self.cell_size
+        cells = self.cells
+        # Floor division of floats gives floats, which hash the same as the int keys
+        first_x = left // cell_size
+        last_x = right // cell_size
+        first_y = top // cell_size
+        last_y = bottom // cell_size
+        if first_x == last_x and first_y == last_y:
+            candidates = cells.get((first_x, first_y), ())
+        else:
+            seen = set()
+            for cell_y in range(int(first_y), int(last_y) + 1):
+                for cell_x in range(int(first_x), int(last_x) + 1):
+                    seen.update(cells.get((cell_x, cell_y), ()))
+            candidates = seen
+        return [rect for rect in candidates
+                if rect[0] <= right and rect[2] >= left and rect[1] <= bottom and rect[3] >= top]
+
+    def sweep_rect(self, left, top, width, height, dx, dy, x_mask=TileFlag.SOLID, down_mask=TileFlag.GROUND,
+                   up_mask=TileFlag.SOLID):
+        """
+        Same as TileCollision.sweep_rect, against the merged rects. Rectangles with their feet near a
+        slope are swept through the tiles instead, which resolve slopes
+        Returns: SweepResult
+        """
+        grid = self.grid
+        size = self.tile_size
+        if grid.has_slopes and grid.near_slope(floor((left + width / 2.) / size), floor((top + height) / size)):
+            return sweep_rect(grid, left, top, width, height, dx, dy, x_mask, down_mask, up_mask)
+
+        right = left + width
+        bottom = top + height
+        candidates = self.query(min(left, left + dx), min(top, top + dy), max(right, right + dx),
+                                max(bottom, bottom + dy))
+        move_x, move_y = dx, dy
+        normal_x = normal_y = 0
+        time = 1.
+        if not candidates:
+            return SweepResult(move_x, move_y, time, (normal_x, normal_y))
+
+        # First contact along either axis, then the rest of the movement along the other (sliding)
+        x, y = left, top
+        moving_x, moving_y = dx, dy
+        for _ in range(2):
+            hit_time, axis, rect = _first_hit(candidates, x, y, width, height, moving_x, moving_y,
+                                              x_mask, down_mask if moving_y > 0 else up_mask)
+            if axis is None:
+                break
+            if time == 1.:
+                time = hit_time
+            if axis == 'x':
+                # Flush against the collider, like the tile sweep
+                move_x = rect[0] - right if dx > 0 else rect[2] - left
+                normal_x = -1 if dx > 0 else 1
+                x = left + move_x
+                y += moving_y * hit_time
+                moving_x = 0
+                moving_y = top + dy - y
+            else:
+                move_y = rect[1] - bottom if dy > 0 else rect[3] - top
+                normal_y = -1 if dy > 0 else 1
+                y = top + move_y
+                x += moving_x * hit_time
+                moving_y = 0
+                moving_x = left + dx - x
+        return SweepResult(move_x, move_y, time, (normal_x, normal_y))
+
+    def sweep_rects(self, rects, deltas, x_mask=TileFlag.SOLID, down_mask=TileFlag.GROUND, up_mask=TileFlag.SOLID):
+        """
+        Sweeps a batch of rectangles through the mesh (see TileCollision.sweep_rects)
+        Returns: list of SweepResult, in the order of rects
+        """
+        sweep = self.sweep_rect
+        return [sweep(left, top, width, height, dx, dy, x_mask, down_mask, up_mask)
+                for (left, top, width, height), (dx, dy) in zip(rects, deltas)]
+
+
+def _entry_times(rect, x, y, width, height, dx, dy):
+    """
+    Returns: (entry time x, entry time y, exit time) of a box at (x, y) moving by (dx, dy) against a
+    collider rect, as fractions of the movement (-inf/inf on an axis it doesn't move along but overlaps),
+    or None if it never overlaps the rect along an axis it doesn't move along
+    """
+    left, top, right, bottom, _ = rect
+    infinity = float('inf')
+    if dx > 0:
+        entry_x, exit_x = (left - x - width) / dx, (right - x) / dx
+    elif dx < 0:
+        entry_x, exit_x = (right - x) / dx, (left - x - width) / dx
+    elif x < right - EPSILON and x + width > left + EPSILON:
+        entry_x, exit_x = -infinity, infinity
+    else:
+        return None
+    if dy > 0:
+        entry_y, exit_y = (top - y - height) / dy, (bottom - y) / dy
+    elif dy < 0:
+        entry_y, exit_y = (bottom - y) / dy, (top - y - height) / dy
+    elif y < bottom - EPSILON and y + height > top + EPSILON:
+        entry_y, exit_y = -infinity, infinity
+    else:
+        return None
+    return entry_x, entry_y, min(exit_x, exit_y)
+
+
+def _first_hit(candidates, x, y, width, height, dx, dy, x_mask, y_mask):
+    """
+    Returns: (time, 'x' or 'y', rect) of the first collider a moving box runs into along an axis it
+    blocks, or (1, None, None). Boxes already overlapping a collider pass through it, as with tiles
+    """
+    first_time = 1.
+    first_axis = first_rect = None
+    for rect in candidates:
+        times = _entry_times(rect, x, y, width, height, dx, dy)
+        if times is None:
+            continue
+        entry_x, entry_y, exit_time = times
+        # Ties go to y: sliding over the corner of a floor rather than snagging on it
+        if entry_x > entry_y:
+            entry, axis, mask = entry_x, 'x', x_mask
+        else:
+            entry, axis, mask = entry_y, 'y', y_mask
+        if -EPSILON <= entry < first_time and entry < exit_time - EPSILON and rect[4] & mask:
+            first_time = max(entry, 0.)
+            first_axis = axis
+            first_rect = rect
+    return first_time, first_axis, first_rect
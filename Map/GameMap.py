@@ -3,47 +3,169 @@ Classes related to the game map.
 """
 
 
-from enum import Enum
-
+import pyscroll
+from pytmx import TiledMap
 from pytmx.util_pygame import load_pygame
 
 import constants
+from Debug.Log import Log
+from Entities.Systems import Systems
+from Map import MapCache
+from Map.ChunkedMap import ChunkedMap, ChunkedMapData
+from Map.CollisionMesh import CollisionMesh
+from Map.SpatialHash import SpatialHash
+from Map.TileCollision import ground_under, sweep_rect, sweep_rects
+from Map.TileData import MapInfo, TileFlag, CollisionGrid, TileIndex, find_main_layer
+
+
+_log = Log('map')
 
 
 class GameMap(object):
-    map_data = None
-    MAIN_LAYER_INDEX = None 
-    temp_surface = None
+    """
+    A loaded level (world): the map, its collision grid and broadphase, and the component systems of
+    the entities living in it. Entities reference their world explicitly (Entity.world), so any number
+    of worlds can be loaded side by side
+    """
+
+    def __init__(self, map_path=constants.TEST_MAP, headless=False, use_cache=True, streamed=False,
+                 collision_mesh=False, collision_grid=None):
+        """
+        Loads the map and bakes its collision grid
+        :param map_path: path of the .tmx file to load
+        :param headless: if True, only parses map data without loading tile images (no display needed)
+        :param use_cache: if True, loads the map from its compiled cache (see MapCache), building it if needed
+        :param streamed: if True (and the map can be cached), only keeps chunks of the map near what
+        is passed to stream loaded (see ChunkedMap)
+        :param collision_mesh: if True, entities collide with the main layer's solid and semisolid tiles
+        merged into rectangles (see CollisionMesh) instead of tile by tile
+        :param collision_grid: CollisionGrid to use for the main layer instead of the map's own, e.g. one
+        shared between processes (see SharedTiles). Must be the size of the map
+        """
+        self.map_path = map_path
+        compiled = None
+        if use_cache or streamed:
+            compiled = MapCache.load(map_path, load_images=not (headless or streamed))
+        if compiled and streamed:
+            self.map_data = ChunkedMap(compiled, load_images=not headless)
+            self.main_layer_index = compiled.main_layer
+            self.collision_grid = self.map_data.collision_grid
+            self.tile_index = compiled.tile_index
+        elif compiled:
+            self.map_data = compiled
+            self.main_layer_index = compiled.main_layer
+            self.collision_grid = compiled.collision_grid
+            self.tile_index = compiled.tile_index
+        else:
+            if headless:
+                self.map_data = TiledMap(map_path)
+            else:
+                self.map_data = load_pygame(map_path)
 
-    def set_up_map():
-        GameMap.map_data = load_pygame(constants.TEST_MAP)
-        print('map data is ' + str(GameMap.map_data))
+            # Set main layer of tmx map
+            self.main_layer_index = find_main_layer(self.map_data)
 
-        # Set main layer of tmx map
-        for i, layer in enumerate(GameMap.map_data):
-            if not GameMap.MAIN_LAYER_INDEX:
-                if layer.properties.get(MapInfo.MAIN.value) :
-                    GameMap.MAIN_LAYER_INDEX = i  
+            # Bake main layer into flags so entities don't query pytmx every frame
+            if collision_grid is None:
+                self.collision_grid = CollisionGrid.from_tiled_map(self.map_data, self.main_layer_index)
+            # Index tiles by property so lookups (spawn, etc.) don't scan the map
+            main_layer = self.map_data.layers[self.main_layer_index]
+            self.tile_index = TileIndex.from_layer(self.map_data.width, self.map_data.height,
+                                                   main_layer.data, self.map_data.tile_properties)
+        if collision_grid is not None:
+            if (collision_grid.width, collision_grid.height) != (self.map_data.width, self.map_data.height):
+                raise ValueError('Collision grid is ' + str((collision_grid.width, collision_grid.height)) +
+                                 ' tiles, the map is ' + str((self.map_data.width, self.map_data.height)))
+            if isinstance(self.map_data, ChunkedMap):
+                raise ValueError('A streamed map keeps its own collision grid')
+            self.collision_grid = collision_grid
+        _log.info('map_loaded', path=map_path, width=self.map_data.width, height=self.map_data.height,
+                  headless=headless, cached=compiled is not None, streamed=streamed and compiled is not None,
+                  shared_grid=collision_grid is not None)
 
-    def get_tile_properties(row, col):
+        self.collision_mesh = CollisionMesh(self.collision_grid) if collision_mesh else None
+        if self.collision_mesh is not None:
+            _log.info('collision_mesh', rects=len(self.collision_mesh))
+
+        # Broadphase for entity vs entity collision, one cell per tile
+        self.spatial_hash = SpatialHash(self.map_data.tilewidth)
+        # Live components of the world's entities (see Entity.add_component)
+        self.systems = Systems()
+
+    def close(self):
+        """ Stops streaming the map (does nothing for maps loaded whole). Call when the world is dropped"""
+        if isinstance(self.map_data, ChunkedMap):
+            self.map_data.close()
+
+    def scroll_data(self):
+        """
+        Returns: pyscroll data adapter for drawing the loaded map
+        """
+        if isinstance(self.map_data, ChunkedMap):
+            return ChunkedMapData(self.map_data)
+        if isinstance(self.map_data, MapCache.CompiledMap):
+            return MapCache.CachedMapData(self.map_data)
+        return pyscroll.data.TiledMapData(self.map_data)
+
+    def stream(self, rects):
+        """
+        Moves the loaded area of a streamed map (does nothing for maps loaded whole)
+        :param rects: pixel rects to keep the map loaded around (the camera view, active entities)
+        Returns: list of (chunk x, chunk y) that finished loading since the last call
+        """
+        if not isinstance(self.map_data, ChunkedMap):
+            return []
+        self.map_data.stream(rects)
+        return self.map_data.take_loaded()
+
+    def get_tile_properties(self, row, col):
         """
         Returns: Tile properties for tile in the main game layer
         """
-        return GameMap.map_data.get_tile_properties(row, col, GameMap.MAIN_LAYER_INDEX)
+        return self.map_data.get_tile_properties(row, col, self.main_layer_index)
 
-    def get_tile(id):
-        """ Returns tile corresponding to tile ID """
-        return GameMap.map_data
+    def find_tiles(self, prop):
+        """
+        Returns: list of (x, y) tiles in the main layer carrying a property, ordered by column from the
+        left and bottom to top in each column
+        :param prop: MapInfo member or name of a custom tile property
+        """
+        return self.tile_index.find(prop)
 
+    def get_tile_flags(self, x, y):
+        """
+        Returns: TileFlag bits for tile in the main game layer (0 if out of bounds)
+        """
+        return self.collision_grid.get_flags(x, y)
 
+    def sweep_rect(self, left, top, width, height, dx, dy):
+        """
+        Moves a rectangle through the main layer, through the collision mesh if there is one
+        Returns: SweepResult (see TileCollision.sweep_rect)
+        """
+        if self.collision_mesh is not None:
+            return self.collision_mesh.sweep_rect(left, top, width, height, dx, dy)
+        return sweep_rect(self.collision_grid, left, top, width, height, dx, dy)
 
-class MapInfo(Enum):
-    """ Property values used to get information from map
-    """
-    MAIN = 'main' # Main layer of tilemap
+    def sweep_rects(self, rects, deltas):
+        """
+        Moves a batch of rectangles through the main layer, through the collision mesh if there is one
+        Returns: list of SweepResult (see TileCollision.sweep_rects)
+        """
+        if self.collision_mesh is not None:
+            return self.collision_mesh.sweep_rects(rects, deltas)
+        return sweep_rects(self.collision_grid, rects, deltas)
 
-    SPAWN = 'spawn'
-    SOLID = 'solid'
-    SEMISOLID = 'semisolid'
-    SLOPE_LEFT = 'slope left'
-    SLOPE_RIGHT = 'slope right'
+    def probe_ground(self, xs, bottoms, reach):
+        """
+        Checks many entities' feet for ground at once (see TileCollision.ground_under)
+        :param xs: NumPy array (or sequence) of feet x coordinates
+        :param bottoms: feet y coordinates, as many as xs
+        :param reach: pixels under the feet checked
+        Returns: NumPy bool array, True where there is ground in the main layer
+        """
+        return ground_under(self.collision_grid, xs, bottoms, reach)
+
+    def get_tile(self, id):
+        """ Returns tile corresponding to tile ID """
+        return self.map_data
@@ -0,0 +1,415 @@
+"""
+Compiles TMX maps into a binary cache that loads without parsing XML or decoding tileset images.
+
+A compiled map holds the tile grid of every tile layer, the collision flags of the main layer, the
+TileIndex of the main layer (spawn points etc.), tile properties and the pixels of every tile image the map uses. Files are memory mapped when
+loaded, so tile data is only read from disk as it's used (and is shared between processes loading the
+same map). A cache file is rebuilt whenever the map, its tilesets or their images change: loading
+compares their modification times and sizes with those recorded at compile time, and only hashes
+their contents when those differ.
+"""
+
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from array import array
+
+import pygame
+import pyscroll
+from pytmx import TiledMap, TiledTileLayer
+from pytmx.util_pygame import handle_transformation
+
+import constants
+from Map.TileData import CollisionGrid, TileIndex, find_main_layer
+
+
+MAGIC = b'APMC'
+VERSION = 3
+# Magic, version, sha1 of the sources, length of the JSON metadata that follows
+HEADER = struct.Struct('<4sI20sI')
+# Sections of the file start on multiples of this
+ALIGN = 8
+# Type code of a gid in the tile grids
+GID_TYPE = 'I'
+
+
+def cache_path(map_path, cache_dir=constants.MAP_CACHE):
+    """ Returns: path of the compiled file for a map"""
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    # Maps in different directories can share a name
+    digest = hashlib.sha1(os.path.abspath(map_path).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, name + '-' + digest + '.apmap')
+
+
+def source_files(map_path):
+    """
+    Returns: list of files the map is built from (the map, external tilesets and their images)
+    """
+    files = [map_path]
+
+    def add_images(node, directory):
+        for image in node.iter('image'):
+            files.append(os.path.join(directory, image.get('source')))
+
+    map_directory = os.path.dirname(map_path)
+    root = ElementTree.parse(map_path).getroot()
+    for tileset in root.findall('tileset'):
+        source = tileset.get('source')
+        if source:
+            tileset_path = os.path.join(map_directory, source)
+            files.append(tileset_path)
+            add_images(ElementTree.parse(tileset_path).getroot(), os.path.dirname(tileset_path))
+        else:
+            add_images(tileset, map_directory)
+    for layer in root.findall('imagelayer'):
+        add_images(layer, map_directory)
+    return files
+
+
+def source_key(map_path, files=None):
+    """
+    Returns: sha1 digest of the contents of every file the map is built from
+    :param files: the map's source_files, if already known
+    """
+    digest = hashlib.sha1()
+    digest.update(struct.pack('<I', VERSION))
+    for path in files or source_files(map_path):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def source_stats(files):
+    """
+    Returns: list of [absolute path, modification time in ns, size] of each file, or None if one is missing
+    """
+    stats = []
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stats.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+    return stats
+
+
+def _raw_image_loader(filename, colorkey, **kwargs):
+    """
+    pytmx image loader that keeps tiles as plain surfaces (no display needed), with the colorkey
+    turned into transparency
+    """
+    image = pygame.image.load(filename)
+    if colorkey:
+        image.set_colorkey(pygame.Color('#' + colorkey))
+
+    def load_image(rect=None, flags=None):
+        tile = image.subsurface(rect) if rect else image
+        if flags:
+            tile = handle_transformation(tile, flags)
+        # Blit onto per pixel alpha so the colorkey becomes transparent pixels
+        rgba = pygame.Surface(tile.get_size(), pygame.SRCALPHA, 32)
+        rgba.blit(tile, (0, 0))
+        return rgba
+
+    return load_image
+
+
+def _pad(out):
+    """ Pads a bytearray to the next ALIGN boundary. Returns: its new length"""
+    out.extend(bytes(-len(out) % ALIGN))
+    return len(out)
+
+
+def compile_map(map_path, out_path=None, cache_dir=constants.MAP_CACHE):
+    """
+    Compiles a TMX map into a cache file
+    :param map_path: path of the .tmx file
+    :param out_path: where to write the compiled map. Defaults to its path in cache_dir
+    Returns: path of the compiled map, or None if the map can't be compiled (it has animated tiles)
+    """
+    files = source_files(map_path)
+    # Taken before hashing, so a file changed while compiling looks stale on the next load
+    stats = source_stats(files)
+    key = source_key(map_path, files)
+    map_data = TiledMap(map_path, image_loader=_raw_image_loader)
+    if any(properties.get('frames') for properties in map_data.tile_properties.values()):
+        return None
+
+    main_layer = find_main_layer(map_data)
+    grid = CollisionGrid.from_tiled_map(map_data, main_layer)
+    tile_index = TileIndex.from_layer(map_data.width, map_data.height, map_data.layers[main_layer].data,
+                                      map_data.tile_properties)
+
+    # Tile layers
+    data = bytearray()
+    layers = []
+    used_gids = set()
+    for layer in map_data.layers:
+        info = {'name': layer.name, 'visible': bool(layer.visible), 'properties': dict(layer.properties)}
+        if isinstance(layer, TiledTileLayer):
+            gids = array(GID_TYPE)
+            for row in layer.data:
+                gids.extend(row)
+            used_gids.update(gids)
+            info['offset'] = _pad(data)
+            data.extend(gids.tobytes())
+        layers.append(info)
+
+    info_flags = _pad(data)
+    data.extend(grid.flags)
+
+    # Pixels of every tile image in use
+    images = {}
+    for gid in sorted(used_gids):
+        image = map_data.images[gid] if gid < len(map_data.images) else None
+        if image is None:
+            continue
+        width, height = image.get_size()
+        opaque = pygame.mask.from_surface(image, 254).count() == width * height
+        images[gid] = {'offset': _pad(data), 'size': [width, height], 'opaque': opaque}
+        data.extend(pygame.image.tostring(image, 'RGBA'))
+
+    meta = {
+        'width': map_data.width,
+        'height': map_data.height,
+        'tilewidth': map_data.tilewidth,
+        'tileheight': map_data.tileheight,
+        'properties': dict(map_data.properties),
+        'main_layer': main_layer,
+        'layers': layers,
+        'flags_offset': info_flags,
+        'tile_properties': {str(gid): properties for gid, properties in map_data.tile_properties.items()},
+        'tile_index': tile_index.tiles,
+        'images': {str(gid): image for gid, image in images.items()},
+        'sources': stats,
+    }
+    out_path = out_path or cache_path(map_path, cache_dir)
+    _write(out_path, key, meta, data)
+    return out_path
+
+
+def _write(out_path, key, meta, data):
+    """
+    Writes a cache file. It's written to a temporary file first and moved into place, so processes
+    compiling the same map at once never see (or publish) each other's half written files
+    :param key: source_key of the map
+    :param meta: dict of metadata
+    :param data: bytes-like data section
+    """
+    meta_bytes = json.dumps(meta, default=str).encode()
+    header = HEADER.pack(MAGIC, VERSION, key, len(meta_bytes))
+    # Data starts aligned after the header and metadata
+    padding = bytes(-(HEADER.size + len(meta_bytes)) % ALIGN)
+    directory = os.path.dirname(out_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory or None)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(header)
+            f.write(meta_bytes)
+            f.write(padding)
+            f.write(data)
+        # mkstemp makes files only their owner can read
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, out_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class CompiledLayer(object):
+    """ Layer of a CompiledMap. Tile layers have data; others only keep their name and properties"""
+
+    def __init__(self, name, visible, properties, data=None):
+        """
+        :param data: list of rows of gids (data[y][x]), or None if this isn't a tile layer
+        """
+        self.name = name
+        self.visible = visible
+        self.properties = properties
+        self.data = data
+
+
+class CompiledMap(object):
+    """
+    Map loaded from a cache file. Has the parts of pytmx's TiledMap the game uses
+    (sizes, layers, tile_properties, get_tile_properties, get_tile_image)
+    """
+
+    def __init__(self, filename, buffer, meta, data_offset, load_images=True):
+        """
+        :param filename: path of the source .tmx
+        :param buffer: mmap of the cache file (kept open while the map is in use)
+        :param meta: decoded metadata of the cache file
+        :param data_offset: where the data section starts in buffer
+        :param load_images: whether to build tile surfaces (not needed headless)
+        """
+        self.filename = filename
+        self._buffer = buffer
+        view = memoryview(buffer)[data_offset:]
+        self.width = meta['width']
+        self.height = meta['height']
+        self.tilewidth = meta['tilewidth']
+        self.tileheight = meta['tileheight']
+        self.properties = meta['properties']
+        self.main_layer = meta['main_layer']
+        self.tile_index = TileIndex({name: [tuple(tile) for tile in tiles]
+                                     for name, tiles in meta['tile_index'].items()})
+        self.tile_properties = {int(gid): properties for gid, properties in meta['tile_properties'].items()}
+
+        tiles = self.width * self.height
+        gid_size = array(GID_TYPE).itemsize
+        self.layers = []
+        for info in meta['layers']:
+            data = None
+            if 'offset' in info:
+                gids = view[info['offset']:info['offset'] + tiles * gid_size].cast(GID_TYPE)
+                data = [gids[y * self.width:(y + 1) * self.width] for y in range(self.height)]
+            self.layers.append(CompiledLayer(info['name'], info['visible'], info['properties'], data))
+
+        offset = meta['flags_offset']
+        self.collision_grid = CollisionGrid(self.width, self.height, self.tilewidth, view[offset:offset + tiles])
+
+        # Where the pixels of each tile image are, by gid
+        self._view = view
+        self.image_info = {int(gid): info for gid, info in meta['images'].items()}
+        self.images = {}
+        if load_images:
+            for gid in self.image_info:
+                self.images[gid] = self.load_image(gid)
+
+    def load_image(self, gid):
+        """
+        Builds the surface of a tile image from the cache file, in the display's format if there is a display
+        Returns: pygame.Surface, or None if the gid has no image
+        """
+        info = self.image_info.get(gid)
+        if info is None:
+            return None
+        width, height = info['size']
+        offset = info['offset']
+        image = pygame.image.frombuffer(self._view[offset:offset + width * height * 4], (width, height), 'RGBA')
+        if pygame.display.get_surface() is not None:
+            image = image.convert() if info['opaque'] else image.convert_alpha()
+        return image
+
+    @property
+    def visible_tile_layers(self):
+        """ Returns: indices of visible tile layers"""
+        return [i for i, layer in enumerate(self.layers) if layer.visible and layer.data is not None]
+
+    def get_tile_gid(self, x, y, layer):
+        """ Returns: gid at (x, y) of a tile layer. Raises ValueError if out of bounds"""
+        if not (0 <= x < self.width and 0 <= y < self.height and layer >= 0):
+            raise ValueError('Coords: ' + str((x, y)) + ' in layer ' + str(layer) + ' is invalid.')
+        return self.layers[layer].data[y][x]
+
+    def get_tile_properties(self, x, y, layer):
+        """ Returns: properties of the tile at (x, y) of a layer, or None if it has none"""
+        return self.tile_properties.get(self.get_tile_gid(x, y, layer))
+
+    def get_tile_image(self, x, y, layer):
+        """ Returns: image of the tile at (x, y) of a layer, or None if empty"""
+        return self.images.get(self.get_tile_gid(x, y, layer))
+
+
+class CachedMapData(pyscroll.data.PyscrollDataAdapter):
+    """ pyscroll data adapter drawing a CompiledMap"""
+
+    def __init__(self, compiled_map):
+        super(CachedMapData, self).__init__()
+        self.map = compiled_map
+
+    def reload_data(self):
+        self.map = load(self.map.filename)
+
+    def get_animations(self):
+        # Maps with animated tiles aren't compiled
+        return iter(())
+
+    @property
+    def tile_size(self):
+        return self.map.tilewidth, self.map.tileheight
+
+    @property
+    def map_size(self):
+        return self.map.width, self.map.height
+
+    @property
+    def visible_tile_layers(self):
+        return self.map.visible_tile_layers
+
+    @property
+    def visible_object_layers(self):
+        return []
+
+    def _get_tile_image(self, x, y, l):
+        try:
+            return self.map.images.get(self.map.layers[l].data[y][x])
+        except IndexError:
+            return None
+
+    def _get_tile_image_by_id(self, id):
+        return self.map.images.get(id)
+
+
+def read(path, map_path=None, load_images=True):
+    """
+    Memory maps a compiled map
+    :param path: path of the cache file
+    :param map_path: source .tmx. If given, returns None when the cache is out of date with it. Its
+    sources are only hashed if their modification times or sizes changed since they were recorded. If
+    the contents are the same, the new ones are recorded in the file
+    :param load_images: whether to build tile surfaces
+    Returns: CompiledMap, or None if the file isn't a compiled map of the current version or is stale
+    """
+    with open(path, 'rb') as f:
+        # Too short for a header (e.g. empty, which can't be memory mapped at all)
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            return None
+        # Copy on write, so the collision grid can still be edited in memory
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    magic, version, key, meta_length = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        return None
+    meta_end = HEADER.size + meta_length
+    meta = json.loads(bytes(buffer[HEADER.size:meta_end]).decode())
+    data_offset = meta_end + (-meta_end % ALIGN)
+    if map_path is not None:
+        sources = meta['sources']
+        if not sources or source_stats([source for source, _, _ in sources]) != sources:
+            files = source_files(map_path)
+            stats = source_stats(files)
+            if key != source_key(map_path, files):
+                return None
+            # Same contents (e.g. touched, or checked out again): record the new stats so later loads don't hash
+            meta['sources'] = stats
+            try:
+                _write(path, key, meta, buffer[data_offset:])
+            except OSError:
+                # Still usable, it just gets hashed again next time
+                pass
+    return CompiledMap(map_path or path, buffer, meta, data_offset, load_images)
+
+
+def load(map_path, load_images=True, cache_dir=constants.MAP_CACHE):
+    """
+    Loads a map from its cache file, compiling it first if the cache is missing or stale
+    :param map_path: path of the .tmx file
+    :param load_images: whether to build tile surfaces (not needed headless)
+    Returns: CompiledMap, or None if the map can't be compiled
+    """
+    path = cache_path(map_path, cache_dir)
+    compiled = read(path, map_path, load_images) if os.path.exists(path) else None
+    if compiled is None:
+        if compile_map(map_path, path) is None:
+            return None
+        compiled = read(path, map_path, load_images)
+    return compiled
@@ -0,0 +1,71 @@
+"""
+Collision grids shared between processes. The TileFlag bytes of a map's main layer are copied once
+into a named shared memory block; other processes attach to it by name and wrap it in a read-only
+CollisionGrid, so worlds in any number of processes read the same tiles without each holding a copy.
+"""
+
+
+from multiprocessing import shared_memory
+
+from Map.TileData import CollisionGrid
+
+
+class SharedTileLayer(object):
+    """ The flags of a CollisionGrid in a shared memory block"""
+
+    def __init__(self, memory, width, height, tile_size, owner):
+        """
+        Use SharedTileLayer.create or SharedTileLayer.attach
+        :param memory: multiprocessing.shared_memory.SharedMemory holding width * height flag bytes
+        :param width, height: size of the grid in tiles
+        :param tile_size: size of a (square) tile in pixels
+        :param owner: whether this process created the block (and so unlinks it)
+        """
+        self.memory = memory
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.owner = owner
+
+    def create(grid):
+        """
+        Copies a grid's flags into a new shared memory block. The creating process unlinks it when done
+        :param grid: CollisionGrid to share (a ChunkedCollisionGrid shares the whole compiled grid)
+        Returns: SharedTileLayer
+        """
+        flags = grid.as_array()
+        memory = shared_memory.SharedMemory(create=True, size=max(1, flags.size))
+        memory.buf[:flags.size] = flags.tobytes()
+        return SharedTileLayer(memory, grid.width, grid.height, grid.tile_size, True)
+
+    def attach(spec):
+        """
+        Opens a block made by SharedTileLayer.create in another process. The process has to be started
+        by the creator after its first block was created (e.g. a worker), so they share a resource tracker
+        and the block outlives the attach
+        :param spec: the creating layer's spec
+        Returns: SharedTileLayer
+        """
+        name, width, height, tile_size = spec
+        return SharedTileLayer(shared_memory.SharedMemory(name=name), width, height, tile_size, False)
+
+    @property
+    def spec(self):
+        """ Returns: picklable (name, width, height, tile size) to attach to the block with"""
+        return (self.memory.name, self.width, self.height, self.tile_size)
+
+    def grid(self):
+        """
+        Returns: CollisionGrid over the shared flags. It can't be written to: set_flags raises TypeError
+        """
+        size = self.width * self.height
+        return CollisionGrid(self.width, self.height, self.tile_size, self.memory.buf[:size].toreadonly())
+
+    def close(self):
+        """
+        Detaches from the block, and frees it if this process created it. Grids from grid() must be
+        dropped first
+        """
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,149 @@
+"""
+Uniform grid broadphase for finding entities near each other without checking every pair.
+"""
+
+
+import pygame
+
+
+class SpatialHash(object):
+    """ Buckets entities by the grid cells their rect covers"""
+
+    def __init__(self, cell_size):
+        """
+        :param cell_size: width and height of a cell in pixels (normally the map's tile width)
+        """
+        self.cell_size = cell_size
+        # (cell x, cell y) -> set of entities touching that cell
+        self.cells = {}
+        # entity -> (first cell x, first cell y, last cell x, last cell y) it's stored under
+        self._entity_cells = {}
+
+    def __len__(self):
+        return len(self._entity_cells)
+
+    def __contains__(self, entity):
+        return entity in self._entity_cells
+
+    def _cell_bounds(self, rect):
+        """ Returns: (first cell x, first cell y, last cell x, last cell y) covered by rect"""
+        size = self.cell_size
+        left, top = rect.left // size, rect.top // size
+        return (left, top, max(left, (rect.right - 1) // size), max(top, (rect.bottom - 1) // size))
+
+    def _add_to_cells(self, entity, bounds):
+        cells = self.cells
+        x0, y0, x1, y1 = bounds
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bucket = cells.get((x, y))
+                if bucket is None:
+                    cells[(x, y)] = {entity}
+                else:
+                    bucket.add(entity)
+
+    def _remove_from_cells(self, entity, bounds):
+        cells = self.cells
+        x0, y0, x1, y1 = bounds
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bucket = cells[(x, y)]
+                bucket.discard(entity)
+                if not bucket:
+                    del cells[(x, y)]
+
+    def insert(self, entity):
+        """
+        Adds an entity under the cells of its rect. Re-inserting an entity moves it instead
+        :param entity: object with a pygame.Rect rect
+        """
+        if entity in self._entity_cells:
+            self.move(entity)
+            return
+        bounds = self._cell_bounds(entity.rect)
+        self._entity_cells[entity] = bounds
+        self._add_to_cells(entity, bounds)
+
+    def remove(self, entity):
+        """ Removes an entity. Does nothing if it isn't in the hash"""
+        bounds = self._entity_cells.pop(entity, None)
+        if bounds is not None:
+            self._remove_from_cells(entity, bounds)
+
+    def move(self, entity):
+        """ Updates the cells of an entity after its rect changed (cheap if it stayed in the same cells)"""
+        old_bounds = self._entity_cells.get(entity)
+        if old_bounds is None:
+            self.insert(entity)
+            return
+        bounds = self._cell_bounds(entity.rect)
+        if bounds == old_bounds:
+            return
+        self._remove_from_cells(entity, old_bounds)
+        self._entity_cells[entity] = bounds
+        self._add_to_cells(entity, bounds)
+
+    def _candidates(self, rect):
+        """ Returns: set of entities sharing a cell with rect"""
+        cells = self.cells
+        found = set()
+        x0, y0, x1, y1 = self._cell_bounds(rect)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bucket = cells.get((x, y))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query_rect(self, rect):
+        """
+        Returns: list of entities whose rect overlaps rect
+        :param rect: pygame.Rect to look in
+        """
+        return [entity for entity in self._candidates(rect) if entity.rect.colliderect(rect)]
+
+    def query_radius(self, center, radius):
+        """
+        Returns: list of entities whose rect touches the circle
+        :param center: (x, y) center of the circle
+        :param radius: radius of the circle in pixels
+        """
+        cx, cy = center
+        radius_squared = radius * radius
+        bounds = _rect_around(cx, cy, radius)
+        found = []
+        for entity in self._candidates(bounds):
+            rect = entity.rect
+            # Distance from the center to the closest point of the rect
+            dx = cx - max(rect.left, min(cx, rect.right))
+            dy = cy - max(rect.top, min(cy, rect.bottom))
+            if dx * dx + dy * dy <= radius_squared:
+                found.append(entity)
+        return found
+
+    def overlapping_pairs(self):
+        """
+        Returns: list of (entity, entity) pairs whose rects overlap, each pair reported once
+        """
+        size = self.cell_size
+        pairs = []
+        for (x, y), bucket in self.cells.items():
+            if len(bucket) < 2:
+                continue
+            entities = list(bucket)
+            for i, a in enumerate(entities):
+                rect_a = a.rect
+                for b in entities[i + 1:]:
+                    rect_b = b.rect
+                    if not rect_a.colliderect(rect_b):
+                        continue
+                    # Only report the pair from the cell holding the top left of the overlap
+                    if (max(rect_a.left, rect_b.left) // size == x
+                            and max(rect_a.top, rect_b.top) // size == y):
+                        pairs.append((a, b))
+        return pairs
+
+
+def _rect_around(x, y, radius):
+    """ Returns: pygame.Rect bounding a circle"""
+    return pygame.Rect(int(x - radius), int(y - radius), int(2 * radius) + 2, int(2 * radius) + 2)
@@ -0,0 +1,288 @@
+"""
+Swept AABB collision of moving rectangles against a CollisionGrid.
+
+Solid tiles block from every side. Semisolid tiles are one way platforms: they only stop a rectangle
+whose bottom crosses their top going down. Sloped tiles don't block the sweep; instead the middle of
+a rectangle's bottom edge (its feet) is kept on their surface, read from the grid's HeightProfiles.
+"""
+
+
+from math import ceil, floor
+
+import numpy as np
+
+from Map.TileData import TileFlag
+
+
+class SweepResult(object):
+    """ Outcome of sweeping a rectangle through the tile grid"""
+
+    __slots__ = ('dx', 'dy', 'time', 'normal')
+
+    def __init__(self, dx, dy, time, normal):
+        """
+        :param dx: x movement that can be made without entering a blocking tile
+        :param dy: y movement that can be made without entering a blocking tile
+        :param time: fraction (0 to 1) of the movement done before the first contact. 1 if nothing was hit
+        :param normal: (x, y) contact normal. Each axis is -1 or 1 if movement along it was blocked, 0 otherwise
+        """
+        self.dx = dx
+        self.dy = dy
+        self.time = time
+        self.normal = normal
+
+    @property
+    def hit(self):
+        """ Returns: True if the movement was blocked along either axis"""
+        return self.normal != (0, 0)
+
+    def __repr__(self):
+        return '<SweepResult(' + str((self.dx, self.dy)) + ', time=' + str(self.time) + ', normal=' + str(self.normal) + ')>'
+
+
+# Slack for floating point error when deciding which tiles an interval covers
+EPSILON = 1e-6
+
+
+def _first_boundary(low, high, delta, tile_size):
+    """
+    Returns: (distance along the movement to the first tile boundary the leading edge crosses,
+    index of the tile entered there), for an interval [low, high) moving by delta (non zero)
+    """
+    if delta > 0:
+        tile = ceil(high / tile_size)
+        return tile * tile_size - high, tile
+    tile = floor(low / tile_size) - 1
+    return low - (tile + 1) * tile_size, tile
+
+
+def _tile_span(low, high, tile_size):
+    """ Returns: range of tile indices covered by the interval [low, high)"""
+    return range(floor((low + EPSILON) / tile_size), ceil((high - EPSILON) / tile_size))
+
+
+def _surface_in(grid, x, row, mask=TileFlag.GROUND):
+    """
+    Returns: (y of the surface feet at pixel x stand on in a tile row, flags of the tile), or (None, flags)
+    if the tile there has no surface
+    :param mask: TileFlag bits of flat tiles whose top counts as a surface
+    """
+    tile_size = grid.tile_size
+    col = floor(x / tile_size)
+    flags = grid.get_flags(col, row)
+    if flags & TileFlag.SLOPE:
+        return row * tile_size + grid.profiles.surface(flags, floor(x) - col * tile_size), flags
+    if flags & mask:
+        return row * tile_size, flags
+    return None, flags
+
+
+def _standing_on(grid, x, bottom):
+    """ Returns: flags of the tile whose surface feet at (x, bottom) rest on (within a pixel), or 0"""
+    tile_size = grid.tile_size
+    for row in (floor((bottom - EPSILON) / tile_size), floor((bottom + EPSILON) / tile_size)):
+        surface, flags = _surface_in(grid, x, row)
+        if surface is not None and abs(surface - bottom) <= 1:
+            return flags
+    return 0
+
+
+def _ramp_line(grid, foot_x, feet_row, next_col, step_col, ramp):
+    """
+    Finds the slope rising the way a rectangle moves that its feet are on or walking onto (in the feet's
+    row, between the feet and the column the leading edge enters), and extends its surface to that column
+    :param foot_x: x of the feet when the leading edge reaches next_col
+    :param feet_row: tile row of the feet
+    :param next_col: column the leading edge is entering
+    :param step_col: 1 moving right, -1 moving left
+    :param ramp: TileFlag slope bit rising the way the rectangle moves
+    Returns: y of the ramp's surface at the near edge of next_col, or infinity (no ramp) if there is none
+    """
+    tile_size = grid.tile_size
+    for col in range(floor(foot_x / tile_size), next_col, step_col):
+        if grid.get_flags(col, feet_row) & ramp:
+            # 45 degrees: one pixel up per pixel along, from the top of the slope tile's high side
+            return feet_row * tile_size - (next_col - col - 1 if step_col > 0 else col - next_col - 1) * tile_size
+    return float('inf')
+
+
+def _resolve_slopes(grid, left, top, width, height, move_x, move_y, dy, standing):
+    """
+    Puts a swept rectangle's feet on the slope it ended up in, or keeps a rectangle that was standing
+    on the ground on it as it walks down a slope
+    :param move_x, move_y: movement the sweep allowed
+    :param dy: movement that was asked for along y
+    :param standing: flags of the tile the rectangle stood on at the start (see _standing_on)
+    Returns: (move_y, True if the feet were put on a surface)
+    """
+    tile_size = grid.tile_size
+    foot_x = left + width / 2. + move_x
+    bottom = top + height + move_y
+
+    # Feet sunk into a slope (or, walking off the top of one, into the solid ground it leads to): push them up
+    row = floor((bottom - EPSILON) / tile_size)
+    surface, flags = _surface_in(grid, foot_x, row, TileFlag.SOLID if standing & TileFlag.SLOPE else 0)
+    if surface is not None and surface < bottom - EPSILON:
+        return move_y - (bottom - surface), True
+
+    # Walking down a slope: follow it down (no steeper than 45 degrees) rather than stepping off into the air
+    if standing and dy >= 0:
+        reach = abs(move_x) + 1
+        for row in range(floor((bottom - EPSILON) / tile_size), floor((bottom + reach) / tile_size) + 1):
+            surface, _ = _surface_in(grid, foot_x, row)
+            if surface is not None and bottom - EPSILON <= surface <= bottom + reach:
+                return move_y + (surface - bottom), True
+    return move_y, False
+
+
+def sweep_rect(grid, left, top, width, height, dx, dy, x_mask=TileFlag.SOLID, down_mask=TileFlag.GROUND,
+               up_mask=TileFlag.SOLID):
+    """
+    Moves a rectangle by (dx, dy) through the grid, stopping each axis at the first blocking tile.
+    Walks every tile boundary the rectangle crosses in the order it crosses them, so fast movement
+    can't skip over thin walls. Movement along an axis that isn't blocked continues (sliding).
+    Feet are then kept on any slopes (see _resolve_slopes)
+    :param grid: CollisionGrid to collide with
+    :param left, top, width, height: rectangle at the start of the movement
+    :param dx, dy: movement for this step
+    :param x_mask: TileFlag bits that block horizontal movement
+    :param down_mask: TileFlag bits whose top blocks downward movement
+    :param up_mask: TileFlag bits that block upward movement
+    Returns: SweepResult
+    """
+    tile_size = grid.tile_size
+    get_flags = grid.get_flags
+    infinity = float('inf')
+    normal_x = normal_y = 0
+    time = 1.
+    y_mask = down_mask if dy > 0 else up_mask
+
+    # Slopes are only handled for feet near one
+    has_slopes = grid.has_slopes and grid.near_slope(floor((left + width / 2.) / tile_size),
+                                                     floor((top + height) / tile_size))
+    standing = _standing_on(grid, left + width / 2., top + height) if has_slopes else 0
+
+    # Distance (in fractions of the movement) to the next boundary on each axis
+    if dx:
+        dist, next_col = _first_boundary(left, left + width, dx, tile_size)
+        time_x = dist / abs(dx)
+        step_time_x = tile_size / abs(dx)
+        step_col = 1 if dx > 0 else -1
+        # Slopes rising the way the rectangle moves. The ground at the top of one isn't a wall to the feet
+        ramp = (TileFlag.SLOPE_RIGHT if dx > 0 else TileFlag.SLOPE_LEFT) if has_slopes else 0
+    else:
+        time_x = infinity
+    if dy:
+        dist, next_row = _first_boundary(top, top + height, dy, tile_size)
+        time_y = dist / abs(dy)
+        step_time_y = tile_size / abs(dy)
+        step_row = 1 if dy > 0 else -1
+    else:
+        time_y = infinity
+
+    move_x, move_y = dx, dy
+    while time_x < 1 or time_y < 1:
+        if time_x <= time_y:
+            # Entering a new column; check the rows covered at that moment
+            y = top + move_y * time_x if normal_y == 0 else top + move_y
+            # Ground under the line of a ramp the feet are on or walking onto isn't a wall, however far
+            # ahead of the feet the leading edge is
+            ramp_top = infinity
+            if ramp:
+                ramp_top = _ramp_line(grid, next_col * tile_size - width / 2. if dx > 0 else
+                                      (next_col + 1) * tile_size + width / 2.,
+                                      floor((y + height - EPSILON) / tile_size), next_col, step_col, ramp)
+            for row in _tile_span(y, y + height, tile_size):
+                if get_flags(next_col, row) & x_mask and row * tile_size < ramp_top - EPSILON:
+                    # Stop flush against the tile
+                    move_x = next_col * tile_size - (left + width) if dx > 0 else (next_col + 1) * tile_size - left
+                    normal_x = -step_col
+                    time = min(time, time_x)
+                    time_x = infinity
+                    break
+            else:
+                next_col += step_col
+                time_x += step_time_x
+        else:
+            # Entering a new row; check the columns covered at that moment
+            x = left + move_x * time_y if normal_x == 0 else left + move_x
+            for col in _tile_span(x, x + width, tile_size):
+                if get_flags(col, next_row) & y_mask:
+                    move_y = next_row * tile_size - (top + height) if dy > 0 else (next_row + 1) * tile_size - top
+                    normal_y = -step_row
+                    time = min(time, time_y)
+                    time_y = infinity
+                    break
+            else:
+                next_row += step_row
+                time_y += step_time_y
+
+    if has_slopes:
+        move_y, landed = _resolve_slopes(grid, left, top, width, height, move_x, move_y, dy, standing)
+        if landed:
+            normal_y = -1
+
+    return SweepResult(move_x, move_y, time, (normal_x, normal_y))
+
+
+def sweep_rects(grid, rects, deltas, x_mask=TileFlag.SOLID, down_mask=TileFlag.GROUND, up_mask=TileFlag.SOLID):
+    """
+    Sweeps a batch of rectangles through the grid
+    :param grid: CollisionGrid to collide with
+    :param rects: sequence of pygame.Rect (or (left, top, width, height)) at the start of the movement
+    :param deltas: sequence of (dx, dy) movements, one per rect
+    Returns: list of SweepResult, in the order of rects
+    """
+    results = []
+    append = results.append
+    for (left, top, width, height), (dx, dy) in zip(rects, deltas):
+        append(sweep_rect(grid, left, top, width, height, dx, dy, x_mask, down_mask, up_mask))
+    return results
+
+
+def ground_at(grid, x, bottom, reach):
+    """
+    Returns: True if there is ground within reach pixels under feet at (x, bottom): a solid tile, the top
+    of a semisolid tile, or a slope's surface
+    """
+    tile_size = grid.tile_size
+    probe_y = bottom + reach
+    # Truncated like int(), as entities have always probed
+    col = int(x / tile_size)
+    row = int(probe_y / tile_size)
+    flags = grid.get_flags(col, row)
+    if flags & TileFlag.SOLID:
+        return True
+    if flags & TileFlag.SEMISOLID:
+        # Only when resting on its top (sweeps stop feet exactly there), not while passing up through it
+        return abs(bottom - row * tile_size) <= EPSILON
+    if flags & TileFlag.SLOPE:
+        return probe_y >= row * tile_size + grid.profiles.surface(flags, floor(x) - col * tile_size)
+    return False
+
+
+def ground_under(grid, xs, bottoms, reach):
+    """
+    Batched ground_at
+    :param xs: NumPy array (or sequence) of feet x coordinates
+    :param bottoms: feet y coordinates, as many as xs
+    :param reach: pixels under the feet checked
+    Returns: NumPy bool array, True where there is ground
+    """
+    tile_size = grid.tile_size
+    xs = np.asarray(xs, dtype=float)
+    bottoms = np.asarray(bottoms, dtype=float)
+    probe_ys = bottoms + reach
+    cols = (xs / tile_size).astype(np.intp)
+    rows = (probe_ys / tile_size).astype(np.intp)
+    flags = grid.get_flags_many(cols, rows)
+    tops = rows * tile_size
+    ground = (flags & TileFlag.SOLID) != 0
+    ground |= ((flags & TileFlag.SEMISOLID) != 0) & (np.abs(bottoms - tops) <= EPSILON)
+    if grid.has_slopes:
+        sloped = (flags & TileFlag.SLOPE) != 0
+        if sloped.any():
+            columns = np.floor(xs[sloped]).astype(np.intp) - cols[sloped] * tile_size
+            surfaces = tops[sloped] + grid.profiles.table[(flags[sloped] & TileFlag.SLOPE) >> 3, columns]
+            ground[sloped] = probe_ys[sloped] >= surfaces
+    return ground
@@ -0,0 +1,285 @@
+"""
+Tile properties used by the map, and the per-tile flags baked from them.
+"""
+
+
+from enum import Enum
+
+import numpy as np
+
+
+class MapInfo(Enum):
+    """ Property values used to get information from map
+    """
+    MAIN = 'main' # Main layer of tilemap
+
+    SPAWN = 'spawn'
+    SOLID = 'solid'
+    SEMISOLID = 'semisolid'
+    SLOPE_LEFT = 'slope left'
+    SLOPE_RIGHT = 'slope right'
+    GOAL = 'goal' # Reaching one ends a level
+
+
+def find_main_layer(map_data):
+    """
+    Returns: index of the first layer with the main property, or None if there isn't one
+    :param map_data: pytmx TiledMap (or anything with the same layers)
+    """
+    for i, layer in enumerate(map_data.layers):
+        if layer.properties.get(MapInfo.MAIN.value):
+            return i
+    return None
+
+
+class TileFlag(object):
+    """ Bits stored per tile in the CollisionGrid. Plain ints so hot paths avoid Enum overhead
+    """
+    NONE = 0
+    SOLID = 1 << 0
+    SEMISOLID = 1 << 1
+    SLOPE_LEFT = 1 << 2 # Rises to the left
+    SLOPE_RIGHT = 1 << 3 # Rises to the right
+    SPAWN = 1 << 4
+
+    # Tiles an entity can stand on the top of
+    GROUND = SOLID | SEMISOLID
+    # Tiles an entity stands on the surface of (see HeightProfiles)
+    SLOPE = SLOPE_LEFT | SLOPE_RIGHT
+
+    def from_properties(properties):
+        """
+        Returns: TileFlag bits for a tile's property dict
+        :param properties: tile properties from pytmx (may be None)
+        """
+        flags = TileFlag.NONE
+        if not properties:
+            return flags
+        for info, flag in _PROPERTY_FLAGS:
+            if properties.get(info.value):
+                flags |= flag
+        return flags
+
+
+_PROPERTY_FLAGS = (
+    (MapInfo.SOLID, TileFlag.SOLID),
+    (MapInfo.SEMISOLID, TileFlag.SEMISOLID),
+    (MapInfo.SLOPE_LEFT, TileFlag.SLOPE_LEFT),
+    (MapInfo.SLOPE_RIGHT, TileFlag.SLOPE_RIGHT),
+    (MapInfo.SPAWN, TileFlag.SPAWN),
+)
+
+
+class HeightProfiles(object):
+    """
+    Surface of each kind of sloped tile at every pixel column, for one tile size. Built once per tile
+    size, so finding where a slope's surface is is a table lookup
+    """
+
+    # HeightProfiles by tile size
+    _cache = {}
+
+    def __init__(self, tile_size):
+        """
+        :param tile_size: size of a (square) tile in pixels
+        """
+        self.tile_size = tile_size
+        # Slope flag -> pixels from the top of the tile down to its surface, per pixel column
+        self.tops = {
+            TileFlag.SLOPE_RIGHT: [tile_size - 1 - x for x in range(tile_size)],
+            TileFlag.SLOPE_LEFT: list(range(tile_size)),
+        }
+        # Same tables as a NumPy array indexed [(flags & TileFlag.SLOPE) >> 3, column] (row 0 is SLOPE_LEFT,
+        # row 1 SLOPE_RIGHT), for batched lookups
+        self.table = np.array([self.tops[TileFlag.SLOPE_LEFT], self.tops[TileFlag.SLOPE_RIGHT]])
+
+    def get(tile_size):
+        """ Returns: the HeightProfiles for a tile size"""
+        profiles = HeightProfiles._cache.get(tile_size)
+        if profiles is None:
+            profiles = HeightProfiles._cache[tile_size] = HeightProfiles(tile_size)
+        return profiles
+
+    def surface(self, flags, column):
+        """
+        :param flags: TileFlag bits of a tile
+        :param column: pixel column in the tile (0 to tile_size - 1)
+        Returns: pixels from the tile's top down to its surface, or None if it isn't a slope
+        """
+        if flags & TileFlag.SLOPE_RIGHT:
+            return self.tops[TileFlag.SLOPE_RIGHT][column]
+        if flags & TileFlag.SLOPE_LEFT:
+            return self.tops[TileFlag.SLOPE_LEFT][column]
+        return None
+
+
+class CollisionGrid(object):
+    """ Compact grid of TileFlag bits for every tile of a map layer, one byte per tile
+    """
+
+    # Tiles around a slope that movement checks it for (see near_slope)
+    SLOPE_REACH = 2
+
+    def __init__(self, width, height, tile_size, flags=None):
+        """
+        :param width: width of the grid in tiles
+        :param height: height of the grid in tiles
+        :param tile_size: size of a (square) tile in pixels
+        :param flags: row-major buffer of width * height bytes. Zeroed if not given
+        """
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.flags = flags if flags is not None else bytearray(width * height)
+        if len(self.flags) != width * height:
+            raise ValueError('Flag buffer has ' + str(len(self.flags)) + ' tiles, expected ' + str(width * height))
+        # (height, width) NumPy view of flags, made on first use
+        self._array = None
+        # Whether any tile is a slope, and a (height, width) bool array of the tiles near one, worked out on first use
+        self._has_slopes = None
+        self._near_slopes = None
+        self.profiles = HeightProfiles.get(tile_size)
+
+    def from_tiled_map(map_data, layer_index):
+        """
+        Bakes a tile layer of a pytmx map into a CollisionGrid
+        :param map_data: pytmx TiledMap
+        :param layer_index: index of the tile layer to bake
+        """
+        if layer_index is None:
+            raise ValueError('Map has no layer marked as ' + MapInfo.MAIN.value)
+        grid = CollisionGrid(map_data.width, map_data.height, map_data.tilewidth)
+        layer_data = map_data.layers[layer_index].data
+
+        # Resolve each gid once instead of once per tile
+        gid_flags = {}
+        flags = grid.flags
+        for y, row in enumerate(layer_data):
+            offset = y * grid.width
+            for x, gid in enumerate(row):
+                tile_flags = gid_flags.get(gid)
+                if tile_flags is None:
+                    tile_flags = TileFlag.from_properties(map_data.tile_properties.get(gid))
+                    gid_flags[gid] = tile_flags
+                flags[offset + x] = tile_flags
+        return grid
+
+    def in_bounds(self, x, y):
+        """ Returns: True if tile (x, y) is inside the grid"""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get_flags(self, x, y):
+        """
+        Returns: TileFlag bits of tile (x, y), or TileFlag.NONE if out of bounds
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.flags[y * self.width + x]
+        return TileFlag.NONE
+
+    @property
+    def has_slopes(self):
+        """ Returns: True if any tile is sloped (so flat maps skip slope resolution)"""
+        if self._has_slopes is None:
+            self._has_slopes = bool((np.frombuffer(self.flags, dtype=np.uint8) & TileFlag.SLOPE).any())
+        return self._has_slopes
+
+    def near_slope(self, x, y):
+        """ Returns: True if tile (x, y) is within SLOPE_REACH tiles of a slope"""
+        if not self.has_slopes or not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        if self._near_slopes is None:
+            sloped = (np.frombuffer(self.flags, dtype=np.uint8) & TileFlag.SLOPE).reshape(self.height, self.width) != 0
+            reach = self.SLOPE_REACH
+            padded = np.pad(sloped, reach, 'constant')
+            near = np.zeros_like(sloped)
+            for dy in range(2 * reach + 1):
+                for dx in range(2 * reach + 1):
+                    near |= padded[dy:dy + self.height, dx:dx + self.width]
+            self._near_slopes = near
+        return bool(self._near_slopes[y, x])
+
+    def as_array(self):
+        """ Returns: (height, width) NumPy uint8 view of the flags. Shares the buffer, so set_flags shows through"""
+        if self._array is None:
+            self._array = np.frombuffer(self.flags, dtype=np.uint8).reshape(self.height, self.width)
+        return self._array
+
+    def get_flags_many(self, xs, ys):
+        """
+        Looks up many tiles at once
+        :param xs: NumPy array (or sequence) of tile x coordinates
+        :param ys: tile y coordinates, as many as xs
+        Returns: NumPy uint8 array of the TileFlag bits of each tile (TileFlag.NONE where out of bounds)
+        """
+        self.as_array()
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        flags = np.zeros(len(xs), dtype=np.uint8)
+        flags[inside] = self._array[ys[inside], xs[inside]]
+        return flags
+
+    def set_flags(self, x, y, flags):
+        """ Overwrites the TileFlag bits of tile (x, y)"""
+        if not self.in_bounds(x, y):
+            raise IndexError('Tile ' + str((x, y)) + ' is outside of the collision grid')
+        self.flags[y * self.width + x] = flags
+        if flags & TileFlag.SLOPE:
+            self._has_slopes = True
+            self._near_slopes = None
+
+
+class TileIndex(object):
+    """
+    Coordinates of the tiles carrying each property, so tiles can be looked up without scanning the map.
+    Coordinates of a property are ordered by column from the left, bottom to top in each column.
+    """
+
+    # Properties pytmx adds to every tile, which say nothing about gameplay
+    IGNORED = frozenset(('id', 'width', 'height', 'frames', 'colliders', 'source', 'trans', 'type'))
+
+    def __init__(self, tiles=None):
+        """
+        :param tiles: dict of property name -> list of (x, y) tiles
+        """
+        self.tiles = tiles if tiles is not None else {}
+
+    def from_layer(width, height, layer_data, tile_properties):
+        """
+        Indexes every tile of a layer
+        :param width, height: size of the layer in tiles
+        :param layer_data: rows of gids (layer_data[y][x])
+        :param tile_properties: dict of gid -> properties
+        """
+        # Names of the (truthy) properties of each gid, resolved once
+        gid_names = {}
+        for gid, properties in tile_properties.items():
+            names = [name for name, value in properties.items() if value and name not in TileIndex.IGNORED]
+            if names:
+                gid_names[gid] = names
+
+        tiles = {}
+        for x in range(width):
+            for y in range(height - 1, -1, -1):
+                names = gid_names.get(layer_data[y][x])
+                if names:
+                    for name in names:
+                        tiles.setdefault(name, []).append((x, y))
+        return TileIndex(tiles)
+
+    def find(self, prop):
+        """
+        Returns: list of (x, y) tiles carrying a property (empty if there are none)
+        :param prop: MapInfo member or name of a custom property
+        """
+        name = prop.value if isinstance(prop, MapInfo) else prop
+        return self.tiles.get(name, [])
+
+    def first(self, prop):
+        """ Returns: first (x, y) tile carrying a property, or None"""
+        found = self.find(prop)
+        return found[0] if found else None
+
+    def properties(self):
+        """ Returns: names of every indexed property"""
+        return list(self.tiles)
@@ -0,0 +1,183 @@
+"""
+Draws the game at a low resolution and scales it up to the window.
+"""
+
+
+import pygame
+import pyscroll
+
+from Render.ZoomCache import ZoomCache
+
+
+class RenderPipeline(object):
+    """
+    Renders the map and sprites into a small surface, then scales it to the window by a whole number,
+    so every frame is a nearest neighbour integer scale into a fixed area of the screen.
+
+    When the camera hasn't moved (and the map has no animated tiles), only the areas sprites moved
+    through are scaled and pushed to the display instead of the whole window.
+
+    Zoom changes go through set_zoom, which switches to a renderer cached for that zoom (see ZoomCache).
+    """
+
+    # Fall back to a full frame past this many dirty rects
+    MAX_DIRTY_RECTS = 48
+
+    def __init__(self, screen, map_layer, group, base_size, dirty_rects=True, profiler=None):
+        """
+        :param screen: display surface
+        :param map_layer: pyscroll BufferedRenderer drawing the map
+        :param group: PyscrollGroup of the sprites to draw
+        :param base_size: (width, height) of the game's view before scaling. The window shows at least this much
+        :param dirty_rects: whether to only update the changed parts of the screen when the camera is still
+        :param profiler: Profiler to time drawing, scaling and flipping with, or None
+        """
+        self.map_layer = map_layer
+        self.group = group
+        self.base_size = base_size
+        self.dirty_rects = dirty_rects
+        self.profiler = profiler
+        # Animated tiles change without the camera moving
+        self._animated = any(True for _ in map_layer.data.get_animations())
+        self.zoom_cache = ZoomCache(map_layer, None)
+        self.resize(screen.get_size(), screen)
+
+    def resize(self, size, screen=None):
+        """
+        Recreates the low resolution surface (and the scaling target) for a new window size
+        :param size: (width, height) of the window
+        :param screen: display surface, if already created at that size
+        """
+        self.screen = screen if screen is not None else pygame.display.set_mode(size, pygame.RESIZABLE)
+        width, height = self.screen.get_size()
+        base_width, base_height = self.base_size
+        self.scale = max(1, min(width // base_width, height // base_height))
+        surface_size = (max(1, width // self.scale), max(1, height // self.scale))
+
+        self.surface = pygame.Surface(surface_size).convert()
+        self.zoom_cache.set_size(surface_size, self.map_layer)
+        # Area of the screen the surface scales into. The rest (less than a scaled pixel) stays black
+        scaled_size = (surface_size[0] * self.scale, surface_size[1] * self.scale)
+        self.screen.fill((0, 0, 0))
+        self.target = self.screen.subsurface(pygame.Rect((0, 0), scaled_size))
+
+        self._last_view = None
+        self._last_zoom = None
+        self._last_sprite_rects = []
+        self._full_frame = True
+
+    def sprite_rects(self):
+        """ Returns: list of rects sprites cover on the low resolution surface"""
+        ox, oy = self.map_layer.get_center_offset()
+        bounds = self.surface.get_rect()
+        rects = []
+        for sprite in self.group.sprites():
+            rect = sprite.rect.move(ox, oy).clip(bounds)
+            if rect.width and rect.height:
+                rects.append(rect)
+        return rects
+
+    def draw(self, center, overlay=None):
+        """
+        Draws a frame
+        :param center: world position to center the camera on
+        :param overlay: function called with the screen after scaling, to draw on top at full resolution
+        """
+        profiler = self.profiler
+        self.group.center(center)
+
+        if profiler:
+            profiler.start('group.draw')
+        self.group.draw(self.surface)
+        if profiler:
+            profiler.stop('group.draw')
+            profiler.start('scale')
+
+        view = self.map_layer.view_rect.copy()
+        zoom = self.map_layer.zoom
+        dirty = None
+        still = view == self._last_view and zoom == self._last_zoom
+        if (self.dirty_rects and not self._full_frame and overlay is None and not self._animated
+                and still and zoom == 1):
+            sprite_rects = self.sprite_rects()
+            dirty = self._last_sprite_rects + sprite_rects
+            self._last_sprite_rects = sprite_rects
+            if len(dirty) > self.MAX_DIRTY_RECTS:
+                dirty = None
+        elif self.dirty_rects:
+            self._last_sprite_rects = self.sprite_rects() if zoom == 1 else []
+        self._last_view = view
+        self._last_zoom = zoom
+        self._full_frame = False
+
+        if dirty is None:
+            pygame.transform.scale(self.surface, self.target.get_size(), self.target)
+        else:
+            dirty = self._scale_rects(dirty)
+
+        if profiler:
+            profiler.stop('scale')
+        if overlay is not None:
+            overlay(self.screen)
+        if profiler:
+            profiler.start('flip')
+        if dirty is None:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+        if profiler:
+            profiler.stop('flip')
+
+        # A still camera leaves time to build a renderer for a zoom level that may be wanted next
+        if still and self.zoom_cache.queue:
+            if profiler:
+                profiler.start('zoom_cache')
+            self.zoom_cache.build_next(view.center)
+            if profiler:
+                profiler.stop('zoom_cache')
+
+    def _scale_rects(self, rects):
+        """
+        Scales parts of the low resolution surface onto the screen
+        Returns: list of the screen rects updated
+        """
+        scale = self.scale
+        updated = []
+        for rect in rects:
+            screen_rect = pygame.Rect(rect.x * scale, rect.y * scale, rect.width * scale, rect.height * scale)
+            pygame.transform.scale(self.surface.subsurface(rect), screen_rect.size, self.target.subsurface(screen_rect))
+            updated.append(screen_rect)
+        return updated
+
+    def redraw(self):
+        """ Makes the next frame update the whole screen"""
+        self._full_frame = True
+
+    def redraw_tiles(self):
+        """ Redraws the map's tile buffer (e.g. after tiles were streamed in) and then the whole screen"""
+        # Setting the same size is pyscroll's public way to redraw every tile. It also drops the renderers
+        # cached for other zoom levels, which have the old tiles
+        center = self.map_layer.view_rect.center
+        self.zoom_cache.set_size(self.surface.get_size(), self.map_layer)
+        self.map_layer.center(center)
+        self._full_frame = True
+
+    def set_zoom(self, zoom, prefetch=()):
+        """
+        Changes the zoom level, using a cached renderer for it if there is one. Replaces group with one
+        drawing with the new renderer
+        :param zoom: new zoom level
+        :param prefetch: zoom levels likely to be wanted next, to build renderers for while the camera is still
+        """
+        renderer = self.zoom_cache.get(zoom)
+        if renderer is not self.map_layer:
+            renderer.center(self.map_layer.view_rect.center)
+            self.map_layer = renderer
+            # PyscrollGroup can't switch renderers, so its sprites move to a new group drawing with this one
+            group = pyscroll.PyscrollGroup(map_layer=renderer)
+            for sprite in self.group.sprites():
+                group.add(sprite, layer=self.group.get_layer_of_sprite(sprite))
+            self.group.empty()
+            self.group = group
+            self._full_frame = True
+        self.zoom_cache.prefetch(prefetch)
@@ -0,0 +1,110 @@
+"""
+Keeps a pyscroll renderer per zoom level, so changing zoom doesn't rebuild and redraw the map's buffer.
+"""
+
+
+from collections import OrderedDict
+
+import pyscroll
+
+
+class ZoomCache(object):
+    """
+    LRU cache of pyscroll BufferedRenderers by zoom level. pyscroll reallocates its buffers and redraws
+    every tile whenever zoom changes; switching to a cached renderer for that zoom only has to scroll
+    it to the camera.
+
+    Renderers for zoom levels likely to be wanted next are queued with prefetch and built one at a time
+    by build_next, which the render loop calls on frames with time to spare. (Building on a thread
+    instead makes every frame meanwhile wait on the GIL, which stutters worse than the stall it avoids.)
+    """
+
+    def __init__(self, map_layer, size, capacity=6):
+        """
+        :param map_layer: BufferedRenderer in use. Its data and settings are used for new renderers
+        :param size: (width, height) renderers draw at
+        :param capacity: most renderers kept (each holds a buffer of about size / zoom pixels)
+        """
+        self.data = map_layer.data
+        self.clamp_camera = map_layer.clamp_camera
+        self.size = size
+        self.capacity = capacity
+        # zoom -> BufferedRenderer, least recently used first
+        self.renderers = OrderedDict()
+        self.renderers[self._key(map_layer.zoom)] = map_layer
+        # Zoom levels to build
+        self.queue = []
+
+    def _key(self, zoom):
+        """ Returns: dict key of a zoom level (rounded, so repeated += steps hit the same entry)"""
+        return round(zoom, 4)
+
+    def _build(self, zoom, center=None):
+        """ Returns: new BufferedRenderer at zoom, with its buffer drawn (around center, if given)"""
+        renderer = pyscroll.orthographic.BufferedRenderer(self.data, self.size, clamp_camera=self.clamp_camera)
+        renderer.zoom = zoom
+        if center is not None:
+            renderer.center(center)
+        return renderer
+
+    def _store(self, key, renderer):
+        """ Adds a renderer, evicting the least recently used ones past capacity"""
+        self.renderers[key] = renderer
+        self.renderers.move_to_end(key)
+        while len(self.renderers) > self.capacity:
+            self.renderers.popitem(last=False)
+
+    def get(self, zoom):
+        """
+        Returns: renderer for a zoom level, building it now if it isn't cached
+        """
+        key = self._key(zoom)
+        renderer = self.renderers.get(key)
+        if renderer is not None:
+            self.renderers.move_to_end(key)
+            return renderer
+        renderer = self._build(key)
+        self._store(key, renderer)
+        return renderer
+
+    def prefetch(self, zooms):
+        """
+        Queues renderers to build for zoom levels likely to be wanted next (replacing any still queued)
+        :param zooms: zoom levels, most wanted first
+        """
+        self.queue = [self._key(zoom) for zoom in zooms if zoom > 0 and self._key(zoom) not in self.renderers]
+
+    def build_next(self, center=None):
+        """
+        Builds the next queued renderer
+        :param center: where the camera is, so the renderer is ready to draw there
+        Returns: True if a renderer was built
+        """
+        while self.queue:
+            key = self.queue.pop(0)
+            if key not in self.renderers:
+                renderer = self._build(key, center)
+                # Behind the renderers in use, so prefetching can't evict them
+                self._store(key, renderer)
+                self.renderers.move_to_end(key, last=False)
+                return True
+        return False
+
+    def warm(self, zooms, center=None):
+        """ Builds renderers for zoom levels now (e.g. while a level loads)"""
+        self.prefetch(zooms)
+        while self.build_next(center):
+            pass
+
+    def drop_others(self, current):
+        """ Forgets every renderer but the one in use, e.g. after the map's tiles changed"""
+        self.renderers = OrderedDict([(self._key(current.zoom), current)])
+
+    def set_size(self, size, current):
+        """
+        Resizes for a new view size. Only the renderer in use is kept
+        :param current: BufferedRenderer in use
+        """
+        self.size = size
+        current.set_size(size)
+        self.drop_others(current)
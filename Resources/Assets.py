@@ -0,0 +1,118 @@
+"""
+Loads images and maps on a pool of worker threads, sharing each loaded asset instead of loading it
+again for every user.
+
+Decoding (PNG decompression, compiling a map's cache) happens on the workers; converting images to
+the display's format happens on the main thread the first time each image is used, since it needs
+the display.
+"""
+
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pygame
+
+from Debug.Log import Log
+from Map import MapCache
+
+
+_log = Log('assets')
+
+
+class Assets(object):
+    """ Class-level asset store. Keys are absolute paths, so one file is only ever loaded once"""
+
+    # Path -> decoded surface, and -> surface converted for the display
+    raw_images = {}
+    images = {}
+    # (kind, path) -> Future of a load in progress or done
+    futures = {}
+    # Futures of loads requested since the last reset_progress, for progress reporting
+    batch = []
+    executor = None
+
+    def _submit(key, function, *args):
+        """ Returns: Future running function on the pool, or the existing one for key"""
+        future = Assets.futures.get(key)
+        if future is None:
+            if Assets.executor is None:
+                Assets.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2,
+                                                     thread_name_prefix='assets')
+            future = Assets.executor.submit(function, *args)
+            Assets.futures[key] = future
+            Assets.batch.append(future)
+        return future
+
+    def load_image_async(path):
+        """
+        Starts decoding an image on the pool
+        Returns: Future of the decoded surface (not converted for the display)
+        """
+        path = os.path.abspath(path)
+        return Assets._submit(('image', path), pygame.image.load, path)
+
+    def load_map_async(map_path):
+        """
+        Starts compiling a map's cache on the pool (see MapCache), so loading it later only maps the file
+        Returns: Future of the cache's path, or None if the map can't be compiled
+        """
+        map_path = os.path.abspath(map_path)
+        return Assets._submit(('map', map_path), Assets._prepare_map, map_path)
+
+    def _prepare_map(map_path):
+        """ Compiles a map's cache if it's missing or stale. Returns: the cache's path, or None"""
+        path = MapCache.cache_path(map_path)
+        if os.path.exists(path) and MapCache.read(path, map_path, load_images=False) is not None:
+            return path
+        return MapCache.compile_map(map_path, path)
+
+    def image(path):
+        """
+        Returns: surface for an image file, shared by every caller. Waits for (or does) the load if needed.
+        Converted to the display's format once there is a display
+        """
+        path = os.path.abspath(path)
+        image = Assets.images.get(path)
+        if image is not None:
+            return image
+        raw = Assets.raw_images.get(path)
+        if raw is None:
+            future = Assets.futures.get(('image', path))
+            raw = future.result() if future is not None else pygame.image.load(path)
+            Assets.raw_images[path] = raw
+        if pygame.display.get_surface() is None:
+            # Can only convert to display format if there is a display (not when headless)
+            return raw
+        image = raw.convert_alpha()
+        Assets.images[path] = image
+        return image
+
+    def progress():
+        """ Returns: (loads finished, loads requested) since the last reset_progress"""
+        return sum(1 for future in Assets.batch if future.done()), len(Assets.batch)
+
+    def done():
+        """ Returns: True once every load since the last reset_progress has finished"""
+        return all(future.done() for future in Assets.batch)
+
+    def shutdown():
+        """ Stops the worker threads (e.g. before forking processes). They start again on the next load"""
+        if Assets.executor is not None:
+            Assets.executor.shutdown(wait=True)
+            Assets.executor = None
+
+    def wait(timeout=None):
+        """
+        Waits for the loads since the last reset_progress
+        :param timeout: most seconds to wait, or None to wait until they're all finished
+        Returns: True if they're all finished
+        """
+        return not wait(Assets.batch, timeout).not_done
+
+    def reset_progress():
+        """ Starts counting progress over (loads already done stay loaded)"""
+        for future in Assets.batch:
+            if future.done() and future.exception() is not None:
+                _log.warning('asset_failed', error=future.exception())
+        Assets.batch = []
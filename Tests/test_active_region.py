@@ -0,0 +1,70 @@
+"""
+Entities sleeping and waking as the camera moves, and leaving the ActiveRegion when killed.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import pygame
+
+import constants
+from Entities.ActiveRegion import ActiveRegion, SleepState
+from Entities.Entity import Entity
+from Entities.Player import Player
+from Map.GameMap import GameMap
+
+
+class Marker(Entity):
+    """ Entity without components, so the broadphase doesn't know about it"""
+
+    def __init__(self, world, position):
+        super().__init__(world)
+        self.rect = pygame.Rect(position, (16, 16))
+
+    def update(self, deltatime):
+        super().update(deltatime)
+
+
+def region_with(*entities):
+    region = ActiveRegion(entities[0].world, margin=0)
+    for entity in entities:
+        region.add(entity)
+    return region
+
+
+def test_unhashed_sleepers_wake_when_the_region_reaches_them():
+    world = GameMap(constants.TEST_MAP, headless=True)
+    marker = Marker(world, (1000, 100))
+    region = region_with(marker)
+    region.update((0, 0, 200, 200))
+    assert marker.sleep_state == SleepState.OUTSIDE
+    region.update((900, 0, 200, 200))
+    assert marker.sleep_state == SleepState.AWAKE
+    world.close()
+
+
+def test_killed_sleepers_leave_the_region():
+    world = GameMap(constants.TEST_MAP, headless=True)
+    player = Player(world, position=(1000, 100))
+    marker = Marker(world, (1000, 100))
+    region = region_with(player, marker)
+    region.update((0, 0, 200, 200))
+    assert player.sleep_state == marker.sleep_state == SleepState.OUTSIDE
+    player.kill()
+    marker.kill()
+    assert not any(region.entities.values())
+    assert not region._unhashed and not region._still
+    # Nothing wakes where they were
+    region.update((900, 0, 200, 200))
+    assert not region.awake
+    world.close()
+
+
+def test_killed_awake_entities_leave_the_region():
+    world = GameMap(constants.TEST_MAP, headless=True)
+    marker = Marker(world, (100, 100))
+    region = region_with(marker)
+    marker.kill()
+    assert not region.awake and not region._still
+    world.close()
@@ -0,0 +1,32 @@
+"""
+Entities stepped together by BatchPhysics.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import constants
+from Entities.Physics import BatchPhysics
+from Entities.Player import Player
+from Map.GameMap import GameMap
+
+
+def test_killed_entities_leave_the_stage():
+    world = GameMap(constants.TEST_MAP, headless=True)
+    physics = BatchPhysics(world)
+    killed = Player(world, position=(100, 100))
+    survivor = Player(world, position=(300, 100))
+    physics.add(killed)
+    physics.add(survivor)
+    physics.step(1 / 60.)
+
+    killed.kill()
+    assert killed not in physics and killed not in world.spatial_hash
+    for _ in range(5):
+        physics.step(1 / 60.)
+    assert physics.entities == [survivor]
+    # Sweeps of the dead entity would have put it back in the broadphase
+    assert killed not in world.spatial_hash
+    assert survivor._physics_index == 0
+    world.close()
@@ -0,0 +1,48 @@
+"""
+Collision lookups on a ChunkedMap going through its chunks.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import numpy as np
+import pytest
+
+import constants
+from Map import MapCache
+from Map.ChunkedMap import ChunkedMap
+from Map.TileData import TileFlag
+
+
+@pytest.fixture
+def chunked():
+    chunked_map = ChunkedMap(MapCache.load(constants.TEST_MAP, load_images=False), load_images=False, chunk_size=4)
+    yield chunked_map
+    chunked_map.close()
+
+
+def test_batched_lookups_load_only_the_chunks_they_touch(chunked):
+    grid = chunked.collision_grid
+    xs = np.array([-1, 0, 1, 5, 9, chunked.width])
+    ys = np.array([0, 0, 2, 3, 6, 1])
+    expected = chunked.compiled.collision_grid.get_flags_many(xs, ys)
+    assert (grid.get_flags_many(xs, ys) == expected).all()
+    assert set(chunked.chunks) == {(0, 0), (1, 0), (2, 1)}
+
+
+def test_batched_lookups_match_the_compiled_grid(chunked):
+    ys, xs = np.mgrid[-1:chunked.height + 1, -1:chunked.width + 1]
+    expected = chunked.compiled.collision_grid.get_flags_many(xs.ravel(), ys.ravel())
+    assert (chunked.collision_grid.get_flags_many(xs.ravel(), ys.ravel()) == expected).all()
+
+
+def test_near_slope_reads_chunks(chunked):
+    grid = chunked.collision_grid
+    compiled = chunked.compiled.collision_grid
+    grid.set_flags(6, 5, TileFlag.SLOPE_RIGHT)
+    grid.set_flags(13, 2, TileFlag.SLOPE_LEFT)
+    chunked.chunks.clear()
+    for y in range(10):
+        for x in range(18):
+            assert grid.near_slope(x, y) == compiled.near_slope(x, y), (x, y)
@@ -0,0 +1,57 @@
+"""
+CollisionMesh sweeps against the tile sweep they stand in for.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import pytest
+
+from Map.CollisionMesh import CollisionMesh, greedy_mesh
+from Map.TileCollision import sweep_rect
+from Map.TileData import CollisionGrid, TileFlag
+
+
+TILE = 32
+
+
+def stacked_semisolids():
+    """ Returns: CollisionGrid with two semisolid rows stacked over a solid floor"""
+    grid = CollisionGrid(10, 10, TILE)
+    for x in range(2, 6):
+        grid.set_flags(x, 5, TileFlag.SEMISOLID)
+        grid.set_flags(x, 6, TileFlag.SEMISOLID)
+    for x in range(10):
+        grid.set_flags(x, 9, TileFlag.SOLID)
+    return grid
+
+
+def test_semisolids_are_not_merged_vertically():
+    rects = greedy_mesh(stacked_semisolids().as_array())
+    semisolid = [rect for rect in rects if rect[4] & TileFlag.SEMISOLID]
+    assert semisolid == [(2, 5, 4, 1, TileFlag.SEMISOLID), (2, 6, 4, 1, TileFlag.SEMISOLID)]
+
+
+def test_falling_inside_upper_semisolid_lands_on_lower():
+    grid = stacked_semisolids()
+    mesh = CollisionMesh(grid)
+    # Feet 10 px into the upper tile, falling past the top of the lower one
+    left, top, width, height = 2 * TILE + 8, 5 * TILE + 10 - TILE, 16, TILE
+    tiles = sweep_rect(grid, left, top, width, height, 0, 40)
+    merged = mesh.sweep_rect(left, top, width, height, 0, 40)
+    assert tiles.normal == (0, -1)
+    assert top + height + tiles.dy == 6 * TILE
+    assert (merged.dx, merged.dy, merged.normal) == (tiles.dx, tiles.dy, tiles.normal)
+
+
+@pytest.mark.parametrize('dx', [-37, -5, 0, 5, 37])
+@pytest.mark.parametrize('dy', [-45, -12, 0, 12, 45])
+def test_mesh_matches_tiles_around_stacked_semisolids(dx, dy):
+    grid = stacked_semisolids()
+    mesh = CollisionMesh(grid)
+    for left in range(0, 8 * TILE, 11):
+        for top in range(2 * TILE, 8 * TILE, 7):
+            tiles = sweep_rect(grid, left, top, 20, 24, dx, dy)
+            merged = mesh.sweep_rect(left, top, 20, 24, dx, dy)
+            assert (merged.dx, merged.dy, merged.normal) == (tiles.dx, tiles.dy, tiles.normal), (left, top)
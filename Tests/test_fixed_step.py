@@ -0,0 +1,75 @@
+"""
+Fixed physics steps run from frame times, and entities drawn between their last two steps.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import os
+
+import pygame
+import pytest
+
+from autoplatformer import MainGame
+from Input.Buttons import Buttons
+from Input.InputSource import ScriptedInput
+
+
+def running_right():
+    return ScriptedInput([(1000, [Buttons.MOVE_RIGHT, Buttons.RUN])])
+
+
+@pytest.fixture
+def headless_game():
+    game = MainGame(physics_rate=120)
+    game.input_source = running_right()
+    game.set_up_map(headless=True)
+    game.spawn_player()
+    yield game
+    game.world.close()
+
+
+def test_advance_runs_the_steps_the_time_covers(headless_game):
+    step = headless_game.step
+    left_over, steps = headless_game.advance(2.5 * step)
+    assert steps == 2
+    assert left_over == pytest.approx(0.5 * step)
+    # One poll of the input per step
+    assert headless_game.input_source._frame == 2
+
+
+def test_advance_drops_time_it_cant_catch_up_on(headless_game):
+    step = headless_game.step
+    left_over, steps = headless_game.advance(100 * step)
+    assert steps == MainGame.MAX_STEPS_PER_FRAME
+    assert left_over == step
+
+
+def test_entities_are_drawn_between_their_last_two_steps(monkeypatch):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    game = MainGame(physics_rate=60)
+    game.screen = pygame.display.set_mode(game.SCREENRECT.size)
+    game.input_source = running_right()
+    game.set_up_map()
+    game.spawn_player()
+    player = game.player
+    # Get up to speed, so the last step moves the player
+    for _ in range(120):
+        game.advance(game.step)
+    (_, previous_x, previous_y), = [entry for entry in game._previous if entry[0] is player]
+    current = player.rect.topleft
+    assert current[0] - previous_x >= 2
+
+    drawn = []
+    monkeypatch.setattr(game.renderer, 'draw', lambda center, overlay=None: drawn.append(player.rect.topleft))
+    game.draw(0.5)
+    game.draw(1.)
+    assert drawn[0] == (round(previous_x + (current[0] - previous_x) * 0.5),
+                        round(previous_y + (current[1] - previous_y) * 0.5))
+    assert drawn[1] == current
+    # Drawing doesn't move the entity
+    assert player.rect.topleft == current
+    game.world.close()
+    pygame.display.quit()
@@ -0,0 +1,68 @@
+"""
+Batched ground probes against the per-entity probe they replace.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import random
+
+import numpy as np
+
+import constants
+from Entities.Components.Components import GROUND_PROBE, GravityComponent
+from Entities.Player import Player
+from Map.GameMap import GameMap
+from Map.TileCollision import ground_at, ground_under
+from Map.TileData import CollisionGrid, TileFlag
+
+
+TILE = 32
+
+
+def mixed_grid():
+    """ Returns: CollisionGrid with solid, semisolid and both kinds of sloped tiles"""
+    grid = CollisionGrid(12, 8, TILE)
+    for x in range(12):
+        grid.set_flags(x, 7, TileFlag.SOLID)
+    for x in range(2, 5):
+        grid.set_flags(x, 4, TileFlag.SEMISOLID)
+    grid.set_flags(7, 6, TileFlag.SLOPE_RIGHT)
+    grid.set_flags(9, 6, TileFlag.SLOPE_LEFT)
+    grid.set_flags(10, 3, TileFlag.SOLID)
+    return grid
+
+
+def test_ground_under_matches_ground_at():
+    grid = mixed_grid()
+    rng = random.Random(5)
+    xs = [rng.uniform(-TILE, 13 * TILE) for _ in range(2000)]
+    bottoms = [rng.uniform(-TILE, 9 * TILE) for _ in range(2000)]
+    # Exactly on the tops of the floor, the semisolids and the raised block
+    xs += [100., 120., 330., 20.]
+    bottoms += [4 * TILE, 4 * TILE, 3 * TILE, 7 * TILE]
+    expected = [ground_at(grid, x, bottom, GROUND_PROBE) for x, bottom in zip(xs, bottoms)]
+    assert ground_under(grid, xs, bottoms, GROUND_PROBE).tolist() == expected
+    assert any(expected) and not all(expected)
+
+
+def test_gravity_system_matches_per_component_updates():
+    rng = random.Random(8)
+    positions = [(rng.uniform(0, 1600), rng.uniform(0, 900)) for _ in range(200)]
+    results = []
+    for batched in (False, True):
+        world = GameMap(constants.TEST_MAP, headless=True)
+        players = [Player(world, position=position) for position in positions]
+        gravities = world.systems.of_type(GravityComponent)
+        if batched:
+            GravityComponent.update_all(tuple(gravities), 1 / 60.)
+        else:
+            for gravity in gravities:
+                gravity.update(1 / 60.)
+        results.append([(player.components[GravityComponent.id_class].get_state(), tuple(player.acceleration))
+                        for player in players])
+        world.close()
+    assert results[0] == results[1]
+    states = np.array([state[0][0] for state in results[0]])
+    assert states.any() and not states.all()
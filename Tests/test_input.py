@@ -0,0 +1,64 @@
+"""
+Input sources, bindings, and the player acting on them. Sources run out at the right frame, so headless
+runs and replays last as long as their input.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import pytest
+
+from autoplatformer import MainGame
+from Input.Buttons import PLAYER_KEYS, Buttons
+from Input.InputLog import InputRecorder, InputReplayer, decode
+from Input.InputSource import InputSource, ScriptedInput
+
+
+def test_sources_have_to_poll():
+    with pytest.raises(TypeError):
+        InputSource()
+
+
+def test_script_is_done_after_its_last_frame():
+    script = ScriptedInput([(2, [Buttons.JUMP]), (0, []), (1, [Buttons.RUN])])
+    for _ in range(3):
+        assert not script.done
+        assert script.poll()
+    assert script.done
+    assert script.poll() == 0
+
+
+def test_looping_script_is_never_done():
+    script = ScriptedInput([(1, [Buttons.JUMP]), (2, [Buttons.RUN])], loop=True)
+    masks = [script.poll() for _ in range(6)]
+    assert masks[:3] == masks[3:]
+    assert not script.done
+
+
+def test_headless_run_lasts_as_long_as_the_script():
+    assert MainGame().main_headless(ScriptedInput([(10, [Buttons.MOVE_RIGHT])])) == 10
+
+
+def test_replay_lasts_as_long_as_the_recording():
+    script = ScriptedInput([(40, [Buttons.MOVE_RIGHT, Buttons.RUN]), (15, [Buttons.JUMP]), (30, [Buttons.MOVE_LEFT])])
+    recorder = InputRecorder(script, MainGame.HEADLESS_DELTA)
+    recording = MainGame()
+    recorded = recording.main_headless(recorder)
+    assert recorded == recorder.frames == 85
+
+    replay = MainGame()
+    replayed = replay.main_headless(InputReplayer(*decode(recorder.to_bytes())))
+    assert replayed == recorded
+    assert replay.player.rect.topleft == recording.player.rect.topleft
+
+
+def test_players_default_keys_are_distinct():
+    keys = [key for player_keys in PLAYER_KEYS for key in player_keys.values()]
+    assert len(keys) == len(set(keys))
+
+
+def test_spin_button_jumps():
+    game = MainGame()
+    game.main_headless(ScriptedInput([(5, []), (10, [Buttons.SPIN])]))
+    assert game.player.velocity.y < 0
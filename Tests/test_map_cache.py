@@ -0,0 +1,87 @@
+"""
+Map cache freshness checks.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import constants
+from Map import MapCache
+
+
+def copy_test_map(tmp_path):
+    """ Returns: path of a copy of the test map (with its tilesets) in tmp_path"""
+    directory = tmp_path / 'map'
+    shutil.copytree(os.path.dirname(constants.TEST_MAP), directory)
+    return str(directory / os.path.basename(constants.TEST_MAP))
+
+
+def count_hashes(monkeypatch):
+    """ Returns: list that gets a map path appended each time MapCache hashes a map's sources"""
+    calls = []
+    source_key = MapCache.source_key
+
+    def counting(map_path, files=None):
+        calls.append(map_path)
+        return source_key(map_path, files)
+
+    monkeypatch.setattr(MapCache, 'source_key', counting)
+    return calls
+
+
+def test_unchanged_sources_are_not_hashed(tmp_path, monkeypatch):
+    map_path = copy_test_map(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    MapCache.compile_map(map_path, cache_dir=cache_dir)
+    hashes = count_hashes(monkeypatch)
+    assert MapCache.load(map_path, load_images=False, cache_dir=cache_dir) is not None
+    assert hashes == []
+
+
+def test_touched_sources_are_hashed(tmp_path, monkeypatch):
+    map_path = copy_test_map(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    path = MapCache.compile_map(map_path, cache_dir=cache_dir)
+    stat = os.stat(map_path)
+    os.utime(map_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    hashes = count_hashes(monkeypatch)
+    # Same contents, so the cache is still used, and the new stats are kept for the next load
+    assert MapCache.read(path, map_path, load_images=False) is not None
+    assert hashes == [map_path]
+    assert MapCache.read(path, map_path, load_images=False) is not None
+    assert hashes == [map_path]
+
+
+def test_edited_sources_are_stale(tmp_path):
+    map_path = copy_test_map(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    path = MapCache.compile_map(map_path, cache_dir=cache_dir)
+    with open(map_path, 'a') as f:
+        f.write('\n')
+    assert MapCache.read(path, map_path, load_images=False) is None
+
+
+def test_empty_cache_file_is_recompiled(tmp_path):
+    map_path = copy_test_map(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    path = MapCache.cache_path(map_path, cache_dir)
+    os.makedirs(cache_dir)
+    open(path, 'wb').close()
+    assert MapCache.read(path, map_path, load_images=False) is None
+    assert MapCache.load(map_path, load_images=False, cache_dir=cache_dir) is not None
+
+
+def test_concurrent_compiles_publish_whole_files(tmp_path):
+    map_path = copy_test_map(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    with ThreadPoolExecutor(4) as pool:
+        paths = list(pool.map(lambda _: MapCache.compile_map(map_path, cache_dir=cache_dir), range(4)))
+    assert len(set(paths)) == 1
+    # No temporary files left behind
+    assert os.listdir(cache_dir) == [os.path.basename(paths[0])]
+    assert MapCache.read(paths[0], map_path, load_images=False) is not None
@@ -0,0 +1,46 @@
+"""
+Zooming and redrawing the map through RenderPipeline, on SDL's dummy display.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import os
+
+import pygame
+import pytest
+
+from autoplatformer import MainGame
+
+
+@pytest.fixture
+def game():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    game = MainGame()
+    game.screen = pygame.display.set_mode(game.SCREENRECT.size)
+    game.set_up_map()
+    game.spawn_player()
+    game.renderer.draw(game.player.rect.center)
+    yield game
+    game.world.close()
+    pygame.display.quit()
+
+
+def test_zooming_moves_the_sprites_to_a_group_drawing_with_the_new_renderer(game):
+    old_group = game.group
+    game.set_zoom(game.map_layer.zoom + game.ZOOM_STEP)
+    assert game.group is game.renderer.group is not old_group
+    assert game.player in game.group and not old_group
+    assert game.group.view == game.map_layer.view_rect
+    game.renderer.draw(game.player.rect.center)
+
+
+def test_redrawing_tiles_keeps_the_camera(game):
+    game.renderer.zoom_cache.warm([2.0])
+    view = game.map_layer.view_rect.copy()
+    game.renderer.redraw_tiles()
+    assert game.map_layer.view_rect == view
+    assert list(game.renderer.zoom_cache.renderers.values()) == [game.map_layer]
+    game.renderer.draw(game.player.rect.center)
@@ -0,0 +1,72 @@
+"""
+Rolling a player back with Snapshot and simulating forward again.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import pytest
+
+from autoplatformer import MainGame
+from Entities.Components.Components import PlayerComponent
+from Entities.Snapshot import Snapshot, SnapshotRing
+from Input.Buttons import Buttons, buttons_mask
+from Input.InputSource import ScriptedInput
+
+
+def test_rollback_restores_held_buttons():
+    game = MainGame()
+    game.main_headless(ScriptedInput([(20, [Buttons.MOVE_RIGHT, Buttons.JUMP])]))
+    player = game.player.components[PlayerComponent.id_class]
+    snapshot = Snapshot([game.player])
+    buffer = snapshot.save()
+    held = (player.buttons, player.pressed, player.released)
+
+    player.set_buttons(buttons_mask([Buttons.MOVE_LEFT]))
+    snapshot.restore(buffer)
+    assert (player.buttons, player.pressed, player.released) == held
+
+
+
+def script():
+    return ScriptedInput([(50, [Buttons.MOVE_RIGHT, Buttons.RUN]), (20, [Buttons.JUMP, Buttons.MOVE_RIGHT]),
+                          (40, [Buttons.MOVE_LEFT]), (10, [Buttons.SPIN]), (80, [Buttons.MOVE_LEFT, Buttons.RUN])])
+
+
+@pytest.mark.parametrize('batch_physics', [False, True])
+def test_rollback_resimulates_the_same_frames(batch_physics):
+    game = MainGame(batch_physics=batch_physics)
+    game.input_source = script()
+    game.set_up_map(headless=True)
+    game.spawn_player()
+    ring = SnapshotRing([game.player], 60)
+    trajectory = []
+    for frame in range(200):
+        ring.save(frame)
+        game.run_headless(1, MainGame.HEADLESS_DELTA)
+        trajectory.append((tuple(game.player.rect.topleft), tuple(game.player.velocity)))
+
+    # Roll back 50 frames and play the same input again
+    ring.restore(150)
+    ring.discard_after(150)
+    game.input_source = script()
+    for _ in range(150):
+        game.input_source.poll()
+    resimulated = []
+    for frame in range(150, 200):
+        game.run_headless(1, MainGame.HEADLESS_DELTA)
+        resimulated.append((tuple(game.player.rect.topleft), tuple(game.player.velocity)))
+    assert resimulated == trajectory[150:]
+    assert ring.latest() == 150
+
+
+def test_ring_forgets_frames_past_its_capacity():
+    game = MainGame()
+    game.main_headless(script(), frames=1)
+    ring = SnapshotRing([game.player], 10)
+    for frame in range(25):
+        ring.save(frame)
+    assert 14 not in ring and 15 in ring
+    with pytest.raises(KeyError):
+        ring.restore(14)
@@ -0,0 +1,73 @@
+"""
+SpatialHash broadphase queries against brute force checks.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import random
+
+import pygame
+
+from Map.SpatialHash import SpatialHash
+
+
+class Body(object):
+    """ Anything with a rect"""
+
+    def __init__(self, x, y, width, height):
+        self.rect = pygame.Rect(x, y, width, height)
+
+
+def test_insert_and_query():
+    spatial_hash = SpatialHash(32)
+    a = Body(10, 10, 20, 20)
+    b = Body(100, 10, 80, 20)
+    spatial_hash.insert(a)
+    spatial_hash.insert(b)
+    assert len(spatial_hash) == 2 and a in spatial_hash
+    assert spatial_hash.query_rect(pygame.Rect(0, 0, 40, 40)) == [a]
+    assert spatial_hash.query_rect(pygame.Rect(170, 25, 5, 5)) == [b]
+    # Shares cells with both but overlaps neither
+    assert spatial_hash.query_rect(pygame.Rect(35, 0, 60, 5)) == []
+
+
+def test_move_and_remove_leave_no_empty_cells():
+    spatial_hash = SpatialHash(32)
+    body = Body(10, 10, 20, 20)
+    spatial_hash.insert(body)
+    body.rect.topleft = (310, 310)
+    spatial_hash.move(body)
+    assert spatial_hash.query_rect(pygame.Rect(0, 0, 40, 40)) == []
+    assert spatial_hash.query_rect(pygame.Rect(325, 325, 1, 1)) == [body]
+    assert set(spatial_hash.cells) == {(9, 9), (10, 9), (9, 10), (10, 10)}
+    spatial_hash.remove(body)
+    assert not spatial_hash.cells and body not in spatial_hash
+    # Removing again does nothing
+    spatial_hash.remove(body)
+
+
+def test_query_radius():
+    spatial_hash = SpatialHash(32)
+    near = Body(40, 0, 10, 10)
+    corner = Body(35, 35, 10, 10)
+    spatial_hash.insert(near)
+    spatial_hash.insert(corner)
+    # The corner body's closest point is (35, 35), about 49.5 px away
+    assert spatial_hash.query_radius((0, 0), 45) == [near]
+    assert set(spatial_hash.query_radius((0, 0), 50)) == {near, corner}
+
+
+def test_overlapping_pairs_match_brute_force():
+    rng = random.Random(3)
+    bodies = [Body(rng.randrange(0, 400), rng.randrange(0, 400), rng.randrange(4, 90), rng.randrange(4, 90))
+              for _ in range(150)]
+    spatial_hash = SpatialHash(32)
+    for body in bodies:
+        spatial_hash.insert(body)
+    pairs = spatial_hash.overlapping_pairs()
+    found = [frozenset(pair) for pair in pairs]
+    expected = {frozenset((a, b)) for i, a in enumerate(bodies) for b in bodies[i + 1:] if a.rect.colliderect(b.rect)}
+    assert len(found) == len(set(found))
+    assert set(found) == expected
@@ -0,0 +1,97 @@
+"""
+Dense per-type component storage in Systems.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+from Entities.Components.BaseComponents import Component
+from Entities.Systems import Systems
+
+
+class Counter(Component):
+    """ Counts its updates, in a log shared by every Counter"""
+
+    __slots__ = ('updates',)
+
+    log = []
+
+    def __init__(self, owner):
+        super().__init__(owner)
+        self.updates = 0
+
+    def update(self, delta):
+        self.updates += 1
+        Counter.log.append(self)
+
+
+class Other(Counter):
+    __slots__ = ()
+
+
+def check_dense(systems):
+    """ Asserts every stored component knows its place in its type's list"""
+    for store in systems.components.values():
+        for index, component in enumerate(store):
+            assert component._store_index == index
+
+
+def test_components_have_no_instance_dict():
+    assert not hasattr(Counter(None), '__dict__')
+
+
+def test_remove_fills_the_gap_with_the_last_component():
+    systems = Systems()
+    counters = [Counter(None) for _ in range(5)]
+    for counter in counters:
+        systems.add(counter)
+    systems.remove(counters[1])
+    assert systems.of_type(Counter) == [counters[0], counters[4], counters[2], counters[3]]
+    assert counters[1]._store_index is None
+    check_dense(systems)
+    # Removing again, or removing the last one, keeps the list dense
+    systems.remove(counters[1])
+    systems.remove(counters[3])
+    assert systems.of_type(Counter) == [counters[0], counters[4], counters[2]]
+    check_dense(systems)
+
+
+def test_update_runs_each_type_in_the_order_first_seen():
+    systems = Systems()
+    first, second = Counter(None), Counter(None)
+    other = Other(None)
+    systems.add(first)
+    systems.add(other)
+    systems.add(second)
+    Counter.log.clear()
+    systems.update(1 / 60.)
+    assert Counter.log == [first, second, other]
+
+
+def test_components_removed_by_an_update_stop_being_updated():
+    systems = Systems()
+    counters = [Counter(None) for _ in range(3)]
+    for counter in counters:
+        systems.add(counter)
+
+    class Remover(Component):
+        __slots__ = ()
+
+        def update(self, delta):
+            systems.remove(counters[0])
+
+    systems.add(Remover(None))
+    systems.update(1 / 60.)
+    assert [counter.updates for counter in counters] == [1, 1, 1]
+    systems.update(1 / 60.)
+    assert [counter.updates for counter in counters] == [1, 2, 2]
+    check_dense(systems)
+
+
+def test_clear_forgets_every_component():
+    systems = Systems()
+    counter = Counter(None)
+    systems.add(counter)
+    systems.clear()
+    assert systems.of_type(Counter) == [] and counter._store_index is None
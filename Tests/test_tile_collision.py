@@ -0,0 +1,135 @@
+"""
+Tile sweeps: fast movement against solid tiles, one way semisolids and slopes.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+import pytest
+
+from Map.TileCollision import sweep_rect
+from Map.TileData import CollisionGrid, TileFlag
+
+
+TILE = 32
+FLOOR = 10
+WIDTH = 30
+
+
+def ramp_grid(rising_right=True, wall=False):
+    """
+    Returns: (CollisionGrid with a three step ramp up from the floor to a platform, x of the platform's
+    near edge, y of its top)
+    :param rising_right: whether the ramp rises to the right (SLOPE_RIGHT) or to the left
+    :param wall: whether a wall stands on the platform's near edge, above the ramp's top
+    """
+    grid = CollisionGrid(WIDTH, FLOOR + 2, TILE)
+    for x in range(WIDTH):
+        grid.set_flags(x, FLOOR, TileFlag.SOLID)
+    mirror = (lambda x: x) if rising_right else (lambda x: WIDTH - 1 - x)
+    slope = TileFlag.SLOPE_RIGHT if rising_right else TileFlag.SLOPE_LEFT
+    # Steps at columns 8 to 10, rows 9 to 7, solid under each, then the platform
+    for step in range(3):
+        grid.set_flags(mirror(8 + step), FLOOR - 1 - step, slope)
+        for y in range(FLOOR - step, FLOOR):
+            grid.set_flags(mirror(8 + step), y, TileFlag.SOLID)
+    for x in range(11, WIDTH):
+        for y in range(FLOOR - 3, FLOOR):
+            grid.set_flags(mirror(x), y, TileFlag.SOLID)
+    if wall:
+        for y in range(FLOOR - 6, FLOOR - 3):
+            grid.set_flags(mirror(11), y, TileFlag.SOLID)
+    edge = 11 * TILE if rising_right else (WIDTH - 11) * TILE
+    return grid, edge, (FLOOR - 3) * TILE
+
+
+def walk(grid, width, dx, dy, frames=250):
+    """ Returns: (feet x, feet y) of a 64 px tall body walking from the floor at the start of the ramp's side"""
+    height = 64
+    x = 1 * TILE if dx > 0 else (WIDTH - 1) * TILE - width
+    bottom = FLOOR * TILE
+    for _ in range(frames):
+        result = sweep_rect(grid, x, bottom - height, width, height, dx, dy)
+        x += result.dx
+        bottom += result.dy
+    return x + width / 2., bottom
+
+
+@pytest.mark.parametrize('rising_right', [True, False])
+@pytest.mark.parametrize('width', [16, 30, 32, 48, 64, 96])
+@pytest.mark.parametrize('dy', [0, 4])
+def test_bodies_walk_up_a_ramp_onto_a_platform(rising_right, width, dy):
+    grid, edge, platform_top = ramp_grid(rising_right)
+    dx = 3.3 if rising_right else -3.3
+    foot_x, bottom = walk(grid, width, dx, dy)
+    assert bottom == pytest.approx(platform_top)
+    assert foot_x > edge + TILE if rising_right else foot_x < edge - TILE
+
+
+@pytest.mark.parametrize('rising_right', [True, False])
+@pytest.mark.parametrize('width', [16, 64, 96])
+def test_wall_above_a_ramp_still_blocks(rising_right, width):
+    grid, edge, platform_top = ramp_grid(rising_right, wall=True)
+    dx = 3.3 if rising_right else -3.3
+    foot_x, bottom = walk(grid, width, dx, 4)
+    # Flush against the wall, feet still on the ramp below the platform's top
+    assert foot_x == pytest.approx(edge - width / 2. if rising_right else edge + width / 2.)
+    assert bottom > platform_top
+
+
+def open_grid(width=20, height=20):
+    """ Returns: CollisionGrid with a solid floor on its bottom row"""
+    grid = CollisionGrid(width, height, TILE)
+    for x in range(width):
+        grid.set_flags(x, height - 1, TileFlag.SOLID)
+    return grid
+
+
+def test_fast_fall_lands_on_the_floor():
+    grid = open_grid()
+    # Falls further than the whole grid in one sweep, and must not tunnel through the floor
+    result = sweep_rect(grid, 64, 0, 20, 30, 0, 2000)
+    assert result.dy == pytest.approx(19 * TILE - 30)
+    assert result.normal == (0, -1)
+    assert 0 < result.time < 1
+
+
+def test_wall_stops_only_the_x_movement():
+    grid = open_grid()
+    for y in range(grid.height):
+        grid.set_flags(8, y, TileFlag.SOLID)
+    result = sweep_rect(grid, 100, 64, 20, 30, 200, 12)
+    assert result.dx == pytest.approx(8 * TILE - 120)
+    assert result.dy == pytest.approx(12)
+    assert result.normal == (-1, 0)
+
+
+def test_semisolids_are_one_way():
+    grid = open_grid()
+    for x in range(4, 10):
+        grid.set_flags(x, 10, TileFlag.SEMISOLID)
+    # Lands on the top when falling
+    result = sweep_rect(grid, 160, 10 * TILE - 70, 20, 30, 0, 100)
+    assert result.dy == pytest.approx(40)
+    assert result.normal == (0, -1)
+    # Passes through when jumping up from below, and when walking through it
+    result = sweep_rect(grid, 160, 11 * TILE + 4, 20, 30, 0, -100)
+    assert (result.dy, result.normal) == (-100, (0, 0))
+    result = sweep_rect(grid, 64, 10 * TILE - 10, 20, 30, 200, 0)
+    assert (result.dx, result.normal) == (200, (0, 0))
+
+
+@pytest.mark.parametrize('slope', [TileFlag.SLOPE_LEFT, TileFlag.SLOPE_RIGHT])
+def test_falling_onto_a_slope_lands_on_its_surface(slope):
+    grid = open_grid()
+    grid.set_flags(5, 18, slope)
+    grid.set_flags(5, 19, TileFlag.SOLID)
+    left, width = 5 * TILE + 2, 16
+    foot_x = left + width / 2.
+    # Feet start close enough for the sweep to look for slopes (see CollisionGrid.near_slope)
+    top = 18 * TILE - 20 - 30
+    result = sweep_rect(grid, left, top, width, 30, 0, 100)
+    surface = 18 * TILE + grid.profiles.surface(slope, int(foot_x) - 5 * TILE)
+    assert top + 30 + result.dy == pytest.approx(surface)
+    assert result.normal == (0, -1)
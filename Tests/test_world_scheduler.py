@@ -0,0 +1,36 @@
+"""
+Worlds stepped in worker processes over shared tiles.
+
+Run from the repository root:
+    python -m pytest Tests
+"""
+
+
+from autoplatformer import MainGame
+from Input.Buttons import Buttons
+from Input.InputSource import ScriptedInput
+from Tools.WorldScheduler import WorldScheduler
+
+
+def script():
+    return ScriptedInput([(40, [Buttons.MOVE_RIGHT, Buttons.RUN]), (15, [Buttons.JUMP]), (30, [Buttons.MOVE_LEFT])])
+
+
+def test_workers_start_once_a_map_is_shared():
+    with WorldScheduler(2) as scheduler:
+        assert not scheduler.workers
+        scheduler.add_world(script())
+        assert len(scheduler.workers) == 2 and scheduler.layers
+
+
+def test_worlds_play_like_a_single_game():
+    game = MainGame()
+    frames = game.main_headless(script())
+    with WorldScheduler(2) as scheduler:
+        for _ in range(3):
+            scheduler.add_world(script())
+        statuses = scheduler.run()
+    for status in statuses:
+        assert status.done
+        assert status.frames == frames
+        assert status.position == tuple(game.player.rect.topleft)
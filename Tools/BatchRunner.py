@@ -0,0 +1,181 @@
+"""
+Runs many headless playthroughs in parallel, one per job, and collects their outcomes in one table.
+
+Run from the repository root:
+    python -m Tools.BatchRunner jobs.json [--workers N] [--output results.csv]
+
+jobs.json is a list of jobs, each a dict with:
+    name    - label for the result row (defaults to the job's index)
+    map     - path of the .tmx to play (defaults to constants.TEST_MAP)
+    script  - input as a list of [frames, [button names]] steps, e.g. [[60, ["MOVE_RIGHT", "RUN"]]]
+    frames  - most frames to simulate (defaults to the length of the script)
+    delta   - fixed time step in seconds (defaults to MainGame.HEADLESS_DELTA)
+    params  - physics constants to override, as {"Class.NAME": value}, e.g.
+              {"PlayerComponent.JUMP_POWER": -350, "GravityComponent.GRAVITY": 400}
+    goal    - [x, y, width, height] pixel rect to reach. Defaults to the map's goal tiles
+
+Every map is compiled into the map cache before the workers start, so workers memory map the same
+compiled file instead of each parsing the TMX.
+"""
+
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from time import perf_counter
+
+import pygame
+
+import constants
+from autoplatformer import MainGame
+from Input.Buttons import Buttons
+from Input.InputSource import ScriptedInput
+from Resources.Assets import Assets
+from Map.GameMap import MapInfo
+
+
+# Columns of the result table, before the job's params
+COLUMNS = ['name', 'map', 'reached_goal', 'time', 'frames', 'x', 'y', 'wall_seconds', 'error']
+
+
+def parse_script(script):
+    """ Returns: ScriptedInput for a job's [[frames, [button names]], ...] script"""
+    return ScriptedInput([(frames, [Buttons[name] for name in buttons]) for frames, buttons in script])
+
+
+def apply_params(player, params):
+    """
+    Overrides physics constants on a spawned player and its components
+    :param params: dict of "Class.NAME" -> value. Class is Player/Entity or a component class name
+    """
+    components = {type(component).__name__: component for component in player.components.values()}
+    for key, value in params.items():
+        class_name, _, attribute = key.partition('.')
+        if class_name in ('Player', 'Entity'):
+            target = player
+        elif class_name in components:
+            target = components[class_name]
+        else:
+            raise KeyError('No ' + class_name + ' on the player for parameter ' + key)
+        if not hasattr(target, attribute):
+            raise AttributeError(class_name + ' has no ' + attribute)
+        setattr(target, attribute, value)
+
+
+def goal_rects(job, world):
+    """
+    Returns: list of pygame.Rect the player has to touch to finish the level
+    :param world: GameMap the job is played in
+    """
+    if job.get('goal'):
+        return [pygame.Rect(job['goal'])]
+    tile_width = world.map_data.tilewidth
+    tile_height = world.map_data.tileheight
+    return [pygame.Rect(x * tile_width, y * tile_height, tile_width, tile_height)
+            for x, y in world.find_tiles(MapInfo.GOAL)]
+
+
+def run_job(indexed_job):
+    """
+    Plays one job in this process
+    :param indexed_job: (index, job dict)
+    Returns: (index, result row dict)
+    """
+    index, job = indexed_job
+    map_path = job.get('map', constants.TEST_MAP)
+    delta = job.get('delta', MainGame.HEADLESS_DELTA)
+    row = {'name': job.get('name', index), 'map': map_path, 'reached_goal': False, 'time': 0., 'frames': 0,
+           'x': None, 'y': None, 'wall_seconds': 0., 'error': ''}
+    row.update(job.get('params', {}))
+
+    start = perf_counter()
+    try:
+        script = job.get('script', [])
+        frames = job.get('frames', sum(step[0] for step in script))
+        game = MainGame()
+        game.input_source = parse_script(script)
+        game.set_up_map(map_path, headless=True)
+        game.spawn_player()
+        if game.player is None:
+            raise ValueError('Map has no spawn tile')
+        apply_params(game.player, job.get('params', {}))
+
+        goals = goal_rects(job, game.world)
+        player_rect = game.player.rect
+        reached = lambda: player_rect.collidelist(goals) != -1
+        row['frames'] = game.run_headless(frames, delta, until=reached if goals else None)
+        row['reached_goal'] = bool(goals) and reached()
+        row['time'] = row['frames'] * delta
+        row['x'], row['y'] = game.player.rect.topleft
+    except Exception as e:
+        row['error'] = type(e).__name__ + ': ' + str(e)
+    row['wall_seconds'] = perf_counter() - start
+    return index, row
+
+
+def run_batch(jobs, workers=None):
+    """
+    Plays every job on a process pool
+    :param jobs: list of job dicts (see module docs)
+    :param workers: number of processes. Defaults to the number of CPUs
+    Returns: list of result rows, in the order of jobs
+    """
+    # Compile each map once up front (in parallel); workers then share the cache file through the page cache
+    maps = [Assets.load_map_async(map_path) for map_path in set(job.get('map', constants.TEST_MAP) for job in jobs)]
+    for future in maps:
+        future.result()
+    Assets.shutdown()
+
+    results = [None] * len(jobs)
+    with multiprocessing.Pool(workers) as pool:
+        for index, row in pool.imap_unordered(run_job, list(enumerate(jobs))):
+            results[index] = row
+    return results
+
+
+def write_table(rows, path):
+    """ Writes result rows as CSV, or as JSON if path ends with .json"""
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=1)
+        return
+    columns = list(COLUMNS)
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run headless playthroughs in parallel')
+    parser.add_argument('jobs', help='JSON file with a list of jobs')
+    parser.add_argument('--workers', type=int, help='number of processes (defaults to the number of CPUs)')
+    parser.add_argument('--output', help='write the result table here (.csv or .json)')
+    args = parser.parse_args(argv)
+
+    with open(args.jobs) as f:
+        jobs = json.load(f)
+    # Paths in constants (and jobs) are relative to the repository root
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    start = perf_counter()
+    rows = run_batch(jobs, args.workers)
+    elapsed = perf_counter() - start
+
+    for row in rows:
+        print('%-20s goal=%-5s time=%7.2fs frames=%6d pos=(%s, %s) %s' % (
+            row['name'], row['reached_goal'], row['time'], row['frames'], row['x'], row['y'], row['error']))
+    simulated = sum(row['time'] for row in rows)
+    print('%d jobs, %.1f simulated seconds in %.2f s' % (len(rows), simulated, elapsed))
+    if args.output:
+        write_table(rows, args.output)
+    return 1 if any(row['error'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
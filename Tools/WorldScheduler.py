@@ -0,0 +1,270 @@
+"""
+Steps many independent worlds (level instances) in parallel across cores.
+
+Each worker process owns a share of the worlds, one MainGame (and so one GameMap) per world, and
+steps all of them whenever the scheduler steps. Worlds never share entities or systems, so which
+worker a world lands on doesn't change how it plays. The main layer's tiles of every map are put in
+shared memory once (see SharedTiles) and every world on that map reads them read-only.
+
+Run from the repository root for a throughput check:
+    python -m Tools.WorldScheduler [--worlds N] [--workers N] [--frames N] [--map PATH]
+"""
+
+
+import argparse
+import gc
+import multiprocessing
+import sys
+import traceback
+from time import perf_counter
+
+import constants
+from autoplatformer import MainGame
+from Input.Buttons import Buttons
+from Input.InputSource import ScriptedInput
+from Map.GameMap import GameMap
+from Map.SharedTiles import SharedTileLayer
+
+
+class WorldStatus(object):
+    """ Where a world is after a step"""
+
+    __slots__ = ('frames', 'position', 'done')
+
+    def __init__(self, frames, position, done):
+        """
+        :param frames: frames the world has simulated since it was added
+        :param position: (x, y) top left of player one, or None if the map has no spawn
+        :param done: whether the world's input source has run out
+        """
+        self.frames = frames
+        self.position = position
+        self.done = done
+
+    def __repr__(self):
+        return '<WorldStatus(frames=' + str(self.frames) + ', position=' + str(self.position) + ', done=' + str(self.done) + ')>'
+
+
+def _worker(connection):
+    """
+    Process loop of a worker. Answers every message with (True, result) or (False, traceback)
+    :param connection: end of a multiprocessing Pipe to the scheduler
+    """
+    # Shared memory name -> SharedTileLayer, and world id -> (MainGame, frames simulated)
+    layers = {}
+    games = {}
+    while True:
+        message = connection.recv()
+        if message[0] == 'close':
+            break
+        try:
+            connection.send((True, _handle(message, layers, games)))
+        except Exception:
+            connection.send((False, traceback.format_exc()))
+    # Entities and their components reference each other, so the worlds' views of the shared tiles
+    # are only let go of by the cycle collector
+    games.clear()
+    gc.collect()
+    for layer in layers.values():
+        layer.close()
+    connection.close()
+
+
+def _handle(message, layers, games):
+    """
+    Carries out a message to a worker
+    :param layers: the worker's SharedTileLayer by shared memory name
+    :param games: the worker's (MainGame, frames simulated) by world id
+    Returns: the answer to send back
+    """
+    command = message[0]
+    if command == 'add':
+        _, world_id, map_path, spec, input_source, game_options = message
+        layer = layers.get(spec[0])
+        if layer is None:
+            layer = layers[spec[0]] = SharedTileLayer.attach(spec)
+        game = MainGame(**game_options)
+        game.input_source = input_source
+        game.set_up_map(map_path, headless=True, collision_grid=layer.grid())
+        game.spawn_player()
+        games[world_id] = (game, 0)
+        return None
+    if command == 'step':
+        _, frames, delta = message
+        statuses = {}
+        for world_id, (game, simulated) in games.items():
+            if game.player is not None:
+                simulated += game.run_headless(frames, delta)
+                games[world_id] = (game, simulated)
+            statuses[world_id] = _status(game, simulated)
+        return statuses
+    raise ValueError('Unknown command ' + str(command))
+
+
+def _status(game, frames):
+    """ Returns: WorldStatus of a worker's game"""
+    player = game.player
+    return WorldStatus(frames, tuple(player.rect.topleft) if player is not None else None, game.input_source.done)
+
+
+class WorldScheduler(object):
+    """ Process pool stepping worlds in parallel. Use as a context manager, or call close()"""
+
+    def __init__(self, workers=None):
+        """
+        :param workers: number of worker processes. Defaults to the number of CPUs. They're started when
+        the first world is added
+        """
+        self.worker_count = workers or multiprocessing.cpu_count()
+        # (process, connection) of each worker, once started
+        self.workers = []
+        # Shared tile layer of each map path
+        self.layers = {}
+        # World id -> worker index
+        self.world_workers = []
+        # Messages sent to each worker that haven't been answered yet
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.world_workers)
+
+    def share_map(self, map_path):
+        """
+        Puts a map's main layer in shared memory for the workers (done by add_world when needed)
+        Returns: SharedTileLayer
+        """
+        layer = self.layers.get(map_path)
+        if layer is None:
+            # Also compiles the map's cache, so workers memory map it instead of parsing the TMX
+            world = GameMap(map_path, headless=True)
+            layer = self.layers[map_path] = SharedTileLayer.create(world.collision_grid)
+            world.close()
+        return layer
+
+    def add_world(self, input_source, map_path=constants.TEST_MAP, game_options=None):
+        """
+        Loads a new world on the next worker in turn, with player one spawned. Loading happens in the
+        background; errors are raised by the next step
+        :param input_source: picklable input source for player one (e.g. ScriptedInput, InputReplayer)
+        :param map_path: path of the .tmx file the world plays
+        :param game_options: dict of MainGame keyword arguments (e.g. batch_physics, active_margin).
+        Worlds can't be streamed: they use the shared tiles
+        Returns: id of the world (its index in the scheduler)
+        """
+        world_id = len(self.world_workers)
+        worker = world_id % self.worker_count
+        spec = self.share_map(map_path).spec
+        if not self.workers:
+            self._start_workers()
+        self._send(worker, ('add', world_id, map_path, spec, input_source, game_options or {}))
+        self.world_workers.append(worker)
+        return world_id
+
+    def step(self, frames=1, delta=MainGame.HEADLESS_DELTA):
+        """
+        Simulates every world, all workers at once
+        :param frames: frames each world simulates. If None, each runs until its input source is done
+        :param delta: fixed change in time for each frame, in seconds
+        Returns: list of WorldStatus, by world id
+        """
+        for worker in range(len(self.workers)):
+            self._send(worker, ('step', frames, delta))
+        statuses = [None] * len(self.world_workers)
+        for worker in range(len(self.workers)):
+            for world_id, status in self._receive(worker).items():
+                statuses[world_id] = status
+        return statuses
+
+    def run(self, delta=MainGame.HEADLESS_DELTA):
+        """
+        Simulates every world until its input source is done
+        Returns: list of WorldStatus, by world id
+        """
+        return self.step(None, delta)
+
+    def close(self):
+        """ Stops the workers and frees the shared tiles"""
+        for process, connection in self.workers:
+            if process.is_alive():
+                connection.send(('close',))
+            process.join()
+            connection.close()
+        self.workers = []
+        self._pending = []
+        for layer in self.layers.values():
+            layer.close()
+        self.layers = {}
+
+    def _start_workers(self):
+        """
+        Starts the worker processes. Called once a map is shared: creating the shared memory starts this
+        process's resource tracker, which workers then inherit instead of each starting their own (that
+        would "clean up" the blocks again when the worker exits)
+        """
+        for _ in range(self.worker_count):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self.workers.append((process, connection))
+            self._pending.append(0)
+
+    def _send(self, worker, message):
+        """ Sends a message to a worker, to be answered in order"""
+        self.workers[worker][1].send(message)
+        self._pending[worker] += 1
+
+    def _receive(self, worker):
+        """
+        Waits for every answer a worker owes
+        Returns: result of the last message
+        """
+        connection = self.workers[worker][1]
+        result = None
+        while self._pending[worker]:
+            self._pending[worker] -= 1
+            ok, result = connection.recv()
+            if not ok:
+                # Drop the answers still owed, so the scheduler can be closed
+                while self._pending[worker]:
+                    self._pending[worker] -= 1
+                    connection.recv()
+                raise RuntimeError('World worker ' + str(worker) + ' failed:\n' + result)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Step many worlds in parallel and report the throughput')
+    parser.add_argument('--worlds', type=int, default=16, help='number of worlds')
+    parser.add_argument('--workers', type=int, help='number of processes (defaults to the number of CPUs)')
+    parser.add_argument('--frames', type=int, default=600, help='frames each world simulates')
+    parser.add_argument('--map', default=constants.TEST_MAP, help='path of the .tmx every world plays')
+    args = parser.parse_args(argv)
+
+    # Each world runs right for a different time before heading back left
+    scripts = [ScriptedInput([(30 + 10 * i, [Buttons.MOVE_RIGHT, Buttons.RUN]), (20, [Buttons.JUMP]),
+                              (args.frames, [Buttons.MOVE_LEFT])]) for i in range(args.worlds)]
+    with WorldScheduler(args.workers) as scheduler:
+        for script in scripts:
+            scheduler.add_world(script, args.map)
+        # Finish loading before timing
+        scheduler.step(0)
+        start = perf_counter()
+        statuses = scheduler.step(args.frames)
+        elapsed = perf_counter() - start
+        workers = scheduler.worker_count
+    for world_id, status in enumerate(statuses):
+        print('world %3d frames=%6d pos=%s' % (world_id, status.frames, status.position))
+    print('%d worlds on %d workers: %d frames in %.2f s (%.0f frames/s)' % (
+        len(statuses), workers, args.frames * len(statuses), elapsed, args.frames * len(statuses) / elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
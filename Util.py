@@ -2,3 +2,7 @@
 Module containing helpful functions used throughout
 """
 
+
+def clamp(value, min_value, max_value):
+    """ Returns: value limited to the range [min_value, max_value]"""
+    return max(min_value, min(value, max_value))
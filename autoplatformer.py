@@ -1,4 +1,6 @@
 
+import argparse
+import logging
 import sys
 
 import pygame
@@ -8,24 +10,105 @@ from pytmx.util_pygame import load_pygame
 
 import constants
 from Entities.Player import Player
+from Entities.Physics import BatchPhysics
+from Entities.ActiveRegion import ActiveRegion
+from Debug.Profiler import Profiler
+from Render.RenderPipeline import RenderPipeline
+from Debug.Log import Log, set_level as set_log_level
 from Entities.Components.Components import PlayerComponent, GravityComponent, CollisionComponent
 from Map.GameMap import *
+from Input.Buttons import Bindings, PLAYER_KEYS
+from Input.InputSource import KeyboardInput, ScriptedInput
+from Input.InputLog import InputRecorder, InputReplayer
+from Resources.Assets import Assets
 import Util
 
 from pygame.math import Vector2
 
 
+_log = Log('game')
+
+
 class MainGame(object):
     # Game Constants
     # SCREENRECT = Rect(0, 0, 1200, 720)
     SCREENRECT = Rect(0, 0, 800, 480)
+    # Fixed step used when simulating without a display
+    HEADLESS_DELTA = 1 / 60.
+    # Physics steps per second when playing
+    PHYSICS_RATE = 120
+    # Most physics steps run for one drawn frame, and the longest frame time counted. Past these the
+    # game slows down instead of spending ever longer frames catching up
+    MAX_STEPS_PER_FRAME = 8
+    MAX_FRAME_TIME = 0.25
+    # Zoom change per key press, and the smallest zoom
+    ZOOM_STEP = 0.25
+    MIN_ZOOM = 0.24
+    # Zoom levels rendered ahead while the map loads, so zooming to them doesn't stall
+    WARM_ZOOMS = (0.75, 1.25, 0.5, 1.5)
+
+    def __init__(self, batch_physics=False, profiler=None, profile_path=None, dirty_rects=True,
+                 record_path=None, replay=None, replay_speed=1., streamed=False, active_margin=None,
+                 physics_rate=PHYSICS_RATE, players=1, bind=None, collision_mesh=False):
+        """
+        :param batch_physics: if True, entities are integrated together by a BatchPhysics stage
+        :param dirty_rects: if True, only changed parts of the window are redrawn while the camera is still
+        :param profiler: Profiler to record frame timings into. None to not profile
+        :param profile_path: where the profiler is dumped (F4, or on exit). .json for JSON, CSV otherwise
+        :param record_path: if set, keyboard input is recorded and written here as an input log on exit
+        :param replay: InputReplayer to take input from instead of the keyboard
+        :param replay_speed: how many times faster than real time a replay plays. 0 for as fast as possible
+        :param streamed: if True, the map is loaded in chunks around the camera and entities (see ChunkedMap)
+        :param active_margin: if set, entities further than this many pixels outside the camera's view, or
+        resting on the ground, sleep instead of being updated (see ActiveRegion)
+        :param physics_rate: physics steps per second while playing (a replay uses the rate it was recorded at)
+        :param players: number of local players, each on their own keys (see Buttons.PLAYER_KEYS)
+        :param bind: dict of button name -> key name remapping player one's keys, e.g. {'JUMP': 'k'}
+        :param collision_mesh: if True, entities collide with the map's tiles merged into rectangles (see CollisionMesh)
+        """
+        self.batch_physics = batch_physics
+        # GameMap of the level being played, and the BatchPhysics stepping its entities (see set_up_map)
+        self.world = None
+        self.physics = None
+        self.profiler = profiler
+        self.profile_path = profile_path
+        self.show_profiler = False
+        self.dirty_rects = dirty_rects
+        self.record_path = record_path
+        self.replay = replay
+        self.replay_speed = replay_speed
+        self.streamed = streamed
+        self.collision_mesh = collision_mesh
+        self.active_margin = active_margin
+        self.active_region = None
+        self.player_count = players
+        self.bind = bind or {}
+        # (Player, input source) of every local player. Player one's source is None: it's self.input_source
+        self.players = []
+        # Physics always steps by a fixed time, so runs play (and replay) the same at any frame rate
+        self.step = replay.delta if replay else 1. / physics_rate
+        # (entity, x, y) before the last physics step, to draw entities between steps
+        self._previous = []
+        Profiler.active = profiler
 
     # Game Variables 
-    def main(self):
+    def main(self, map_path=constants.TEST_MAP):
+        # Decode assets on worker threads while pygame and the window start up
+        Assets.load_map_async(map_path)
+        Assets.load_image_async(constants.DEBUG_IMG)
         self.init_pygame()
         self.set_up_display()
-        self.set_up_map()
+        self.show_loading()
+        self.set_up_map(map_path)
         self.spawn_player()
+        if self.replay:
+            self.input_source = self.replay
+        elif self.record_path:
+            self.input_source = InputRecorder(KeyboardInput(Bindings().remapped(self.bind)), self.step)
+        else:
+            self.input_source = KeyboardInput(Bindings().remapped(self.bind))
+        for keys in PLAYER_KEYS[1:self.player_count]:
+            self.add_player(KeyboardInput(Bindings(keys)))
 
         self.running = True
 
@@ -35,6 +118,20 @@ class MainGame(object):
             self.running = False
             print('done')
             pygame.exit()
+
+    def main_headless(self, input_source, frames=None, delta=HEADLESS_DELTA, map_path=constants.TEST_MAP):
+        """
+        Simulates the game without a display, as fast as possible
+        :param input_source: polled once per frame for the player's buttons (e.g. ScriptedInput)
+        :param frames: number of frames to simulate. If None, runs until input_source is done
+        :param delta: fixed change in time for each frame, in seconds
+        :param map_path: path of the .tmx file to play
+        Returns: number of frames simulated
+        """
+        self.input_source = input_source
+        self.set_up_map(map_path, headless=True)
+        self.spawn_player()
+        return self.run_headless(frames, delta)
         
     def init_pygame(self):
         """
@@ -56,16 +153,46 @@ class MainGame(object):
         # TODO change this cuz prolly dont want this
         winstyle = 1
         self.screen = pygame.display.set_mode(screen_size.size, pygame.RESIZABLE)
-        self.temp_surface = pygame.Surface((screen_size.width / 2, screen_size.height / 2)).convert()
-        GameMap.temp_surface = self.temp_surface
 
-    def set_up_map(self):
+    def show_loading(self):
+        """ Draws a progress bar until every asset being loaded is ready"""
+        width, height = self.screen.get_size()
+        bar = Rect(0, 0, width // 2, 16)
+        bar.center = (width // 2, height // 2)
+        # Redraws at most every 1/30 s, and stops as soon as the last asset is in
+        while not Assets.wait(1 / 30.):
+            pygame.event.pump()
+            done, total = Assets.progress()
+            filled = bar.inflate(-4, -4)
+            filled.width = filled.width * done // max(1, total)
+            self.screen.fill((0, 0, 0))
+            pygame.draw.rect(self.screen, (255, 255, 255), bar, 1)
+            pygame.draw.rect(self.screen, (255, 255, 255), filled)
+            pygame.display.flip()
+        Assets.reset_progress()
+
+    def set_up_map(self, map_path=constants.TEST_MAP, headless=False, collision_grid=None):
         """
-        Sets up the map and the scrolling
+        Loads the map as a new world, replacing any previous level, and sets up the scrolling
+        :param map_path: path of the .tmx file to load
+        :param headless: if True, skips tile images and scrolling (no display needed)
+        :param collision_grid: CollisionGrid to use instead of the map's own (see GameMap)
         """
-        GameMap.set_up_map()
-
-        pyscroll_map_data = pyscroll.data.TiledMapData(GameMap.map_data)
+        if self.world is not None:
+            self.world.close()
+        # Entities of any previous level are gone with its world
+        self.world = GameMap(map_path, headless=headless, streamed=self.streamed, collision_mesh=self.collision_mesh,
+                             collision_grid=collision_grid)
+        self.physics = BatchPhysics(self.world) if self.batch_physics else None
+        if self.active_margin is not None:
+            self.active_region = ActiveRegion(self.world, self.active_margin, self.physics)
+
+        if headless:
+            self.map_layer = None
+            self.group = pygame.sprite.Group()
+            return
+
+        pyscroll_map_data = self.world.scroll_data()
         # Scrolling Layer
         w, h = self.screen.get_size()
         self.map_layer = pyscroll.orthographic.BufferedRenderer(pyscroll_map_data, (w / 2, h / 2), clamp_camera=True)
@@ -74,61 +201,128 @@ class MainGame(object):
 
         self.map_layer.zoom = 1.0 
 
+        # Draws at half the starting window size, scaled up by a whole number
+        base_size = (self.SCREENRECT.width // 2, self.SCREENRECT.height // 2)
+        self.renderer = RenderPipeline(self.screen, self.map_layer, self.group, base_size,
+                                       dirty_rects=self.dirty_rects, profiler=self.profiler)
+        self.temp_surface = self.renderer.surface
+        self.renderer.zoom_cache.warm(self.WARM_ZOOMS)
+
     def spawn_player(self):
         """ Spawns player onto the map """
         # Add Sprites to group
 
-        # Place player where spawn tile is, searching from bottom left first
-        self.player = None
-        spawned_player = False 
-
-        for i in range(0, GameMap.map_data.width):
-            for j in range(GameMap.map_data.height - 1, -1, -1):
-                tile_property = GameMap.get_tile_properties(i, j)
-
-                if tile_property and tile_property.get(MapInfo.SPAWN.value):
-                    spawned_player = True
-                    print('in: ' + str((i, j)))
-                    spawn_point_x = i * GameMap.map_data.tilewidth + (GameMap.map_data.tilewidth / 2)
-                    spawn_point_y = j * GameMap.map_data.tileheight
-                    print('spawn: ' + str((spawn_point_x, spawn_point_y)))
-                    self.player = Player(position=(spawn_point_x, spawn_point_y))
-                    print('body: ' + str(self.player.rect))
+        self.player = self.new_player()
+        self.players = [(self.player, None)]
+        self.add_entity(self.player)
 
-                if spawned_player: break
-            if spawned_player: break
-
-        self.group.add(self.player)
+    def add_player(self, input_source):
+        """
+        Spawns another local player onto the map
+        :param input_source: input source the player is controlled by
+        Returns: the Player
+        """
+        player = self.new_player()
+        self.players.append((player, input_source))
+        self.add_entity(player)
+        return player
+
+    def new_player(self):
+        """ Returns: Player at the map's spawn tile, or None if it has none"""
+        # Place player where spawn tile is, searching from bottom left first (found when the map was loaded)
+        spawn_tile = self.world.tile_index.first(MapInfo.SPAWN)
+        if not spawn_tile:
+            return None
+        i, j = spawn_tile
+        map_data = self.world.map_data
+        spawn_point_x = i * map_data.tilewidth + (map_data.tilewidth / 2)
+        spawn_point_y = j * map_data.tileheight
+        player = Player(self.world, position=(spawn_point_x, spawn_point_y))
+        _log.info('player_spawned', tile=(i, j), spawn=(spawn_point_x, spawn_point_y), body=player.rect)
+        return player
+
+    def add_entity(self, entity):
+        """ Adds an entity to the game (drawing, physics and the active region)"""
+        self.group.add(entity)
+        if self.physics:
+            self.physics.add(entity)
+        if self.active_region:
+            self.active_region.add(entity)
+
+    def input_sources(self):
+        """ Returns: list of the players' input sources"""
+        return [source or self.input_source for _, source in self.players]
+
+    def poll_input(self):
+        """
+        Reads each player's input source once (one physics step's worth) and gives it to the player
+        """
+        input_source = self.input_source
+        for player, source in self.players:
+            player.components[PlayerComponent.id_class].set_buttons((source or input_source).poll())
 
-    def handle_events(self):
+    def handle_events(self, poll_input=True):
         """
         Handle events that control the player
+        :param poll_input: whether to also poll the input sources. Otherwise they're polled per physics step
         """
         # pygame.event.get() 
 
         poll = pygame.event.poll
+        sources = self.input_sources()
 
         event = poll()
-        keys = pygame.key.get_pressed()
-        self.player.components[PlayerComponent.id_class].buttons = keys
         while event:
-            if event.type == KEYDOWN:
+            for source in sources:
+                source.handle_event(event)
+            if event.type == VIDEORESIZE:
+                self.renderer.resize(event.size)
+                self.screen = self.renderer.screen
+                self.temp_surface = self.renderer.surface
+            elif event.type == KEYDOWN:
                 # Zoom
                 if event.key == K_EQUALS:
-                    self.map_layer.zoom = Util.clamp(self.map_layer.zoom + 0.25, 0.24, 999)
+                    self.set_zoom(self.map_layer.zoom + self.ZOOM_STEP)
                     print('zoom~')
                 elif event.key == K_MINUS:
-                    self.map_layer.zoom = Util.clamp(self.map_layer.zoom - 0.25, 0.24, 999)
+                    self.set_zoom(self.map_layer.zoom - self.ZOOM_STEP)
                     print('woom.')
                     # Movement
 
+                # Profiling
+                if event.key == K_F3 and self.profiler:
+                    self.show_profiler = not self.show_profiler
+                elif event.key == K_F4 and self.profiler and self.profile_path:
+                    self.profiler.dump(self.profile_path)
+                    print('Wrote profile to ' + self.profile_path)
+
                 if event.key == K_1: # All images 
                     for layer in map_data.layers:
                         for x, y, img in layer.tiles():
                             print('(' + str(x) + ', ' + str(y) + ') ' + str(img))
 
+                # DEBUG
+                if event.key == K_0:
+                    self.player.velocity = Vector2(0, 0)
+                    self.player.acceleration = Vector2(0, 0)
+                    print('zeroing velocity: ' + str(self.player.velocity))
+                elif event.key == K_8:
+                    print('Moving to top left')
+                    self.player.rect.topleft = (0, 0)
+                elif event.key == K_9:
+                    print('Rectangle Info')
+                    print(self.player.rect.size)
+                    print(self.player.rect.center)
+                    print(self.player.rect.topleft)
+                    print('Movement Info')
+                    print('Veloc: ' + str(self.player.velocity))
+                    print('Accel: ' + str(self.player.acceleration))
+
             event = poll()
 
+        if poll_input:
+            self.poll_input()
+
         # Update Player
         # DEBUG
         # if keys[K_w]:
@@ -147,68 +341,185 @@ class MainGame(object):
         #     self.player.velocity.x += 10
         #     # self.player.velocity.move_ip((10, 0))
         #     print(self.player.velocity)
-        if keys[K_0]:
-            self.player.velocity = Vector2(0, 0)
-            self.player.acceleration = Vector2(0, 0)
-            print('zeroing velocity: ' + str(self.player.velocity))
-        if keys[K_8]:
-            print('Moving to top left')
-            self.player.rect.topleft = (0, 0)
-        if keys[K_9]:
-            print('Rectangle Info')
-            print(self.player.rect.size)
-            print(self.player.rect.center)
-            print(self.player.rect.topleft)
-            print('Movement Info')
-            print('Veloc: ' + str(self.player.velocity))
-            print('Accel: ' + str(self.player.acceleration))
+
+    def set_zoom(self, zoom):
+        """ Zooms the camera, queueing renderers for the next zoom levels to be built while the camera is still"""
+        zoom = Util.clamp(zoom, self.MIN_ZOOM, 999)
+        self.renderer.set_zoom(zoom, prefetch=(zoom - self.ZOOM_STEP, zoom + self.ZOOM_STEP))
+        self.map_layer = self.renderer.map_layer
+        self.group = self.renderer.group
 
     def update_all(self, delta):
         """
         Update all game elements with the change in time from last render loop 
         """
-        self.group.update(delta)
-
+        entities = self.group
+        if self.active_region:
+            self.active_region.update(self.camera_view(), keep_awake=[player for player, _ in self.players])
+            entities = self.active_region.awake
+        if self.streamed:
+            self.stream_map(entities)
+        if self.physics:
+            self.physics.step(delta)
+        else:
+            for entity in entities:
+                entity.move(delta)
+            self.world.systems.update(delta)
+
+    def camera_view(self):
+        """ Returns: pixel rect the camera sees (around the player when there is no display)"""
+        if self.map_layer:
+            return self.map_layer.view_rect.copy()
+        view = Rect(0, 0, self.SCREENRECT.width // 2, self.SCREENRECT.height // 2)
+        view.center = self.player.rect.center
+        return view
+
+    def stream_map(self, entities):
+        """
+        Keeps the map loaded around the camera and entities, redrawing tiles that stream in
+        :param entities: entities being simulated
+        """
+        rects = [entity.rect for entity in entities]
+        if self.map_layer:
+            rects.append(self.map_layer.view_rect)
+        loaded = self.world.stream(rects)
+        if loaded and self.map_layer:
+            # Only chunks in view were drawn as empty
+            view = self.map_layer.view_rect
+            map_data = self.world.map_data
+            tile_width = map_data.tilewidth
+            tile_height = map_data.tileheight
+            for key in loaded:
+                x, y, width, height = map_data.chunk_rect(key)
+                if view.colliderect((x * tile_width, y * tile_height, width * tile_width, height * tile_height)):
+                    self.renderer.redraw_tiles()
+                    break
+
+    def run_headless(self, frames, delta, until=None):
+        """
+        Simulation loop without events, drawing or frame limiting
+        :param frames: number of frames to simulate. If None, runs until the input source is done
+        :param delta: fixed change in time for each frame, in seconds
+        :param until: function called after each frame. The loop stops early once it returns True
+        Returns: number of frames simulated
+        """
+        profiler = self.profiler
+        frame = 0
+        while frames is None or frame < frames:
+            if frames is None and self.input_source.done:
+                break
+            if profiler:
+                profiler.begin_frame()
+                profiler.start('update_all')
+            self.poll_input()
+            self.update_all(delta)
+            if profiler:
+                profiler.stop('update_all')
+                profiler.end_frame()
+            frame += 1
+            if until is not None and until():
+                break
+        return frame
+
+    def save_positions(self):
+        """ Remembers where the simulated entities are before a physics step, to interpolate from"""
+        entities = self.active_region.awake if self.active_region else self.group.sprites()
+        self._previous = [(entity, entity.rect.x, entity.rect.y) for entity in entities]
+
+    def advance(self, accumulator):
+        """
+        Runs the fixed physics steps that the time not simulated yet covers, at most MAX_STEPS_PER_FRAME
+        :param accumulator: seconds not simulated yet, including the last frame's
+        Returns: (seconds left over, at most a step, number of steps run)
+        """
+        step = self.step
+        steps = 0
+        while accumulator >= step and steps < self.MAX_STEPS_PER_FRAME:
+            self.save_positions()
+            self.poll_input()
+            self.update_all(step)
+            accumulator -= step
+            steps += 1
+        # Drop time that couldn't be caught up on, rather than falling further behind every frame
+        return min(accumulator, step), steps
 
     def run(self):
-        """ Render loop
+        """ Render loop. Runs as many fixed physics steps as the time since the last frame covers, then
+        draws with entities interpolated between their last two steps
         """
         clock = pygame.time.Clock()
         FPS = 60
+        # A replay speed of 0 plays one step per frame, drawing as fast as possible
+        unlimited = self.replay and not self.replay_speed
+        if unlimited:
+            FPS = 0
 
         debug = -100000000
 
+        profiler = self.profiler
+        step = self.step
+        # Time not simulated yet
+        accumulator = 0.
+
         try:
             while self.running:
                 # debug += 1
                 # if debug % 40 == 0:
                 #     self.print_debug_info()
 
-                delta = clock.tick(FPS) / 1000.
-                # Handle Events
-                self.handle_events()
+                frame_time = min(clock.tick(FPS) / 1000., self.MAX_FRAME_TIME)
+                if unlimited:
+                    frame_time = step
+                elif self.replay:
+                    frame_time *= self.replay_speed
+                accumulator += frame_time
+                if profiler:
+                    profiler.begin_frame()
+                    profiler.start('handle_events')
+                # Handle Events (input is polled once per physics step)
+                self.handle_events(poll_input=False)
+                if profiler:
+                    profiler.stop('handle_events')
+                    profiler.start('update_all')
                 # Update Game Elements
-                self.update_all(delta)
-                # Draw
-                self.screen.fill((0, 0, 0))
-                self.draw(self.temp_surface)
+                accumulator, _ = self.advance(accumulator)
+                if profiler:
+                    profiler.stop('update_all')
+                # Draw (covers the whole window, so no fill needed)
+                self.draw(accumulator / step)
+                if profiler:
+                    profiler.end_frame()
         except KeyboardInterrupt:
             print('done')
+            if profiler and self.profile_path:
+                profiler.dump(self.profile_path)
+            if self.record_path:
+                self.input_source.save(self.record_path)
+                print('Wrote input to ' + self.record_path)
             pygame.quit()
             sys.exit()
 
-    def draw(self, surface):
+    def draw(self, alpha=1.):
         """
         Draws all game elements
+        :param alpha: how far between the last two physics steps to draw entities (1 for the latest step)
         """
-        self.group.center(self.player.rect.center)
-
-        # draw the map and all sprites
-        self.group.draw(surface)
-
-        pygame.transform.scale(self.temp_surface, self.screen.get_size(), self.screen)
-
-        pygame.display.flip()
+        overlay = self.profiler.draw_overlay if self.profiler and self.show_profiler else None
+        if alpha >= 1 or not self._previous:
+            self.renderer.draw(self.player.rect.center, overlay)
+            return
+
+        # Move entities back between their last two positions just for drawing
+        current = []
+        for entity, x, y in self._previous:
+            rect = entity.rect
+            current.append((rect, rect.x, rect.y))
+            rect.x = round(x + (rect.x - x) * alpha)
+            rect.y = round(y + (rect.y - y) * alpha)
+        self.renderer.draw(self.player.rect.center, overlay)
+        for rect, x, y in current:
+            rect.x = x
+            rect.y = y
 
 
     def print_debug_info(self):
@@ -224,5 +535,56 @@ class MainGame(object):
 
 
 if __name__ == '__main__' : 
-    game = MainGame()
-    game.main()
+    parser = argparse.ArgumentParser(description='Auto-platformer')
+    parser.add_argument('--headless', type=int, metavar='FRAMES',
+                        help='simulate FRAMES frames without a display and exit')
+    parser.add_argument('--batch-physics', action='store_true',
+                        help='integrate entities together in NumPy arrays')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='record frame timings (F3 shows them, F4 or exiting writes them to PATH as CSV/JSON)')
+    parser.add_argument('--full-redraw', action='store_true',
+                        help='redraw the whole window every frame, even when the camera is still')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record keyboard input at a fixed step, written to PATH on exit')
+    parser.add_argument('--replay', metavar='PATH',
+                        help='play back an input log recorded with --record')
+    parser.add_argument('--replay-speed', type=float, default=1., metavar='SPEED',
+                        help='times real time to play a replay at (0 for as fast as possible)')
+    parser.add_argument('--streamed', action='store_true',
+                        help='load the map in chunks around the camera and entities on a background thread')
+    parser.add_argument('--collision-mesh', action='store_true',
+                        help="collide with the map's solid tiles merged into rectangles instead of tile by tile")
+    parser.add_argument('--active-margin', type=int, metavar='PIXELS',
+                        help='put entities further than PIXELS outside the view, or resting, to sleep')
+    parser.add_argument('--physics-rate', type=int, default=MainGame.PHYSICS_RATE, metavar='HZ',
+                        help='physics steps per simulated second')
+    parser.add_argument('--players', type=int, default=1, choices=range(1, len(PLAYER_KEYS) + 1),
+                        help='number of local players, each on their own keys')
+    parser.add_argument('--bind', action='append', default=[], metavar='BUTTON=KEY',
+                        help="remap one of player one's buttons, e.g. JUMP=k (can be repeated)")
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='level of Entities/Map/game logging printed to the console')
+    args = parser.parse_args()
+    bind = dict(binding.split('=', 1) for binding in args.bind)
+
+    logging.basicConfig(format='%(name)s %(levelname)s: %(message)s')
+    set_log_level(args.log_level)
+
+    profiler = Profiler() if args.profile else None
+    replay = InputReplayer.from_file(args.replay) if args.replay else None
+    game = MainGame(batch_physics=args.batch_physics, profiler=profiler, profile_path=args.profile,
+                    dirty_rects=not args.full_redraw, record_path=args.record, replay=replay,
+                    replay_speed=args.replay_speed, streamed=args.streamed, active_margin=args.active_margin,
+                    physics_rate=args.physics_rate, players=args.players, bind=bind,
+                    collision_mesh=args.collision_mesh)
+    if args.headless is not None or (replay and args.replay_speed == 0):
+        if replay:
+            # Whole log (or FRAMES of it) as fast as possible
+            game.main_headless(replay, frames=args.headless or None, delta=replay.delta)
+        else:
+            game.main_headless(ScriptedInput([]), frames=args.headless)
+        print('final position: ' + str(game.player.rect.topleft))
+        if profiler:
+            profiler.dump(args.profile)
+    else:
+        game.main()
@@ -9,6 +9,9 @@ ASSETS = 'assets'
 MAPS = os.path.join(ASSETS, 'tilemaps')
 # Maps
 TEST_MAP = os.path.join(MAPS, 'test/test2.tmx')
+SIMPLE_MAP = os.path.join(MAPS, 'simple/simple.tmx')
+# Compiled maps
+MAP_CACHE = '.mapcache'
 
 # Images
 DEBUG_IMG = os.path.join(ASSETS, 'sprite.png')